@@ -0,0 +1,138 @@
+"""
+Cert70 computation benchmark: columnar engine (calificaciones/services/cert70_engine.py)
+against the previous row-by-row Cert70Calculator loop, on synthetic in-memory data.
+
+    python benchmarks/bench_cert70.py [--partners 10000] [--movements 50] [--credits 0.5]
+
+Both sides get the same rows (what the queries return), so only the
+computation is timed; the legacy side already has its credits grouped per
+calificacion, as prefetch_related would. The outputs are compared partner
+by partner before reporting.
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import corpus  # noqa: E402
+
+IMPUTACIONES = ["RAI", "DDAN", "REX", "INR", "SAC", "SIN CLASIFICAR"]
+TIPOS_CREDITO = ["Con devolución", "sin devolucion", "Restitución", "ISFUT", "Otro crédito"]
+COLUMNAS = ["rai", "ddan", "rex", "inr", "sac", "credito_con_dev", "credito_sin_dev",
+            "credito_restitucion", "isfut", "otros_creditos"]
+
+
+def synthetic(partners, movements, credits, seed=70):
+    rng = random.Random(seed)
+    movimientos, creditos = [], []
+    next_id = 1
+    for socio in range(1, partners + 1):
+        for _ in range(movements):
+            monto = rng.randint(10_000, 50_000_000)
+            movimientos.append((
+                next_id, socio, datetime.date(2023, rng.randint(1, 12), rng.randint(1, 28)),
+                rng.choice(["retiro", "dividendo", "remesa"]), monto,
+                int(monto * 1.03) if rng.random() < 0.7 else None, rng.choice(IMPUTACIONES),
+            ))
+            if rng.random() < credits:
+                creditos.append((next_id, rng.choice(TIPOS_CREDITO), monto // 4))
+            next_id += 1
+    return movimientos, creditos
+
+
+def legacy(movimientos, creditos, date_format):
+    """Cert70Calculator.calculate as it was, once per partner (dates in the stored detalles format)."""
+    por_calificacion = defaultdict(list)
+    for calificacion_id, tipo, monto in creditos:
+        por_calificacion[calificacion_id].append((tipo, monto))
+    por_socio = defaultdict(list)
+    for row in movimientos:
+        por_socio[row[1]].append(row)
+
+    result = {}
+    for socio, rows in por_socio.items():
+        totales = dict.fromkeys(["monto_historico", "monto_actualizado", *COLUMNAS], 0)
+        detalles = []
+        for cal_id, _, fecha, tipo, original, reajustado, imputacion in rows:
+            row = {
+                "fecha": fecha.strftime(date_format), "tipo": tipo,
+                "monto_historico": original, "monto_actualizado": reajustado or original,
+                "imputacion": imputacion or "", **dict.fromkeys(COLUMNAS, 0),
+            }
+            monto = row["monto_actualizado"]
+            imp = (imputacion or "").upper()
+            if "RAI" in imp:
+                row["rai"] = monto
+            elif "DDAN" in imp:
+                row["ddan"] = monto
+            elif "REX" in imp:
+                row["rex"] = monto
+            elif "INR" in imp:
+                row["inr"] = monto
+            elif "SAC" in imp:
+                row["sac"] = monto
+            for c_tipo, c_monto in por_calificacion.get(cal_id, []):
+                c_tipo = (c_tipo or "").lower()
+                if "con devolución" in c_tipo or "con devolucion" in c_tipo:
+                    row["credito_con_dev"] += c_monto
+                elif "sin devolución" in c_tipo or "sin devolucion" in c_tipo:
+                    row["credito_sin_dev"] += c_monto
+                elif "restitución" in c_tipo or "restitucion" in c_tipo:
+                    row["credito_restitucion"] += c_monto
+                elif "isfut" in c_tipo:
+                    row["isfut"] += c_monto
+                else:
+                    row["otros_creditos"] += c_monto
+            for key in totales:
+                totales[key] += row[key]
+            detalles.append(row)
+        result[socio] = (totales, detalles)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--partners', type=int, default=10_000)
+    parser.add_argument('--movements', type=int, default=50, help="Movimientos por socio")
+    parser.add_argument('--credits', type=float, default=0.5, help="Proporción de movimientos con crédito IDPC")
+    parser.add_argument('--repeat', type=int, default=3, help="Pasadas (se informa la más rápida)")
+    args = parser.parse_args()
+
+    corpus.setup_django()
+    import pandas as pd
+    from calificaciones.services.cert70_engine import DATE_FORMAT, MOVIMIENTOS, compute
+
+    movimientos, creditos = synthetic(args.partners, args.movements, args.credits)
+    print(f"{args.partners} socios x {args.movements} movimientos = {len(movimientos)} filas, {len(creditos)} créditos")
+
+    def engine():
+        # DataFrame construction included: it replaces the model instances of the old path
+        return compute(
+            pd.DataFrame.from_records(movimientos, columns=list(MOVIMIENTOS)),
+            pd.DataFrame.from_records(creditos, columns=["calificacion_id", "tipo", "monto"]),
+        )
+
+    timings = {}
+    results = {}
+    for name, fn in (("fila a fila", lambda: legacy(movimientos, creditos, DATE_FORMAT)), ("columnar", engine)):
+        best = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            results[name] = fn()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        timings[name] = best
+        print(f"{name:<12}{best:>8.2f}s  {len(movimientos) / best:>12,.0f} filas/s")
+
+    if results["fila a fila"] != results["columnar"]:
+        print("ERROR: los resultados difieren")
+        sys.exit(1)
+    print(f"resultados idénticos; aceleración {timings['fila a fila'] / timings['columnar']:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+Batch Cert70 rendering benchmark: certificates per second into one ZIP
+(calificaciones/services/cert70_render.py) for an increasing number of
+render processes, on synthetic snapshots (no DB, PDF cache off).
+
+    python benchmarks/bench_cert70_render.py [--certificados 200] [--movimientos 30] [--workers 1,2,4]
+
+Speedup is relative to the first worker count; with N cores it should stay
+close to N until the workers outnumber them.
+"""
+import argparse
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import corpus  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--certificados', type=int, default=200)
+    parser.add_argument('--movimientos', type=int, default=30, help="Movimientos por certificado")
+    parser.add_argument('--workers', default="1,2,4", help="Cantidades de procesos a medir, separadas por coma")
+    args = parser.parse_args()
+
+    corpus.setup_django()
+    from calificaciones.services.cert70_render import ZipRenderer
+
+    snapshots = [corpus.cert70_snapshot(args.movimientos, seed=n) for n in range(1, args.certificados + 1)]
+    print(f"{args.certificados} certificados x {args.movimientos} movimientos, {os.cpu_count()} CPUs")
+
+    base = None
+    for workers in [int(w) for w in args.workers.split(",")]:
+        out = io.BytesIO()
+        report = ZipRenderer(workers=workers, cache=False).render_snapshots(iter(snapshots), out, len(snapshots))
+        base = base or report["certificados_por_segundo"]
+        render = report["render_segundos"]
+        print(
+            f"{workers:>3} procesos {report['elapsed_seconds']:>8.2f}s {report['certificados_por_segundo']:>8.1f} cert/s"
+            f"  x{report['certificados_por_segundo'] / base:.2f}"
+            f"  (render mediana {render['mediana']}s, máx {render['max']}s, zip {len(out.getvalue()) // 1024} KiB)"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""
+PDFParser.parse_data benchmark over the synthetic corpus (benchmarks/corpus.py).
+
+    python benchmarks/bench_parser.py [--corpus DIR] [--engine hybrid] [--save-baseline] [--tolerance 0.2]
+
+Reports pages/s and rows/s (best of --repeat runs), peak Python memory
+(tracemalloc, measured in an extra pass so it does not skew the timings)
+and extraction accuracy
+against the corpus ground truth: precision / recall of exactly matching
+rows plus the header fields. Results are compared with the stored baseline
+(benchmarks/baseline_parser.json) and the exit status is 1 when a document
+got slower than `tolerance` or lost accuracy. Timings are machine
+dependent: refresh the baseline with --save-baseline on the reference host.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import corpus  # noqa: E402
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline_parser.json')
+HEADER_FIELDS = ("rut_empresa", "fecha")
+
+
+def accuracy(parsed, truth):
+    """Row precision / recall on the fields each truth row defines, plus header matches."""
+    fields = sorted({k for row in truth["calificaciones"] for k in row})
+
+    def key(row):
+        # Cert70 style: rows without their own RUT belong to the document's propietario
+        row = {**row, "rut_propietario": row.get("rut_propietario") or parsed.get("rut_propietario")}
+        return tuple(str(row.get(f)) for f in fields)
+
+    expected = Counter(key(row) for row in truth["calificaciones"])
+    found = Counter(key(row) for row in parsed.get("calificaciones", []))
+    matched = sum((expected & found).values())
+    precision = matched / sum(found.values()) if found else 0.0
+    recall = matched / sum(expected.values()) if expected else 1.0
+    return {
+        "precision": round(precision, 4),
+        "recall": round(recall, 4),
+        "f1": round(2 * precision * recall / (precision + recall), 4) if precision + recall else 0.0,
+        "header": sum(parsed.get(f) == truth[f] for f in HEADER_FIELDS) / len(HEADER_FIELDS),
+    }
+
+
+def measure(path, truth, engine=None, memory=True, repeat=3):
+    from calificaciones.services.pdf_parser import PDFParser
+
+    seconds = None
+    for _ in range(repeat):
+        # Best of `repeat` runs: the least noisy estimate on a shared host
+        start = time.perf_counter()
+        parsed = PDFParser(path, workers=1, engine=engine).parse_data()
+        elapsed = time.perf_counter() - start
+        seconds = elapsed if seconds is None else min(seconds, elapsed)
+
+    peak = None
+    if memory:
+        tracemalloc.start()
+        PDFParser(path, workers=1, engine=engine).parse_data()
+        peak = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+        tracemalloc.stop()
+
+    rows = len(truth["calificaciones"])
+    return {
+        "tipo": truth["tipo"],
+        "pages": truth["paginas"],
+        "rows": rows,
+        "seconds": round(seconds, 3),
+        "pages_per_sec": round(truth["paginas"] / seconds, 2),
+        "rows_per_sec": round(rows / seconds, 1),
+        "peak_mb": round(peak, 1) if peak is not None else None,
+        **accuracy(parsed, truth),
+    }
+
+
+def regressions(results, baseline, tolerance):
+    found = []
+    for name, result in results.items():
+        before = baseline.get("documents", {}).get(name)
+        if not before:
+            continue
+        if result["pages_per_sec"] < before["pages_per_sec"] * (1 - tolerance):
+            found.append(f"{name}: {before['pages_per_sec']} -> {result['pages_per_sec']} páginas/s")
+        for metric in ("f1", "header"):
+            if result[metric] < before[metric] - 1e-4:
+                found.append(f"{name}: {metric} {before[metric]} -> {result[metric]}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--corpus', help="Directorio generado por corpus.py (por defecto se genera uno temporal)")
+    parser.add_argument('--engine', default=None, help="Motor de texto (por defecto PDF_TEXT_ENGINE)")
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help="Guarda estos resultados como línea base")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Caída de páginas/s tolerada (0.2 = 20%%)")
+    parser.add_argument('--repeat', type=int, default=3, help="Pasadas por documento (se informa la más rápida)")
+    parser.add_argument('--no-memory', action='store_true', help="Omite la medición de memoria (una pasada menos)")
+    args = parser.parse_args()
+
+    corpus.setup_django()
+    from django.conf import settings
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        documents = corpus.load(args.corpus) if args.corpus else corpus.build(tmpdir, corpus.default_specs())
+        results = {
+            os.path.basename(path)[:-4]: measure(path, truth, args.engine, memory=not args.no_memory, repeat=args.repeat)
+            for path, truth in documents
+        }
+
+    print(f"{'documento':<14}{'págs':>5}{'filas':>7}{'seg':>8}{'págs/s':>8}{'filas/s':>9}{'MB':>7}{'prec':>7}{'recall':>7}{'cabecera':>9}")
+    for name, r in results.items():
+        peak = f"{r['peak_mb']:.1f}" if r['peak_mb'] is not None else "-"
+        print(f"{name:<14}{r['pages']:>5}{r['rows']:>7}{r['seconds']:>8.2f}{r['pages_per_sec']:>8.2f}"
+              f"{r['rows_per_sec']:>9.1f}{peak:>7}{r['precision']:>7.2f}{r['recall']:>7.2f}{r['header']:>9.2f}")
+    pages = sum(r["pages"] for r in results.values())
+    rows = sum(r["rows"] for r in results.values())
+    seconds = sum(r["seconds"] for r in results.values())
+    print(f"total: {pages} páginas, {rows} filas en {seconds:.2f}s ({pages / seconds:.2f} págs/s, {rows / seconds:.1f} filas/s)")
+
+    report = {
+        "engine": args.engine or getattr(settings, 'PDF_TEXT_ENGINE', 'pdfplumber'),
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "documents": results,
+    }
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=1, ensure_ascii=False)
+            f.write("\n")
+        print(f"línea base guardada en {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print("sin línea base (usar --save-baseline)")
+        return
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get("engine") != report["engine"]:
+        print(f"aviso: la línea base usa el motor {baseline.get('engine')}")
+    found = regressions(results, baseline, args.tolerance)
+    for line in found:
+        print(f"REGRESIÓN {line}")
+    if found:
+        sys.exit(1)
+    print("sin regresiones respecto de la línea base")
+
+
+if __name__ == '__main__':
+    main()
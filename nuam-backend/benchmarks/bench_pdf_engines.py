@@ -0,0 +1,91 @@
+"""
+Compares PDFParser text engines (PDF_TEXT_ENGINE) on a PDF corpus.
+
+    python benchmarks/bench_pdf_engines.py [archivo.pdf | directorio ...]
+
+Without arguments it uses certificados/*.pdf plus a generated DJ1948 sample:
+a few pages of instructions (no RUTs) around table pages, which is where the
+hybrid engine skips pdfplumber. Every document must parse identically with
+both engines.
+"""
+import glob
+import os
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, BASE_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'nuamSettings.settings')
+
+import django  # noqa: E402
+django.setup()
+
+from calificaciones.services.pdf_parser import PDFParser, TEXT_ENGINES  # noqa: E402
+
+
+def sample_dj1948(path, table_pages=10, text_pages=20, rows=30):
+    """DJ1948-like sample: instruction pages (text only) followed by table pages."""
+    import random
+    from reportlab.lib import colors
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, PageBreak
+
+    rng = random.Random(1948)
+    style = getSampleStyleSheet()['Normal']
+    elements = [Paragraph("DECLARACION JURADA 1948 - Retiros 76.543.210-3 Fecha 31/12/2023", style)]
+    for n in range(text_pages):
+        elements += [Paragraph(f"Instrucciones de llenado, sección {n + 1}. " + "Texto explicativo del formulario. " * 120, style), PageBreak()]
+    for page in range(table_pages):
+        data = [["RUT", "Nombre", "Codigo", "Monto", "Fecha"]]
+        for r in range(rows):
+            data.append([
+                f"{rng.randint(1, 25)}.{rng.randint(100, 999)}.{rng.randint(100, 999)}-{rng.randint(0, 9)}",
+                f"Socio {page}-{r}", rng.choice(["RAI", "DIV", "REM"]),
+                f"{rng.randint(1000, 9999999):,}".replace(",", "."),
+                rng.choice(["", f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/2023"]),
+            ])
+        elements += [Table(data, style=TableStyle([('GRID', (0, 0), (-1, -1), 0.5, colors.black)])), PageBreak()]
+    SimpleDocTemplate(path).build(elements)
+    return path
+
+
+def corpus(args, tmpdir):
+    paths = []
+    for arg in args:
+        paths += sorted(glob.glob(os.path.join(arg, '*.pdf'))) if os.path.isdir(arg) else [arg]
+    if not args:
+        paths = sorted(glob.glob(os.path.join(BASE_DIR, 'certificados', '*.pdf')))
+        paths.append(sample_dj1948(os.path.join(tmpdir, 'dj1948_muestra.pdf')))
+    return paths
+
+
+def timed(path, engine):
+    start = time.perf_counter()
+    data = PDFParser(path, workers=1, engine=engine).parse_data()
+    return data, time.perf_counter() - start
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        paths = corpus(sys.argv[1:], tmpdir)
+        totals = dict.fromkeys(TEXT_ENGINES, 0.0)
+        print(f"{'archivo':<28}{'páginas':>8}" + "".join(f"{e:>12}" for e in TEXT_ENGINES) + f"{'speedup':>9}")
+        for path in paths:
+            results = {engine: timed(path, engine) for engine in TEXT_ENGINES}
+            outputs = [data for data, _ in results.values()]
+            if any(data != outputs[0] for data in outputs[1:]):
+                raise SystemExit(f"{path}: los motores producen resultados distintos")
+            for engine, (_, seconds) in results.items():
+                totals[engine] += seconds
+            with PDFParser(path, engine="hybrid") as parser:
+                pages = parser.page_count
+            speedup = results["pdfplumber"][1] / results["hybrid"][1]
+            print(f"{os.path.basename(path)[:27]:<28}{pages:>8}"
+                  + "".join(f"{results[e][1]:>11.3f}s" for e in TEXT_ENGINES) + f"{speedup:>8.1f}x")
+        print(f"{'total':<36}" + "".join(f"{totals[e]:>11.3f}s" for e in TEXT_ENGINES)
+              + f"{totals['pdfplumber'] / totals['hybrid']:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
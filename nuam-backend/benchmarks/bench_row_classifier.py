@@ -0,0 +1,137 @@
+"""
+Micro-benchmark of the DJ1948 row classifier (calificaciones/services/row_classifier.py)
+against the previous inline implementation of PDFParser._parse_dj1948.
+
+    python benchmarks/bench_row_classifier.py [--rows 50000]
+
+The legacy version printed a debug line per cell; it is timed both with that
+output going to /dev/null and with the prints removed, so the gain from the
+compiled single pass is visible on its own.
+"""
+import argparse
+import contextlib
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from calificaciones.services.row_classifier import classify_row  # noqa: E402
+
+
+def _is_valid_rut(text):
+    return bool(re.search(r"\b\d{1,2}\.?\d{3}\.?\d{3}-[\dkK]\b", text))
+
+
+def legacy_classify(cleaned_row, verbose=True):
+    """Row body of the old _parse_dj1948 (document-date fallback left to the caller)."""
+    rut_candidate = next((cell for cell in cleaned_row if _is_valid_rut(cell)), None)
+    if not rut_candidate:
+        return None
+    tipo_mapping = {"DIV": "dividendo", "RET": "retiro", "REM": "remesa", "RAI": "retiro", "REX": "retiro"}
+    found_tipo = "retiro"
+    found_imputacion = "SIN CLASIFICAR"
+    for cell in cleaned_row:
+        upper_cell = cell.upper()
+        if upper_cell in tipo_mapping or any(word in tipo_mapping for word in upper_cell.split()):
+            code = upper_cell if upper_cell in tipo_mapping else next((w for w in upper_cell.split() if w in tipo_mapping), "RAI")
+            found_tipo = tipo_mapping.get(code, "retiro")
+            found_imputacion = code
+            break
+    found_monto = 0
+    numeric_values = []
+    for cell in cleaned_row:
+        clean_val = cell.replace("$", "").replace(".", "").replace(",", "").replace(" ", "").strip()
+        if clean_val.isdigit():
+            numeric_values.append(int(clean_val))
+    if numeric_values:
+        found_monto = max(numeric_values)
+    row_date = None
+    date_in_row = next((cell for cell in cleaned_row if re.match(r"\d{1,2}[-/]\d{1,2}[-/]\d{4}", cell)), None)
+    if date_in_row:
+        row_date = date_in_row
+    found_nombre = None
+    potential_names = []
+    KEYWORDS_TO_IGNORE = ["RETIRO", "REMESA", "DIVIDENDO", "DEVOLUCION", "CAPITAL", "RAI", "DDAN", "REX", "RAP", "SAC", "ISFUT"]
+    for cell in cleaned_row:
+        clean_cell = cell.strip()
+        if verbose:
+            print(f"DEBUG CELL: '{clean_cell}'")
+        if _is_valid_rut(clean_cell) or clean_cell == rut_candidate:
+            continue
+        if re.match(r"\d{1,2}[-/]\d{1,2}[-/]\d{4}", clean_cell):
+            continue
+        if re.match(r"^[\d\.,\$]+$", clean_cell.replace(" ", "")):
+            continue
+        if any(kw in clean_cell.upper() for kw in KEYWORDS_TO_IGNORE):
+            continue
+        if re.search(r"[a-zA-Z]", clean_cell):
+            potential_names.append(clean_cell)
+    if potential_names:
+        found_nombre = max(potential_names, key=len)
+        if verbose:
+            print(f"DEBUG SELECTED: {found_nombre}")
+    return {
+        "fecha": row_date,
+        "rut_propietario": rut_candidate,
+        "nombre_propietario": found_nombre,
+        "tipo": found_tipo,
+        "monto": found_monto,
+        "imputacion": found_imputacion,
+        "original_line": " | ".join(cleaned_row),
+    }
+
+
+def synthetic_rows(n, seed=1948):
+    rng = random.Random(seed)
+    codes = ["RAI", "REX", "DIV", "REM", "RET", "DDAN", "RETIRO / RAI", "Dividendo DIV", ""]
+    rows = []
+    for i in range(n):
+        if i % 25 == 0:
+            rows.append(["RUT", "Nombre o Razón Social", "Código", "Monto Histórico", "Monto Actualizado", "Fecha"])
+            continue
+        rut = f"{rng.randint(1, 29)}.{rng.randint(100, 999)}.{rng.randint(100, 999)}-{rng.choice('0123456789K')}"
+        monto = rng.randint(1000, 99_999_999)
+        rows.append([
+            rut if rng.random() > 0.3 else rut.replace(".", ""),
+            rng.choice(["JUAN PEREZ SOTO", "Inversiones Los Andes SpA", "MARIA GONZALEZ", "Sociedad de Capital Ltda"]),
+            rng.choice(codes),
+            f"{monto:,}".replace(",", "."),
+            f"$ {int(monto * 1.04):,}".replace(",", "."),
+            rng.choice(["", f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/2023", "31-12-2023"]),
+        ])
+    return rows
+
+
+def rate(func, rows):
+    start = time.perf_counter()
+    for row in rows:
+        func(row)
+    return len(rows) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=50000)
+    args = parser.parse_args()
+    rows = synthetic_rows(args.rows)
+
+    mismatches = sum(1 for row in rows if legacy_classify(row, verbose=False) != classify_row(row))
+    if mismatches:
+        raise SystemExit(f"{mismatches} rows classified differently")
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        legacy_print = rate(legacy_classify, rows)
+    legacy = rate(lambda row: legacy_classify(row, verbose=False), rows)
+    compiled = rate(classify_row, rows)
+
+    print(f"{len(rows)} rows, identical output")
+    print(f"legacy (prints to /dev/null) {legacy_print:>12,.0f} rows/s")
+    print(f"legacy (no prints)           {legacy:>12,.0f} rows/s")
+    print(f"row_classifier               {compiled:>12,.0f} rows/s  ({compiled / legacy_print:.1f}x / {compiled / legacy:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,245 @@
+"""
+Synthetic DJ1948 / Certificado 70 PDFs with known ground truth.
+
+    python benchmarks/corpus.py salida/ [--dj1948 3] [--cert70 2] [--pages 10] [--rows 30] [--seed 1948]
+
+Every PDF gets a <nombre>.json next to it with the header fields and the
+calificaciones PDFParser.parse_data should extract from it. DJ1948 files are
+drawn with reportlab in an SII-like layout of our own (one table per page,
+optional instruction pages; column titles are not the real form's), read by
+the layout template in layouts/ (loaded through PDF_LAYOUT_DIRS, never
+bundled with the app); Certificados 70 are rendered by the real
+Cert70PDFGenerator.
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import sys
+from types import SimpleNamespace
+
+BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+# Layout template of the synthetic DJ1948s (not a production SII template)
+LAYOUTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'layouts')
+
+# Codes PDFParser maps to a tipo; DJ1948_SII_CODES adds imputaciones it does not know yet
+DJ1948_CODES = {"RAI": "retiro", "REX": "retiro", "RET": "retiro", "DIV": "dividendo", "REM": "remesa"}
+DJ1948_SII_CODES = {**DJ1948_CODES, "DDAN": "retiro", "SAC": "retiro", "INR": "retiro"}
+
+NOMBRES = ["Juan", "María", "José", "Ana", "Pedro", "Camila", "Luis", "Francisca", "Jorge", "Valentina"]
+APELLIDOS = ["González", "Muñoz", "Rojas", "Díaz", "Pérez", "Soto", "Contreras", "Silva", "Martínez", "Sepúlveda"]
+SOCIEDADES = ["Inversiones {} SpA", "Sociedad {} Limitada", "Asesorías {} y Cía", "Rentas {} S.A."]
+
+
+def _rut(rng, dots=True):
+    numero = rng.randint(1_000_000, 29_999_999)
+    dv = rng.choice("0123456789K")
+    if not dots:
+        return f"{numero}-{dv}"
+    return f"{numero:,}".replace(",", ".") + f"-{dv}"
+
+
+def _nombre(rng):
+    if rng.random() < 0.25:
+        return rng.choice(SOCIEDADES).format(rng.choice(APELLIDOS))
+    return f"{rng.choice(NOMBRES)} {rng.choice(APELLIDOS)} {rng.choice(APELLIDOS)}"
+
+
+def _pesos(monto):
+    return f"{monto:,}".replace(",", ".")
+
+
+def dj1948(path, pages=10, rows=30, seed=1948, codes=None, sin_fecha=0.2, paginas_texto=0):
+    """
+    DJ1948 with `pages` table pages of `rows` rows each, after `paginas_texto`
+    instruction pages. A share `sin_fecha` of rows has no date (the parser
+    then uses the document date). Returns the ground truth.
+    """
+    from reportlab.lib import colors
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, PageBreak, Spacer
+
+    rng = random.Random(seed)
+    codes = codes or DJ1948_CODES
+    styles = getSampleStyleSheet()
+    rut_empresa = _rut(rng)
+    fecha_doc = "31/12/2023"
+
+    elements = [
+        Paragraph("DECLARACIÓN JURADA ANUAL SOBRE RETIROS, REMESAS Y/O DIVIDENDOS - FORMULARIO 1948", styles['Heading2']),
+        Paragraph(f"RUT Declarante: {rut_empresa}  Año Tributario 2024  Fecha: {fecha_doc}", styles['Normal']),
+        Spacer(1, 12),
+    ]
+    for n in range(paginas_texto):
+        elements += [
+            Paragraph(f"Instrucciones de llenado, sección {n + 1}", styles['Heading3']),
+            Paragraph("Informe en esta declaración los retiros, remesas y dividendos del año comercial. " * 25, styles['Normal']),
+            PageBreak(),
+        ]
+
+    calificaciones = []
+    header = ["RUT Receptor", "Nombre o Razón Social", "Código", "Monto Histórico", "Monto Actualizado", "Fecha"]
+    for _ in range(pages):
+        data = [header]
+        for _ in range(rows):
+            rut = _rut(rng, dots=rng.random() < 0.8)
+            nombre = _nombre(rng)
+            code = rng.choice(list(codes))
+            historico = rng.randint(10_000, 50_000_000)
+            actualizado = int(historico * rng.uniform(1.0, 1.08))
+            fecha = "" if rng.random() < sin_fecha else f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/2023"
+            data.append([rut, nombre, code, _pesos(historico), _pesos(actualizado), fecha])
+            calificaciones.append({
+                "rut_propietario": rut,
+                "nombre_propietario": nombre,
+                "tipo": codes[code],
+                "imputacion": code,
+                "monto": actualizado,  # the parser keeps the largest amount of the row
+                "fecha": fecha or fecha_doc,
+            })
+        elements += [Table(data, repeatRows=1, style=TableStyle([
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+            ('FONTSIZE', (0, 0), (-1, -1), 7),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+        ])), PageBreak()]
+    SimpleDocTemplate(path).build(elements)
+
+    return {
+        "tipo": "dj1948",
+        "paginas": pages + paginas_texto,
+        "rut_empresa": rut_empresa,
+        "rut_propietario": None,
+        "fecha": fecha_doc,
+        "calificaciones": calificaciones,
+    }
+
+
+def cert70_snapshot(movimientos=10, seed=70):
+    """Certificado 70 of one socio with `movimientos` rows, shaped as cert70_pdf.snapshot() returns it."""
+    rng = random.Random(seed)
+    imputaciones = ["RAI", "DDAN", "REX", "INR", "SAC"]
+    columnas = ["rai", "ddan", "rex", "inr", "sac", "credito_con_dev", "credito_sin_dev",
+                "credito_restitucion", "isfut", "otros_creditos"]
+    detalles = []
+    totales = dict.fromkeys(["monto_historico", "monto_actualizado", *columnas], 0)
+    for _ in range(movimientos):
+        historico = rng.randint(100_000, 20_000_000)
+        imputacion = rng.choice(imputaciones)
+        row = {
+            "fecha": datetime.date(2024, rng.randint(1, 12), rng.randint(1, 28)).strftime("%d-%m-%Y"),
+            "tipo": rng.choice(["retiro", "dividendo", "remesa"]),
+            "monto_historico": historico,
+            "monto_actualizado": int(historico * rng.uniform(1.0, 1.05)),
+            "imputacion": imputacion,
+            **dict.fromkeys(columnas, 0),
+        }
+        row[imputacion.lower()] = row["monto_actualizado"]
+        row["credito_con_dev"] = int(row["monto_actualizado"] * 0.27) if imputacion == "RAI" else 0
+        detalles.append(row)
+        for key in totales:
+            totales[key] += row[key]
+
+    empresa = SimpleNamespace(rut=_rut(rng, dots=False), razon_social="Empresa Sintética SpA", regimen_tributario="14A")
+    propietario = SimpleNamespace(rut=_rut(rng, dots=False), nombre=_nombre(rng), calidad="Accionista", porcentaje_participacion=25)
+    return SimpleNamespace(
+        id=seed, folio=seed, anio_comercial=2024, fecha_emision=datetime.date(2025, 3, 15),
+        empresa=empresa, propietario=propietario, detalles=detalles, totales=totales,
+    )
+
+
+def cert70(path, movimientos=10, seed=70):
+    """Certificado 70 of cert70_snapshot(), rendered by Cert70PDFGenerator."""
+    from calificaciones.services.cert70_pdf import Cert70PDFGenerator
+
+    certificado = cert70_snapshot(movimientos, seed)
+    empresa, propietario, detalles = certificado.empresa, certificado.propietario, certificado.detalles
+    fecha_emision = certificado.fecha_emision
+    generator = Cert70PDFGenerator(certificado)
+    generator.filepath = path
+    generator.generate()
+
+    return {
+        "tipo": "cert70",
+        "paginas": None,  # filled in by the caller from the rendered file
+        "rut_empresa": empresa.rut,
+        "rut_propietario": propietario.rut,
+        "fecha": fecha_emision.strftime("%d-%m-%Y"),
+        "calificaciones": [{
+            "rut_propietario": propietario.rut,
+            "tipo": d["tipo"],
+            "imputacion": d["imputacion"],
+            "monto": d["monto_actualizado"],
+            "fecha": d["fecha"],
+        } for d in detalles],
+    }
+
+
+def default_specs(pages=10, rows=30, n_dj1948=3, n_cert70=2, seed=1948):
+    """(nombre, generador, kwargs) of the standard benchmark corpus."""
+    specs = []
+    for n in range(n_dj1948):
+        kwargs = {"pages": pages * (n + 1) // n_dj1948 or 1, "rows": rows, "seed": seed + n}
+        if n == n_dj1948 - 1:
+            # Last one: instruction pages and SII codes the parser does not classify yet
+            kwargs.update(paginas_texto=2, codes=DJ1948_SII_CODES)
+        specs.append((f"dj1948_{n + 1}", dj1948, kwargs))
+    for n in range(n_cert70):
+        specs.append((f"cert70_{n + 1}", cert70, {"movimientos": 5 + 20 * n, "seed": seed + 100 + n}))
+    return specs
+
+
+def build(out_dir, specs):
+    """Writes every PDF + truth JSON of `specs` to out_dir. Returns [(pdf_path, truth)]."""
+    import pdfplumber
+
+    os.makedirs(out_dir, exist_ok=True)
+    corpus = []
+    for nombre, generator, kwargs in specs:
+        path = os.path.join(out_dir, f"{nombre}.pdf")
+        truth = generator(path, **kwargs)
+        if truth["paginas"] is None:
+            with pdfplumber.open(path) as pdf:
+                truth["paginas"] = len(pdf.pages)
+        with open(os.path.join(out_dir, f"{nombre}.json"), 'w', encoding='utf-8') as f:
+            json.dump(truth, f, ensure_ascii=False, indent=1)
+        corpus.append((path, truth))
+    return corpus
+
+
+def load(corpus_dir):
+    """[(pdf_path, truth)] of a directory written by build()."""
+    corpus = []
+    for name in sorted(os.listdir(corpus_dir)):
+        if name.endswith('.pdf') and os.path.exists(os.path.join(corpus_dir, name[:-4] + '.json')):
+            with open(os.path.join(corpus_dir, name[:-4] + '.json'), encoding='utf-8') as f:
+                corpus.append((os.path.join(corpus_dir, name), json.load(f)))
+    return corpus
+
+
+def setup_django():
+    sys.path.insert(0, BASE_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'nuamSettings.settings')
+    os.environ.setdefault('PDF_LAYOUT_DIRS', LAYOUTS_DIR)
+    import django
+    django.setup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera un corpus sintético DJ1948 / Certificado 70 con su verdad de referencia")
+    parser.add_argument('salida')
+    parser.add_argument('--dj1948', type=int, default=3, help="Cantidad de DJ1948")
+    parser.add_argument('--cert70', type=int, default=2, help="Cantidad de Certificados 70")
+    parser.add_argument('--pages', type=int, default=10, help="Páginas de tabla de la DJ1948 más grande")
+    parser.add_argument('--rows', type=int, default=30, help="Filas por página")
+    parser.add_argument('--seed', type=int, default=1948)
+    args = parser.parse_args()
+
+    setup_django()
+    specs = default_specs(args.pages, args.rows, args.dj1948, args.cert70, args.seed)
+    for path, truth in build(args.salida, specs):
+        print(f"{path}: {truth['paginas']} páginas, {len(truth['calificaciones'])} calificaciones")
+
+
+if __name__ == '__main__':
+    main()
@@ -7,3 +7,4 @@ class CalificacionesConfig(AppConfig):
 
     def ready(self):
         import calificaciones.signals
+        import calificaciones.job_handlers
@@ -0,0 +1,115 @@
+"""
+Audit trail writer shared by the signals and the bulk paths.
+
+Outside a `bulk_audit()` block every entry is INSERTed right away (the
+regular per-save behaviour). Inside one, entries are buffered in memory and
+written with one bulk_create per `flush()` (or every `batch_size` entries),
+so an upload costs one audit INSERT per chunk instead of one per row.
+"""
+import contextvars
+from contextlib import contextmanager
+from django.conf import settings
+from .models import Auditoria
+from .serializers import CalificacionTributariaSerializer
+
+_buffer = contextvars.ContextVar('bulk_audit_buffer', default=None)
+
+
+class AuditBuffer:
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.entries = []
+        self.written = 0
+
+    def add(self, entry):
+        self.entries.append(entry)
+        if len(self.entries) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.entries:
+            Auditoria.objects.bulk_create(self.entries, batch_size=self.batch_size)
+            self.written += len(self.entries)
+            self.entries = []
+
+
+@contextmanager
+def bulk_audit(usuario=None, archivo=None, batch_size=None):
+    """
+    Buffers the audit entries written inside the block. Callers should call
+    flush() at the end of each transaction so entries commit with their rows;
+    whatever is left is written on exit. With `archivo`, one extra "carga"
+    entry summarizes the upload and references the ArchivoCargado.
+    """
+    buffer = AuditBuffer(batch_size or getattr(settings, 'BULK_UPLOAD_CHUNK_SIZE', 1000))
+    token = _buffer.set(buffer)
+    try:
+        yield buffer
+        buffer.flush()
+    finally:
+        _buffer.reset(token)
+
+    if archivo is not None:
+        Auditoria.objects.create(
+            usuario=usuario,
+            accion="carga",
+            entidad="ArchivoCargado",
+            entidad_id=archivo.pk,
+            descripcion=f"Carga de {archivo.nombre_archivo}",
+            detalle={
+                "archivo": archivo.nombre_archivo,
+                "registros_auditados": buffer.written,
+                "resultado": _summary(archivo.metadata),
+            }
+        )
+
+
+def _summary(metadata):
+    # Counters only: the full error list already lives in ArchivoCargado.metadata
+    if not isinstance(metadata, dict):
+        return None
+    return {k: v for k, v in metadata.items() if isinstance(v, (int, float)) and not isinstance(v, bool)}
+
+
+def flush():
+    buffer = _buffer.get()
+    if buffer is not None:
+        buffer.flush()
+
+
+def discard():
+    """Drops the buffered entries, for rows whose transaction was rolled back."""
+    buffer = _buffer.get()
+    if buffer is not None:
+        buffer.entries = []
+
+
+def record(usuario, accion, entidad, entidad_id, detalle, descripcion=None):
+    entry = Auditoria(
+        usuario=usuario,
+        accion=accion,
+        descripcion=descripcion,
+        entidad=entidad,
+        entidad_id=entidad_id,
+        detalle=detalle,
+    )
+    buffer = _buffer.get()
+    if buffer is None:
+        entry.save()
+    else:
+        buffer.add(entry)
+    return entry
+
+
+def record_calificacion(cal, accion, antes=None):
+    """Audit entry for a CalificacionTributaria written by save() or by a bulk path."""
+    return record(
+        usuario=cal.creado_por,  # Note: This attributes action to creator, ideally should be current user
+        accion=accion,
+        entidad="CalificacionTributaria",
+        entidad_id=cal.pk,
+        detalle={
+            "antes": antes,
+            "despues": CalificacionTributariaSerializer(cal).data if accion != "eliminar" else None
+        }
+    )
@@ -1,13 +1,26 @@
+import json
+import time
 import pandas as pd
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.permissions import IsAuthenticated
-from django.db import transaction
-from .models import Empresa, Propietario, CalificacionTributaria
-from .services.pdf_parser import PDFParser
+from .permissions import IsAdmin
+from .services import parse_cache
+from .services.bulk_ingest import ingest_file
+from .services.bulk_upsert import upsert_calificaciones
+from .services.import_preview import preview_file
+from .services.zip_ingest import ingest_zip
+from .services.tabular_reader import TabularReader, MissingColumnsError
+from .services import jobs
+from . import audit
+from .services.jobs import wants_async, accepted_response
+from .utils import copy_and_hash, hash_path, hash_upload
 import os
 import tempfile
+import zipfile
 
 class BulkUploadView(APIView):
     permission_classes = [IsAuthenticated]
@@ -17,63 +30,185 @@ class BulkUploadView(APIView):
         file_obj = request.FILES.get('file')
         if not file_obj:
             return Response({"error": "No file provided"}, status=400)
+        return handle_tabular_upload(request, file_obj)
 
+
+def handle_tabular_upload(request, file_obj, sha256=None, ruta=None):
+    """
+    Processing behind BulkUploadView. `ruta` is set when the upload already
+    lives on disk (resumable uploads): the file is then consumed, i.e. handed
+    to the background job or removed once processed.
+    """
+    try:
+        try:
+            chunk_size = int(request.query_params.get('chunk_size', 0)) or None
+            if chunk_size is not None and chunk_size < 0:
+                raise ValueError
+        except ValueError:
+            return Response({"error": "chunk_size must be a positive integer"}, status=400)
+
+        # Validate the header up front so bad files are rejected before queueing
         try:
-            # Determine file type and read
-            if file_obj.name.endswith('.csv'):
-                df = pd.read_csv(file_obj)
-            else:
-                df = pd.read_excel(file_obj)
+            TabularReader(file_obj).read_header()
+        except MissingColumnsError as e:
+            return Response({"error": str(e)}, status=400)
         except Exception as e:
             return Response({"error": f"Error reading file: {str(e)}"}, status=400)
 
-        required_columns = [
-            'rut_empresa', 'razon_social', 
-            'rut_propietario', 'nombre_propietario', 
-            'fecha', 'tipo_calificacion', 'monto'
-        ]
-        
-        # Check columns
-        missing_cols = [col for col in required_columns if col not in df.columns]
-        if missing_cols:
-            return Response({"error": f"Missing columns: {', '.join(missing_cols)}"}, status=400)
-
-        results = {
-            "created": 0,
-            "errors": []
-        }
-
-        for index, row in df.iterrows():
-            try:
-                with transaction.atomic():
-                    # 1. Empresa
-                    empresa, _ = Empresa.objects.get_or_create(
-                        rut=str(row['rut_empresa']),
-                        defaults={'razon_social': str(row['razon_social'])}
-                    )
-
-                    # 2. Propietario
-                    propietario, _ = Propietario.objects.get_or_create(
-                        rut=str(row['rut_propietario']),
-                        empresa=empresa,
-                        defaults={'nombre': str(row['nombre_propietario'])}
-                    )
-
-                    # 3. Calificacion
-                    CalificacionTributaria.objects.create(
-                        empresa=empresa,
-                        propietario=propietario,
-                        fecha=pd.to_datetime(row['fecha']).date(),
-                        tipo=str(row['tipo_calificacion']),
-                        monto_original=int(row['monto']),
-                        estado=row.get('estado', 'pendiente')
-                    )
-                    results["created"] += 1
-
-            except Exception as e:
-                results["errors"].append(f"Row {index + 2}: {str(e)}")
+        if wants_dry_run(request):
+            return Response(preview_file(file_obj, chunk_size))
+
+        # Same bytes uploaded before: return the stored result instead of ingesting again
+        sha256 = sha256 or hash_upload(file_obj)
+        previous = find_previous_upload(sha256, request)
+        if previous:
+            return Response(previous)
+
+        if wants_async(request):
+            tarea = jobs.enqueue("carga_tabular", {
+                "ruta": ruta or jobs.save_upload(file_obj),
+                "nombre": file_obj.name,
+                "sha256": sha256,
+                "chunk_size": chunk_size,
+            }, request.user)
+            ruta = None  # the job owns the file now
+            return accepted_response(tarea)
+
+        return Response(ingest_upload(file_obj, file_obj.name, request.user, sha256, chunk_size))
+    finally:
+        if ruta and os.path.exists(ruta):
+            os.remove(ruta)
+
+
+def wants_dry_run(request):
+    """?dry_run=1: report what the import would change without writing anything."""
+    return str(request.query_params.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+
+
+def find_previous_upload(sha256, request=None, ingerido=False):
+    """
+    Returns the stored result of a completed upload with the same content
+    hash (plus "duplicado" and "archivo_id"), or None. ?force=1 skips the check.
+    With `ingerido`, only uploads whose rows were written count (a PDF that
+    was only previewed does not).
+    """
+    from .models import ArchivoCargado
+
+    if request is not None and str(request.query_params.get('force', '')).lower() in ('1', 'true', 'yes'):
+        return None
+    archivos = ArchivoCargado.objects.filter(sha256=sha256, metadata__isnull=False)
+    if ingerido:
+        archivos = archivos.filter(ingerido_en__isnull=False)
+    archivo = archivos.order_by('-cargado_en').first()
+    if archivo is None:
+        return None
+    return {**archivo.metadata, "duplicado": True, "archivo_id": archivo.id}
+
+
+def ingest_upload(file_obj, nombre_archivo, user, sha256=None, chunk_size=None, progress=None):
+    """
+    Ingests a CSV/XLSX upload, registering it as an ArchivoCargado whose
+    metadata is the ingest summary (the record future re-uploads resolve to).
+    """
+    from .models import ArchivoCargado
+
+    # metadata stays NULL until the ingest finishes, so an interrupted upload is not treated as done
+    archivo = ArchivoCargado.objects.create(
+        nombre_archivo=os.path.basename(nombre_archivo),
+        cargado_por=user,
+        sha256=sha256,
+    )
+    # Row-level audit entries are written once per chunk, plus one summary entry for the file
+    with audit.bulk_audit(usuario=user, archivo=archivo, batch_size=chunk_size):
+        results = ingest_file(file_obj, user=user, chunk_size=chunk_size, progress=progress, archivo=archivo)
+        archivo.metadata = results
+        archivo.ingerido_en = timezone.now()
+        archivo.save(update_fields=["metadata", "ingerido_en"])
+    return results
+
+
+def process_pdf(tmp_path, user, sha256=None):
+    """
+    Parses a DJ PDF (or takes the result from the parse cache), moves it to
+    its permanent location under MEDIA_ROOT/djs and registers the
+    ArchivoCargado. Returns the parsed data plus "archivo_id", which
+    BulkCreateView takes back to mark the upload as ingested.
+    """
+    # Parse (or parse cache hit), then store
+    data = parse_cache.parse_pdf(tmp_path, sha256)
+    archivo = store_pdf(tmp_path, data, user, sha256)
+    return {**data, "archivo_id": archivo.id}
+
+
+def store_pdf(tmp_path, data, user, sha256=None, ingerido=False):
+    """
+    Moves an already parsed PDF under MEDIA_ROOT/djs/<rut>/<year>/ and
+    registers its ArchivoCargado (`ingerido`: its rows are already written).
+    """
+    from django.conf import settings
+    import shutil
+    from .models import ArchivoCargado, Empresa
+
+    rut_empresa = data.get('rut_empresa') or 'unknown_rut'
+    fecha_str = data.get('fecha') or 'unknown_date'
+    year = 'unknown_year'
+    if fecha_str != 'unknown_date':
+        try:
+            year = pd.to_datetime(fecha_str, dayfirst=True).year
+        except:
+            pass
+
+    # 3. Define Permanent Path
+    storage_dir = os.path.join(settings.MEDIA_ROOT, 'djs', str(rut_empresa), str(year))
+    os.makedirs(storage_dir, exist_ok=True)
+
+    timestamp = int(time.time())
+    final_filename = f"DJ1948_{timestamp}.pdf"
+    final_path = os.path.join(storage_dir, final_filename)
+    n = 1
+    while os.path.exists(final_path):
+        # Several PDFs of the same company in the same second (ZIP uploads)
+        final_filename = f"DJ1948_{timestamp}_{n}.pdf"
+        final_path = os.path.join(storage_dir, final_filename)
+        n += 1
+
+    # Move file
+    shutil.move(tmp_path, final_path)
+
+    # 4. Create ArchivoCargado Record
+    empresa_obj = Empresa.objects.filter(rut=rut_empresa).first()
+
+    return ArchivoCargado.objects.create(
+        empresa=empresa_obj,
+        nombre_archivo=final_filename,
+        ruta=final_path,
+        cargado_por=user,
+        metadata=data,
+        sha256=sha256,
+        ingerido_en=timezone.now() if ingerido else None,
+    )
+
+
+def pdf_error_context(error, user, nombre_archivo):
+    """Builds the error context and generates the error report for a failed PDF."""
+    import datetime
+    from .utils import generate_error_report
+
+    timestamp_str = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    error_context = {
+        'line': 'Unknown',
+        'reason': str(error),
+        # Sandbox failures (timeout, memory, crash) name the limit that was hit
+        'criterio': getattr(error, 'criterio', 'Error de Procesamiento'),
+        'usuario': user.username if user else 'Sistema',
+        'timestamp': timestamp_str,
+        'archivo': nombre_archivo
+    }
+
+    # Generate (and logically save) report
+    generate_error_report("error_report", error_context)
+    return error_context
 
-        return Response(results)
 
 class PDFUploadView(APIView):
     permission_classes = [IsAuthenticated]
@@ -87,86 +222,174 @@ class PDFUploadView(APIView):
         if not file_obj.name.lower().endswith('.pdf'):
             return Response({"error": "File must be a PDF"}, status=400)
 
-        tmp_path = None
-        try:
-            # 1. Save to temp first to extract metadata
-            import time
-            from django.conf import settings
-            
+        return handle_pdf_upload(request, file_obj)
+
+
+def handle_pdf_upload(request, file_obj, sha256=None, ruta=None):
+    """
+    Processing behind PDFUploadView. `ruta` is set when the upload already
+    lives on disk (resumable uploads): it is then processed in place instead
+    of being copied, and consumed like in handle_tabular_upload.
+    """
+    if wants_async(request):
+        sha256 = sha256 or hash_upload(file_obj)
+        previous = find_previous_upload(sha256, request)
+        if previous:
+            if ruta:
+                os.remove(ruta)
+            return Response(previous)
+        return accepted_response(jobs.enqueue("carga_pdf", {
+            "ruta": ruta or jobs.save_upload(file_obj),
+            "nombre": file_obj.name,
+            "sha256": sha256,
+        }, request.user))
+
+    if wants_stream(request):
+        return stream_pdf_upload(request, file_obj, sha256, ruta)
+
+    tmp_path = ruta
+    try:
+        if tmp_path is None:
+            # 1. Save to temp first to extract metadata (hashing on the way)
             with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-                for chunk in file_obj.chunks():
-                    tmp.write(chunk)
+                sha256 = copy_and_hash(file_obj, tmp)
                 tmp_path = tmp.name
 
-            # 2. Extract Metadata (Basic Parse)
-            parser = PDFParser(tmp_path)
-            data = parser.parse_data()
-            
-            rut_empresa = data.get('rut_empresa') or 'unknown_rut'
-            fecha_str = data.get('fecha') or 'unknown_date'
-            year = 'unknown_year'
-            if fecha_str != 'unknown_date':
-                try:
-                    year = pd.to_datetime(fecha_str, dayfirst=True).year
-                except:
-                    pass
-            
-            # 3. Define Permanent Path
-            storage_dir = os.path.join(settings.MEDIA_ROOT, 'djs', str(rut_empresa), str(year))
-            os.makedirs(storage_dir, exist_ok=True)
-            
-            timestamp = int(time.time())
-            final_filename = f"DJ1948_{timestamp}.pdf"
-            final_path = os.path.join(storage_dir, final_filename)
-            
-            # Move file
-            import shutil
-            shutil.move(tmp_path, final_path)
-            tmp_path = None # Moved, so temp is gone (or we should have copied)
-            # shutil.move removes source if on same filesystem, usually.
-            
-            # 4. Create ArchivoCargado Record
-            from .models import ArchivoCargado, Empresa
-            
-            empresa_obj = Empresa.objects.filter(rut=rut_empresa).first()
-            
-            archivo = ArchivoCargado.objects.create(
-                empresa=empresa_obj,
-                nombre_archivo=final_filename,
-                ruta=final_path,
-                cargado_por=request.user,
-                metadata=data
-            )
-
-            return Response(data)
+        # Same bytes uploaded before: skip parse + persistence
+        previous = find_previous_upload(sha256, request)
+        if previous:
+            os.remove(tmp_path)
+            return Response(previous)
 
-        except Exception as e:
-            # Error Handling: Generate Error Report
-            import datetime
-            from .utils import generate_error_report
-            
-            timestamp_str = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            error_context = {
-                'line': 'Unknown',
-                'reason': str(e),
-                'criterio': 'Error de Procesamiento',
-                'usuario': request.user.username,
-                'timestamp': timestamp_str,
-                'archivo': file_obj.name
-            }
-            
-            # Generate (and logically save) report
-            pdf_bytes = generate_error_report("error_report", error_context)
-            
-            # Cleanup temp if it still exists
-            if tmp_path and os.path.exists(tmp_path):
-                os.remove(tmp_path)
-            
-            return Response({
-                "error": f"Error processing PDF: {str(e)}",
-                "error_report_generated": True,
-                "details": error_context
-            }, status=400)
+        data = process_pdf(tmp_path, request.user, sha256)
+        return Response(data)
+
+    except Exception as e:
+        # Error Handling: Generate Error Report
+        error_context = pdf_error_context(e, request.user, file_obj.name)
+
+        # Cleanup temp if it still exists
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+        return Response({
+            "error": f"Error processing PDF: {str(e)}",
+            "error_report_generated": True,
+            "details": error_context
+        }, status=400)
+
+def wants_stream(request):
+    """?stream=1: PDF results as newline-delimited JSON, page by page (see stream_pdf_upload)."""
+    return str(request.query_params.get('stream', '')).lower() in ('1', 'true', 'yes')
+
+
+def stream_pdf_upload(request, file_obj, sha256=None, ruta=None):
+    """
+    Streaming variant of handle_pdf_upload: an application/x-ndjson response
+    with one "header" record (rut_empresa, rut_propietario, fecha), then one
+    "calificacion" record per row as each page is parsed, then a "trailer"
+    with totals and timings. Failures after the response has started arrive
+    as an "error" record. Dedupe and persistence work as in the regular path.
+    """
+    tmp_path = ruta
+    if tmp_path is None:
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
+            sha256 = copy_and_hash(file_obj, tmp)
+            tmp_path = tmp.name
+    sha256 = sha256 or hash_path(tmp_path)
+    previous = find_previous_upload(sha256, request)
+
+    response = StreamingHttpResponse(
+        _pdf_records(tmp_path, request.user, sha256, file_obj.name, previous),
+        content_type="application/x-ndjson",
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # nginx: pass records through as they are produced
+    return response
+
+
+def _ndjson(record):
+    return json.dumps(record, default=str, ensure_ascii=False) + "\n"
+
+
+def _pdf_records(tmp_path, user, sha256, nombre_archivo, previous=None):
+    start = time.perf_counter()
+    first_row_seconds = None
+    try:
+        if previous:
+            # Same bytes uploaded before: replay the stored result
+            parts = iter([
+                {k: v for k, v in previous.items() if k != "calificaciones"},
+                previous.get("calificaciones", []),
+            ])
+        else:
+            parts = parse_cache.iter_parse_pdf(tmp_path, sha256)
+
+        data = {**next(parts), "calificaciones": []}
+        yield _ndjson({"record": "header", **{k: v for k, v in data.items() if k != "calificaciones"}})
+        for calificaciones in parts:
+            if calificaciones and first_row_seconds is None:
+                first_row_seconds = round(time.perf_counter() - start, 3)
+            for row in calificaciones:
+                yield _ndjson({"record": "calificacion", **row})
+            data["calificaciones"].extend(calificaciones)
+
+        trailer = {"record": "trailer", "total": len(data["calificaciones"])}
+        if previous:
+            trailer.update(duplicado=True, archivo_id=previous["archivo_id"])
+        else:
+            trailer["archivo_id"] = store_pdf(tmp_path, data, user, sha256).id
+        trailer.update(
+            first_row_seconds=first_row_seconds,
+            elapsed_seconds=round(time.perf_counter() - start, 3),
+        )
+        yield _ndjson(trailer)
+
+    except Exception as e:
+        yield _ndjson({
+            "record": "error",
+            "error": f"Error processing PDF: {str(e)}",
+            "error_report_generated": True,
+            "details": pdf_error_context(e, user, nombre_archivo),
+        })
+    finally:
+        # Still there unless store_pdf moved it (duplicate, error or client gone)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+class ZipUploadView(APIView):
+    """Several DJ1948 PDFs / CSV / XLSX files in one ZIP, parsed in parallel (see services/zip_ingest.py)."""
+    permission_classes = [IsAuthenticated]
+    parser_classes = (MultiPartParser, FormParser)
+
+    def post(self, request, *args, **kwargs):
+        file_obj = request.FILES.get('file')
+        if not file_obj:
+            return Response({"error": "No file provided"}, status=400)
+
+        if not file_obj.name.lower().endswith('.zip'):
+            return Response({"error": "File must be a ZIP archive"}, status=400)
+
+        if wants_async(request):
+            return accepted_response(jobs.enqueue("carga_zip", {
+                "ruta": jobs.save_upload(file_obj),
+                "nombre": file_obj.name,
+            }, request.user))
+
+        try:
+            return Response(ingest_zip(file_obj, user=request.user))
+        except (zipfile.BadZipFile, ValueError) as e:
+            return Response({"error": f"Error reading ZIP: {str(e)}"}, status=400)
+
+class ParseCacheView(APIView):
+    """GET: parse cache counters and size. DELETE: empties it (e.g. after a parser fix without a version bump)."""
+    permission_classes = [IsAdmin]
+
+    def get(self, request, *args, **kwargs):
+        return Response(parse_cache.stats())
+
+    def delete(self, request, *args, **kwargs):
+        return Response({"eliminadas": parse_cache.clear()})
 
 class BulkCreateView(APIView):
     permission_classes = [IsAuthenticated]
@@ -176,87 +399,16 @@ class BulkCreateView(APIView):
         if not data:
             return Response({"error": "No data provided"}, status=400)
 
-        results = {
-            "created": 0,
-            "errors": []
-        }
-
-        # Expecting data to be a list of objects similar to what PDFParser returns, 
-        # but flattened or structured. 
-        # Actually, PDFParser returns {rut_empresa, rut_propietario, calificaciones: []}
-        # We need to iterate over qualifications.
-        
-        # Let's assume the frontend sends a list of qualifications with company/owner info attached
-        # OR the frontend sends the exact structure from PDFParser and we handle it.
-        # Let's support the structure: { rut_empresa, rut_propietario, calificaciones: [...] }
-        
-        try:
-            rut_empresa = data.get('rut_empresa')
-            rut_propietario = data.get('rut_propietario')
-            calificaciones = data.get('calificaciones', [])
-            
-            # Optional: Razon Social and Nombre Propietario might be missing from PDF or edited by user
-            razon_social = data.get('razon_social', 'Empresa sin nombre')
-            nombre_propietario = data.get('nombre_propietario', 'Propietario sin nombre')
-
-            with transaction.atomic():
-                empresa, _ = Empresa.objects.get_or_create(
-                    rut=rut_empresa,
-                    defaults={'razon_social': razon_social}
-                )
-
-                # Strategy: If top-level rut_propietario exists, use it for all (Cert70 style).
-                # If not, expect it in each calificacion (DJ1948 style).
-                
-                global_propietario = None
-                if rut_propietario:
-                    global_propietario, _ = Propietario.objects.get_or_create(
-                        rut=rut_propietario,
-                        empresa=empresa,
-                        defaults={'nombre': nombre_propietario}
-                    )
-
-                for cal in calificaciones:
-                    # Determine owner for this row
-                    row_rut = cal.get('rut_propietario')
-                    
-                    current_propietario = global_propietario
-                    if not current_propietario:
-                        if not row_rut:
-                            results["errors"].append(f"Falta RUT de propietario en fila (Fecha: {cal.get('fecha')})")
-                            continue
-                            
-                        # Find or Create Owner for this row
-                        # Name might be missing in row, use default or provided one
-                        row_nombre = cal.get('nombre_propietario') or cal.get('nombre') or 'Propietario Sin Nombre'
-                        current_propietario, created_prop = Propietario.objects.get_or_create(
-                            rut=row_rut,
-                            empresa=empresa,
-                            defaults={'nombre': row_nombre}
-                        )
-                        # Optional: Update name if it was "Sin Nombre" before and we have a better one now
-                        if not created_prop and current_propietario.nombre == 'Propietario Sin Nombre' and row_nombre != 'Propietario Sin Nombre':
-                             current_propietario.nombre = row_nombre
-                             current_propietario.save()
-
-
-                    
-                    # Prevent duplicates using update_or_create
-                    # Lookup fields: Company, Owner, Date, Type, Amount (assuming these define uniqueness for a line)
-                    CalificacionTributaria.objects.update_or_create(
-                        empresa=empresa,
-                        propietario=current_propietario,
-                        fecha=pd.to_datetime(cal['fecha'], dayfirst=True).date(),
-                        tipo=cal['tipo'],
-                        monto_original=int(cal['monto']),
-                        defaults={
-                            'imputacion': cal.get('imputacion', 'SIN CLASIFICAR'),
-                            'estado': 'pendiente'
-                        }
-                    )
-                    results["created"] += 1
-                    
-        except Exception as e:
-             results["errors"].append(str(e))
-
+        # Expects the structure returned by PDFParser:
+        # { rut_empresa, rut_propietario, calificaciones: [...] }
+        # If top-level rut_propietario exists, it is used for all rows (Cert70 style);
+        # if not, every calificacion carries its own (DJ1948 style).
+        # Razon Social and Nombre Propietario may be missing from the PDF or edited by the user.
+        # "archivo_id" of the PDF preview being confirmed: its upload counts as ingested from now on
+        dry_run = wants_dry_run(request)
+        results = upsert_calificaciones(data, user=request.user, dry_run=dry_run)
+        archivo_id = data.get('archivo_id') if isinstance(data, dict) else None
+        if archivo_id and not dry_run and (results.get("created") or results.get("updated")):
+            from .models import ArchivoCargado
+            ArchivoCargado.objects.filter(pk=archivo_id, ingerido_en__isnull=True).update(ingerido_en=timezone.now())
         return Response(results)
@@ -0,0 +1,111 @@
+import os
+from django.core.files import File
+from django.shortcuts import get_object_or_404
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework.permissions import IsAuthenticated
+from .models import CargaFragmentada
+from .serializers import CargaFragmentadaSerializer
+from .services import chunked_upload
+from .services.chunked_upload import FragmentoError
+from .utils import hash_path
+from .bulk_upload_views import handle_tabular_upload, handle_pdf_upload, wants_dry_run
+
+
+def _get_carga(request, pk):
+    return get_object_or_404(CargaFragmentada, pk=pk, creado_por=request.user)
+
+
+class CargaFragmentadaView(APIView):
+    """
+    Resumable uploads for very large files:
+      POST   /api/cargas/                          -> initiate {nombre_archivo, tamano, tamano_fragmento?, sha256?}
+      PUT    /api/cargas/<id>/fragmentos/<n>/      -> raw bytes + X-Chunk-SHA256 header
+      GET    /api/cargas/<id>/                     -> status (fragmentos_faltantes)
+      POST   /api/cargas/<id>/finalizar/           -> processed like /upload/ or /upload-pdf/
+      DELETE /api/cargas/<id>/                     -> cancel
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, pk=None):
+        try:
+            carga = chunked_upload.iniciar(
+                request.data.get('nombre_archivo'),
+                int(request.data.get('tamano') or 0),
+                request.user,
+                tamano_fragmento=int(request.data.get('tamano_fragmento') or 0) or None,
+                sha256=request.data.get('sha256'),
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+        return Response(CargaFragmentadaSerializer(carga).data, status=201)
+
+    def get(self, request, pk):
+        return Response(CargaFragmentadaSerializer(_get_carga(request, pk)).data)
+
+    def delete(self, request, pk):
+        carga = _get_carga(request, pk)
+        if carga.estado == "iniciada":
+            chunked_upload.descartar(carga)
+        return Response(status=204)
+
+
+class FragmentoView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def put(self, request, pk, numero):
+        carga = _get_carga(request, pk)
+        if carga.estado != "iniciada":
+            return Response({"error": f"La carga está {carga.estado}"}, status=409)
+        try:
+            # request.stream is the raw body: the fragment is never loaded in memory
+            carga = chunked_upload.escribir_fragmento(
+                carga,
+                numero,
+                request.stream,
+                int(request.headers.get('Content-Length') or 0),
+                request.headers.get('X-Chunk-SHA256'),
+            )
+        except FragmentoError as e:
+            return Response({"error": str(e)}, status=400)
+        return Response({
+            "numero": numero,
+            "fragmentos_recibidos": len(carga.fragmentos_recibidos),
+            "total_fragmentos": carga.total_fragmentos,
+        })
+
+
+class FinalizarCargaView(APIView):
+    """Hands the assembled file to the BulkUploadView / PDFUploadView processing (same query params)."""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, pk):
+        carga = _get_carga(request, pk)
+        if carga.estado != "iniciada":
+            return Response({"error": f"La carga está {carga.estado}"}, status=409)
+        faltantes = carga.fragmentos_faltantes()
+        if faltantes:
+            return Response({"error": "Faltan fragmentos", "fragmentos_faltantes": faltantes}, status=400)
+
+        is_pdf = carga.nombre_archivo.lower().endswith('.pdf')
+        if wants_dry_run(request) and not is_pdf:
+            # Preview only: the upload stays open so it can be finalized afterwards
+            with open(carga.ruta, 'rb') as f:
+                return handle_tabular_upload(request, File(f, name=carga.nombre_archivo))
+
+        sha256 = hash_path(carga.ruta)
+        if carga.sha256 and carga.sha256.lower() != sha256:
+            chunked_upload.descartar(carga)
+            return Response({"error": "El checksum del archivo completo no coincide"}, status=400)
+
+        # Give the file its real name: readers and jobs detect the format from the extension
+        ruta = os.path.join(os.path.dirname(carga.ruta), f"{carga.id.hex}_{carga.nombre_archivo}")
+        os.replace(carga.ruta, ruta)
+        carga.ruta = ruta
+        carga.estado = "finalizada"
+        carga.save(update_fields=["ruta", "estado", "actualizado_en"])
+
+        # The handlers consume the file (remove it, move it or hand it to a job)
+        handle = handle_pdf_upload if is_pdf else handle_tabular_upload
+        with open(ruta, 'rb') as f:
+            return handle(request, File(f, name=carga.nombre_archivo), sha256=sha256, ruta=ruta)
@@ -0,0 +1,157 @@
+"""
+Background job handlers (see services/jobs.py). Imported from AppConfig.ready
+so the registry is populated in both web and worker processes.
+"""
+import os
+import zipfile
+from pdfplumber.utils.exceptions import PdfminerException
+from pypdfium2 import PdfiumError
+from calificaciones.models import Empresa, CalificacionTributaria, Auditoria
+from calificaciones.services import jobs
+from calificaciones.services.parser_sandbox import ParseFailed
+from calificaciones.services.exports import (
+    render_calificaciones_pdf, render_auditoria_pdf, render_auditoria_xlsx, iter_in_order
+)
+
+
+def _cleanup(path):
+    if path and os.path.exists(path):
+        os.remove(path)
+
+
+# Ingest is not idempotent (rows are created, not upserted), so it is never retried
+@jobs.register("carga_tabular", max_intentos=1)
+def carga_tabular(parametros, job):
+    from calificaciones.bulk_upload_views import ingest_upload
+
+    ruta = parametros["ruta"]
+    try:
+        with open(ruta, 'rb') as file_obj:
+            return ingest_upload(
+                file_obj,
+                parametros.get("nombre") or ruta,
+                job.tarea.creado_por,
+                sha256=parametros.get("sha256"),
+                chunk_size=parametros.get("chunk_size"),
+                progress=job.progress,
+            )
+    finally:
+        _cleanup(ruta)
+
+
+# The document itself can't be parsed: another attempt would fail the same way
+PDF_PARSE_ERRORS = (ParseFailed, ValueError, PdfminerException, PdfiumError)
+
+
+@jobs.register("carga_pdf")
+def carga_pdf(parametros, job):
+    from calificaciones.bulk_upload_views import process_pdf, pdf_error_context
+
+    ruta = parametros["ruta"]
+    try:
+        # process_pdf moves the file to MEDIA_ROOT/djs on success
+        return process_pdf(ruta, job.tarea.creado_por, parametros.get("sha256"))
+    except PDF_PARSE_ERRORS as e:
+        error_context = pdf_error_context(e, job.tarea.creado_por, parametros.get("nombre"))
+        _cleanup(ruta)
+        raise jobs.JobError(f"Error processing PDF: {str(e)}", detalle={
+            "error_report_generated": True,
+            "details": error_context
+        })
+    except Exception:
+        # Sandbox timeout / memory limit / lost worker, DB or disk errors: jobs.run retries,
+        # so the file stays for the next attempt
+        if job.tarea.intentos >= job.tarea.max_intentos:
+            _cleanup(ruta)
+        raise
+
+
+# Same as carga_tabular: members are created, not upserted, so no retries
+@jobs.register("carga_zip", max_intentos=1)
+def carga_zip(parametros, job):
+    from calificaciones.services.zip_ingest import ingest_zip
+
+    ruta = parametros["ruta"]
+    try:
+        return ingest_zip(ruta, user=job.tarea.creado_por)
+    except (zipfile.BadZipFile, ValueError) as e:
+        raise jobs.JobError(f"Error reading ZIP: {str(e)}")
+    finally:
+        _cleanup(ruta)
+
+
+@jobs.register("cert70")
+def cert70(parametros, job):
+    from calificaciones.services.cert70_batch import generate_certificates
+
+    try:
+        empresa = Empresa.objects.get(id=parametros["empresa_id"])
+    except Empresa.DoesNotExist:
+        raise jobs.JobError("Empresa no encontrada")
+
+    created_count, last_cert = generate_certificates(
+        empresa, parametros["anio"], job.tarea.creado_por, parametros.get("propietario_id")
+    )
+    return {
+        "message": f"Se han generado {created_count} certificados para {empresa.razon_social}",
+        "count": created_count,
+        "certificado_id": last_cert.id if created_count == 1 and last_cert else None,
+    }
+
+
+@jobs.register("cert70_zip")
+def cert70_zip(parametros, job):
+    from calificaciones.services.cert70_render import render_zip
+
+    ids = parametros["ids"]
+    path = jobs.result_path(job.tarea, "zip")
+    job.progress(0, total=len(ids), force=True)
+    reporte = render_zip(ids, path, progress=job.progress)
+    return {"archivo": path, "filename": parametros.get("filename") or "certificados70.zip", **reporte}
+
+
+@jobs.register("informe_gestion")
+def informe_gestion(parametros, job):
+    from calificaciones.services.report_generator import ReportGenerator
+
+    try:
+        empresa = Empresa.objects.get(id=parametros["empresa_id"])
+    except Empresa.DoesNotExist:
+        raise jobs.JobError("Empresa no encontrada")
+
+    pdf_buffer = ReportGenerator(
+        empresa, parametros["start_date"], parametros["end_date"], job.tarea.creado_por
+    ).generate()
+    path = jobs.result_path(job.tarea, "pdf")
+    with open(path, 'wb') as out:
+        out.write(pdf_buffer.getvalue())
+    return {
+        "archivo": path,
+        "filename": f"Informe_Gestion_{empresa.rut}_{parametros['start_date']}_{parametros['end_date']}.pdf",
+    }
+
+
+def _export(job, ids, queryset, render, extension, filename):
+    path = jobs.result_path(job.tarea, extension)
+    job.progress(0, total=len(ids), force=True)
+    with open(path, 'wb') as out:
+        render(iter_in_order(queryset, ids), out)
+    return {"archivo": path, "filename": filename, "registros": len(ids)}
+
+
+@jobs.register("export_calificaciones_pdf")
+def export_calificaciones_pdf(parametros, job):
+    queryset = CalificacionTributaria.objects.select_related('empresa', 'propietario')
+    return _export(job, parametros["ids"], queryset, render_calificaciones_pdf, "pdf", "calificaciones.pdf")
+
+
+@jobs.register("export_auditoria_pdf")
+def export_auditoria_pdf(parametros, job):
+    queryset = Auditoria.objects.select_related('usuario')
+    return _export(job, parametros["ids"], queryset, render_auditoria_pdf, "pdf", "auditoria.pdf")
+
+
+@jobs.register("export_auditoria_xlsx")
+def export_auditoria_xlsx(parametros, job):
+    queryset = Auditoria.objects.select_related('usuario')
+    return _export(job, parametros["ids"], queryset, render_auditoria_xlsx, "xlsx", "auditoria.xlsx")
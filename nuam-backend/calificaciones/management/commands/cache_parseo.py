@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from calificaciones.services import parse_cache
+
+
+class Command(BaseCommand):
+    help = "Muestra el estado de la caché de resultados de parseo de PDFs; opcionalmente la recorta o la vacía."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recortar', action='store_true', help="Aplica ahora el límite PARSE_CACHE_MAX_BYTES")
+        parser.add_argument('--vaciar', action='store_true', help="Elimina todas las entradas y reinicia los contadores")
+
+    def handle(self, *args, **options):
+        if options['vaciar']:
+            self.stdout.write(f"{parse_cache.clear()} entradas eliminadas")
+        elif options['recortar']:
+            self.stdout.write(f"{parse_cache.evict()} entradas eliminadas")
+
+        stats = parse_cache.stats()
+        hit_rate = f"{stats['hit_rate']:.1%}" if stats['hit_rate'] is not None else "-"
+        self.stdout.write(
+            f"versión {stats['version']}: {stats['entradas']} entradas ({stats['entradas_obsoletas']} obsoletas), "
+            f"{stats['bytes']} / {stats['max_bytes']} bytes"
+        )
+        self.stdout.write(f"aciertos {stats['hits']}, fallos {stats['misses']} (tasa {hit_rate})")
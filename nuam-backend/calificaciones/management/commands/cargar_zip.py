@@ -0,0 +1,50 @@
+import json
+import zipfile
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from calificaciones.services.zip_ingest import ingest_zip
+
+
+class Command(BaseCommand):
+    help = (
+        "Carga un ZIP con DJ1948 en PDF y planillas CSV/XLSX. Los archivos se procesan "
+        "en paralelo (un proceso por CPU por defecto) y se informa el resultado de cada uno."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('ruta', help="Ruta del archivo ZIP")
+        parser.add_argument('--usuario', default=None, help="Username al que se atribuye la carga")
+        parser.add_argument('--workers', type=int, default=None, help="Procesos de parseo (por defecto ZIP_INGEST_WORKERS o nº de CPUs)")
+        parser.add_argument('--chunk-size', type=int, default=None)
+        parser.add_argument('--json', action='store_true', help="Imprime el reporte completo en JSON")
+
+    def handle(self, *args, **options):
+        user = None
+        if options['usuario']:
+            try:
+                user = get_user_model().objects.get(username=options['usuario'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"Usuario no encontrado: {options['usuario']}")
+
+        try:
+            result = ingest_zip(options['ruta'], user=user, workers=options['workers'], chunk_size=options['chunk_size'])
+        except (OSError, zipfile.BadZipFile, ValueError) as e:
+            raise CommandError(f"Error leyendo el ZIP: {e}")
+
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2, default=str, ensure_ascii=False))
+            return
+
+        for entry in result["archivos_detalle"]:
+            line = f"{entry['estado']:>10}  {entry['archivo']}"
+            if entry.get("created") or entry.get("updated"):
+                line += f"  (creadas {entry.get('created', 0)}, actualizadas {entry.get('updated', 0)})"
+            if entry.get("error"):
+                line += f"  {entry['error']}"
+            elif entry.get("errors"):
+                line += f"  {len(entry['errors'])} errores"
+            self.stdout.write(line)
+        self.stdout.write(
+            f"{result['archivos']} archivos, {result['created']} creadas, {result['updated']} actualizadas "
+            f"en {result['elapsed_seconds']}s (parseo {result['parse_seconds']}s con {result['workers']} procesos)"
+        )
@@ -0,0 +1,43 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from calificaciones.models import Certificado70
+from calificaciones.services.cert70_render import ZipRenderer
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera los PDF de los Certificados 70 ya calculados de una empresa (y año) en paralelo "
+        "y los escribe en un único ZIP, con el tiempo de cada certificado."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('salida', help="Ruta del ZIP a escribir")
+        parser.add_argument('--empresa', type=int, required=True, help="Id de la empresa")
+        parser.add_argument('--anio', type=int, default=None, help="Año comercial (por defecto todos)")
+        parser.add_argument('--workers', type=int, default=None, help="Procesos de render (por defecto CERT70_RENDER_WORKERS o nº de CPUs)")
+        parser.add_argument('--json', action='store_true', help="Imprime el reporte en JSON")
+
+    def handle(self, *args, **options):
+        certificados = Certificado70.objects.filter(empresa_id=options['empresa'])
+        if options['anio']:
+            certificados = certificados.filter(anio_comercial=options['anio'])
+        ids = list(certificados.order_by('propietario_id', 'anio_comercial').values_list('id', flat=True))
+        if not ids:
+            raise CommandError("No hay certificados para la empresa / año indicados")
+
+        result = ZipRenderer(workers=options['workers']).render(ids, options['salida'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2, ensure_ascii=False))
+            return
+        if options['verbosity'] >= 2:
+            for t in result['tiempos']:
+                self.stdout.write(f"  #{t['id']} {t['archivo']}: {t['segundos']}s, {t['bytes']} bytes")
+        for e in result['errores']:
+            self.stdout.write(f"  #{e['id']}: {e['error']}")
+        render = result['render_segundos']
+        self.stdout.write(
+            f"{result['certificados']} certificados en {result['elapsed_seconds']}s con {result['workers']} procesos "
+            f"({result['certificados_por_segundo']} cert/s; render mediana {render['mediana']}s, máx {render['max']}s), "
+            f"{len(result['errores'])} errores -> {options['salida']}"
+        )
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from calificaciones.services import chunked_upload
+
+
+class Command(BaseCommand):
+    help = (
+        "Elimina las cargas fragmentadas sin actividad por más de CARGA_EXPIRA_HORAS horas "
+        "y sus archivos .part (pensado para cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--horas', type=int, default=None, help="Horas sin actividad (por defecto CARGA_EXPIRA_HORAS)")
+
+    def handle(self, *args, **options):
+        result = chunked_upload.limpiar_vencidas(horas=options['horas'])
+        self.stdout.write(f"{result['cargas']} cargas vencidas eliminadas, {result['archivos']} archivos .part borrados")
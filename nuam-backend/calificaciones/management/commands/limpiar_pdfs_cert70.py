@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from calificaciones.services import cert70_pdf_cache
+
+
+class Command(BaseCommand):
+    help = (
+        "Limpia la caché de PDF de Certificados 70: elimina los archivos huérfanos más antiguos que "
+        "CERT70_PDF_CACHE_MAX_AGE_DAYS y, sobre CERT70_PDF_CACHE_MAX_BYTES, los menos usados."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-bytes', type=int, default=None, help="Tamaño máximo de la caché (por defecto CERT70_PDF_CACHE_MAX_BYTES)")
+        parser.add_argument('--max-dias', type=int, default=None, help="Antigüedad máxima de los huérfanos (por defecto CERT70_PDF_CACHE_MAX_AGE_DAYS)")
+        parser.add_argument('--simular', action='store_true', help="Solo informa lo que se eliminaría")
+
+    def handle(self, *args, **options):
+        result = cert70_pdf_cache.evict(
+            max_bytes=options['max_bytes'], max_age_days=options['max_dias'], dry_run=options['simular']
+        )
+        accion = "se eliminarían" if options['simular'] else "eliminados"
+        self.stdout.write(
+            f"{result['archivos']} archivos en caché: {result['eliminados']} {accion} "
+            f"({result['huerfanos_eliminados']} huérfanos, {result['bytes_liberados']} bytes); "
+            f"quedan {result['bytes']} / {result['max_bytes']} bytes"
+        )
@@ -0,0 +1,61 @@
+import signal
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from calificaciones.services import jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Worker de tareas en segundo plano (cargas, certificados, informes, exportaciones). "
+        "Se escala levantando más procesos en la misma máquina."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Procesa la cola hasta vaciarla y termina")
+        parser.add_argument('--poll', type=float, default=None, help="Segundos de espera cuando la cola está vacía")
+        parser.add_argument('--max-tareas', type=int, default=None, help="Termina tras procesar N tareas")
+        parser.add_argument('--worker-id', default=None)
+
+    def handle(self, *args, **options):
+        poll = options['poll'] or getattr(settings, 'TAREAS_POLL_INTERVAL', 2)
+        worker_id = options['worker_id'] or jobs.default_worker_id()
+        max_tareas = options['max_tareas']
+        self._stopping = False
+
+        def request_stop(signum, frame):
+            # Finish the current job, then exit (gunicorn-style graceful shutdown)
+            self._stopping = True
+        signal.signal(signal.SIGTERM, request_stop)
+        signal.signal(signal.SIGINT, request_stop)
+
+        self.stdout.write(f"Worker {worker_id} iniciado")
+        processed = 0
+        last_recovery = 0.0
+        while not self._stopping:
+            close_old_connections()
+
+            if time.monotonic() - last_recovery > 60:
+                requeued, failed = jobs.requeue_stale()
+                if requeued or failed:
+                    self.stdout.write(f"Tareas huérfanas: {requeued} reencoladas, {failed} fallidas")
+                last_recovery = time.monotonic()
+
+            tarea = jobs.claim_next(worker_id)
+            if tarea is None:
+                if options['once']:
+                    break
+                time.sleep(poll)
+                continue
+
+            start = time.perf_counter()
+            jobs.run(tarea)
+            self.stdout.write(
+                f"Tarea {tarea.id} ({tarea.tipo}) -> {tarea.estado} en {time.perf_counter() - start:.1f}s"
+            )
+            processed += 1
+            if max_tareas and processed >= max_tareas:
+                break
+
+        self.stdout.write(f"Worker {worker_id} detenido ({processed} tareas procesadas)")
@@ -0,0 +1,35 @@
+import json
+from django.core.management.base import BaseCommand
+from calificaciones.services import cert70_totals
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula los totales Cert70 acumulados (TotalCert70) desde las calificaciones y créditos "
+        "y muestra las diferencias. Con --corregir reemplaza las filas con diferencias."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corregir', action='store_true', help="Reescribe las filas con diferencias")
+        parser.add_argument('--empresa', type=int, default=None, help="Solo esta empresa (id)")
+        parser.add_argument('--anio', type=int, default=None, help="Solo este año comercial")
+        parser.add_argument('--json', action='store_true', help="Imprime el resultado en JSON")
+
+    def handle(self, *args, **options):
+        result = cert70_totals.reconcile(
+            empresa_id=options['empresa'], anio=options['anio'], corregir=options['corregir']
+        )
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2, ensure_ascii=False))
+            return
+
+        for d in result['diferencias']:
+            columnas = ", ".join(f"{c} {g} -> {e}" for c, (g, e) in d['columnas'].items())
+            estado = "faltante" if d['faltante'] else "distinta"
+            self.stdout.write(
+                f"  empresa {d['empresa_id']} socio {d['propietario_id']} año {d['anio']} ({estado}): {columnas}"
+            )
+        accion = f"{result['corregidos']} corregidas" if options['corregir'] else "sin corregir (usar --corregir)"
+        self.stdout.write(
+            f"{result['revisados']} filas revisadas: {len(result['diferencias'])} con diferencias ({accion})"
+        )
@@ -0,0 +1,60 @@
+import json
+from django.core.management.base import BaseCommand
+from calificaciones.services.reparse import ArchiveReparser
+
+
+class Command(BaseCommand):
+    help = (
+        "Vuelve a parsear los PDF ya cargados (ArchivoCargado.ruta) con el parser actual y compara "
+        "el resultado con la metadata guardada. Con --write guarda la metadata nueva."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--write', action='store_true', help="Guarda la metadata de los archivos que cambiaron")
+        parser.add_argument('--workers', type=int, default=None, help="Procesos de parseo (por defecto PDF_SANDBOX_WORKERS o nº de CPUs)")
+        parser.add_argument('--chunk-size', type=int, default=500, help="Archivos por lote (lectura, parseo y bulk_update)")
+        parser.add_argument('--checkpoint', default=None, help="Archivo JSON de avance: si existe, se reanuda desde él")
+        parser.add_argument('--json', action='store_true', help="Imprime el resumen final en JSON")
+
+    def handle(self, *args, **options):
+        detalle = options['verbosity'] >= 2
+        # --json keeps stdout for the summary
+        log = self.stderr if options['json'] else self.stdout
+
+        def progress(state):
+            log.write(
+                f"{state['avance']}/{state['total']} archivos (hasta id {state['ultimo_id']}, "
+                f"{state['archivos_por_segundo']} archivos/s): {state['cambiados']} con cambios, "
+                f"{state['errores']} errores, {state['faltantes']} faltantes"
+            )
+
+        def report(archivo, cambios):
+            if not detalle:
+                return
+            if "error" in cambios:
+                log.write(f"  #{archivo.id} {archivo.ruta}: {cambios['error']}")
+                return
+            campos = ", ".join(f"{c} {a!r} -> {d!r}" for c, (a, d) in cambios["cabecera"].items())
+            log.write(
+                f"  #{archivo.id} {archivo.ruta}: +{cambios['agregadas']} / -{cambios['eliminadas']} filas"
+                + (f"; {campos}" if campos else "")
+            )
+
+        reparser = ArchiveReparser(
+            workers=options['workers'],
+            chunk_size=options['chunk_size'],
+            write=options['write'],
+            checkpoint=options['checkpoint'],
+            progress=progress,
+            report=report,
+        )
+        result = reparser.run()
+
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2, ensure_ascii=False))
+            return
+        accion = f"{result['escritos']} actualizados" if options['write'] else "sin escribir (usar --write)"
+        self.stdout.write(
+            f"{result['procesados']} archivos en {result['elapsed_seconds']}s: {result['cambiados']} con cambios "
+            f"({accion}), {result['sin_cambios']} sin cambios, {result['errores']} errores, {result['faltantes']} faltantes"
+        )
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calificaciones', '0006_tarea'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivocargado',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+    ]
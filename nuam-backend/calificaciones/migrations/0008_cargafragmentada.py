@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:01
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calificaciones', '0007_archivocargado_sha256'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CargaFragmentada',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('nombre_archivo', models.CharField(max_length=255)),
+                ('tamano', models.BigIntegerField()),
+                ('tamano_fragmento', models.PositiveIntegerField()),
+                ('fragmentos_recibidos', models.JSONField(blank=True, default=list)),
+                ('sha256', models.CharField(blank=True, max_length=64, null=True)),
+                ('ruta', models.CharField(max_length=1024)),
+                ('estado', models.CharField(choices=[('iniciada', 'iniciada'), ('finalizada', 'finalizada'), ('cancelada', 'cancelada')], default='iniciada', max_length=20)),
+                ('creado_en', models.DateTimeField(auto_now_add=True)),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+                ('creado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'cargas_fragmentadas',
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:17
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calificaciones', '0008_cargafragmentada'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResultadoParseo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64)),
+                ('version', models.CharField(max_length=20)),
+                ('datos', models.JSONField()),
+                ('tamano', models.PositiveIntegerField()),
+                ('aciertos', models.PositiveIntegerField(default=0)),
+                ('creado_en', models.DateTimeField(auto_now_add=True)),
+                ('usado_en', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'resultados_parseo',
+                'unique_together': {('sha256', 'version')},
+            },
+        ),
+    ]
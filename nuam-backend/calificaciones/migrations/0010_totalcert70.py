@@ -0,0 +1,120 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:51
+
+from collections import defaultdict
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Coalesce, ExtractYear, NullIf
+
+
+# Frozen copy of the Cert70 columns and aggregation at the time of this migration
+# (services/cert70_engine.py, services/cert70_totals.expected): later changes to the app don't apply here
+IMPUTACIONES = ("rai", "ddan", "rex", "inr", "sac")
+CREDITOS = ("credito_con_dev", "credito_sin_dev", "credito_restitucion", "isfut", "otros_creditos")
+COLUMNS = ("movimientos", "monto_historico", "monto_actualizado", *IMPUTACIONES, *CREDITOS)
+
+
+def imputacion_column(imputacion):
+    imputacion = imputacion.upper()
+    return next((n for n, code in enumerate(IMPUTACIONES) if code.upper() in imputacion), -1)
+
+
+def credito_column(tipo):
+    tipo = tipo.lower()
+    for n, words in enumerate((("con devolución", "con devolucion"), ("sin devolución", "sin devolucion"),
+                               ("restitución", "restitucion"), ("isfut",))):
+        if any(word in tipo for word in words):
+            return n
+    return len(CREDITOS) - 1
+
+
+def fill_totales(apps, schema_editor):
+    # Running totals of the calificaciones that already exist (same computation as the reconciliation)
+    CalificacionTributaria = apps.get_model('calificaciones', 'CalificacionTributaria')
+    CreditoIDPC = apps.get_model('calificaciones', 'CreditoIDPC')
+    TotalCert70 = apps.get_model('calificaciones', 'TotalCert70')
+    totales = defaultdict(lambda: [0] * len(COLUMNS))
+
+    grupos = (
+        CalificacionTributaria.objects.filter(estado='vigente')
+        .values('empresa_id', 'propietario_id', 'imputacion', anio=ExtractYear('fecha'))
+        .annotate(
+            n=Count('id'),
+            historico=Sum('monto_original'),
+            actualizado=Sum(Coalesce(NullIf('monto_reajustado', Value(0)), 'monto_original')),
+        )
+        .order_by()
+    )
+    for g in grupos:
+        row = totales[(g['empresa_id'], g['propietario_id'], g['anio'])]
+        row[0] += g['n']
+        row[1] += g['historico']
+        row[2] += g['actualizado']
+        column = imputacion_column(g['imputacion'] or "")
+        if column >= 0:
+            row[3 + column] += g['actualizado']
+
+    grupos = (
+        CreditoIDPC.objects.filter(calificacion__estado='vigente')
+        .values(
+            'tipo',
+            empresa=F('calificacion__empresa_id'),
+            propietario=F('calificacion__propietario_id'),
+            anio=ExtractYear('calificacion__fecha'),
+        )
+        .annotate(total=Sum('monto'))
+        .order_by()
+    )
+    for g in grupos:
+        totales[(g['empresa'], g['propietario'], g['anio'])][3 + len(IMPUTACIONES) + credito_column(g['tipo'] or "")] += g['total']
+
+    TotalCert70.objects.bulk_create([
+        TotalCert70(empresa_id=empresa_id, propietario_id=propietario_id, anio=anio, revision=1, **dict(zip(COLUMNS, row)))
+        for (empresa_id, propietario_id, anio), row in totales.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calificaciones', '0009_resultadoparseo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='certificado70',
+            name='revision_totales',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='TotalCert70',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('anio', models.PositiveIntegerField()),
+                ('movimientos', models.BigIntegerField(default=0)),
+                ('monto_historico', models.BigIntegerField(default=0)),
+                ('monto_actualizado', models.BigIntegerField(default=0)),
+                ('rai', models.BigIntegerField(default=0)),
+                ('ddan', models.BigIntegerField(default=0)),
+                ('rex', models.BigIntegerField(default=0)),
+                ('inr', models.BigIntegerField(default=0)),
+                ('sac', models.BigIntegerField(default=0)),
+                ('credito_con_dev', models.BigIntegerField(default=0)),
+                ('credito_sin_dev', models.BigIntegerField(default=0)),
+                ('credito_restitucion', models.BigIntegerField(default=0)),
+                ('isfut', models.BigIntegerField(default=0)),
+                ('otros_creditos', models.BigIntegerField(default=0)),
+                ('revision', models.PositiveBigIntegerField(default=0)),
+                ('actualizado_en', models.DateTimeField(default=django.utils.timezone.now)),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='totales_cert70', to='calificaciones.empresa')),
+                ('propietario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='totales_cert70', to='calificaciones.propietario')),
+            ],
+            options={
+                'db_table': 'totales_cert70',
+                'unique_together': {('empresa', 'propietario', 'anio')},
+            },
+        ),
+        migrations.RunPython(fill_totales, migrations.RunPython.noop),
+    ]
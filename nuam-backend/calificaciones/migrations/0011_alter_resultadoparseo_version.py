@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calificaciones', '0010_totalcert70'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='resultadoparseo',
+            name='version',
+            field=models.CharField(max_length=40),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calificaciones', '0011_alter_resultadoparseo_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContadorParseo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=20, unique=True)),
+                ('valor', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'contadores_parseo',
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:36
+
+from django.db import migrations, models
+from django.db.models import F, Q
+
+
+def mark_ingested(apps, schema_editor):
+    # Finished CSV/XLSX uploads wrote their rows; stored PDFs may have been only previewed
+    ArchivoCargado = apps.get_model('calificaciones', 'ArchivoCargado')
+    ArchivoCargado.objects.filter(Q(ruta__isnull=True) | Q(ruta=''), metadata__isnull=False).update(ingerido_en=F('cargado_en'))
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calificaciones', '0012_contadorparseo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivocargado',
+            name='ingerido_en',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(mark_ingested, migrations.RunPython.noop),
+    ]
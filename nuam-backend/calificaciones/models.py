@@ -1,5 +1,7 @@
 from django.db import models
+import uuid
 from django.conf import settings
+from django.utils import timezone
 
 # Nota: JSONField requiere MySQL >= 5.7.8. Si no lo tienes, cambia JSONField por TextField y serializa manualmente.
 try:
@@ -81,6 +83,9 @@ class ArchivoCargado(models.Model):
     cargado_por = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
     cargado_en = models.DateTimeField(auto_now_add=True)
     metadata = JSONField(blank=True, null=True)
+    sha256 = models.CharField(max_length=64, blank=True, null=True, db_index=True)  # content hash, to detect re-uploads
+    # When its rows were written (tabular ingest, ZIP, confirmed PDF preview); NULL for a PDF only previewed
+    ingerido_en = models.DateTimeField(blank=True, null=True)
 
     class Meta:
         db_table = "archivos_cargados"
@@ -173,7 +178,8 @@ class Certificado70(models.Model):
     detalles = JSONField(default=list) # List of rows (retiros/dividendos with details)
     
     archivo_pdf = models.CharField(max_length=1024, blank=True, null=True) # Path/URL to generated PDF
-    
+    revision_totales = models.PositiveBigIntegerField(blank=True, null=True)  # TotalCert70.revision it was generated from
+
     creado_por = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -185,6 +191,39 @@ class Certificado70(models.Model):
         return f"Cert70 {self.empresa} - {self.propietario} ({self.anio_comercial})"
 
 
+class TotalCert70(models.Model):
+    """
+    Running Cert70 totales of the vigente calificaciones of one
+    (empresa, propietario, año), maintained by deltas on every write
+    (services/cert70_totals.py) and rebuilt by `reconciliar_totales_cert70`.
+    """
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, related_name="totales_cert70")
+    propietario = models.ForeignKey(Propietario, on_delete=models.CASCADE, related_name="totales_cert70")
+    anio = models.PositiveIntegerField()
+    movimientos = models.BigIntegerField(default=0)  # vigente calificaciones counted
+    monto_historico = models.BigIntegerField(default=0)
+    monto_actualizado = models.BigIntegerField(default=0)
+    rai = models.BigIntegerField(default=0)
+    ddan = models.BigIntegerField(default=0)
+    rex = models.BigIntegerField(default=0)
+    inr = models.BigIntegerField(default=0)
+    sac = models.BigIntegerField(default=0)
+    credito_con_dev = models.BigIntegerField(default=0)
+    credito_sin_dev = models.BigIntegerField(default=0)
+    credito_restitucion = models.BigIntegerField(default=0)
+    isfut = models.BigIntegerField(default=0)
+    otros_creditos = models.BigIntegerField(default=0)
+    revision = models.PositiveBigIntegerField(default=0)  # bumped by every delta: certificates older than it are stale
+    actualizado_en = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = "totales_cert70"
+        unique_together = ("empresa", "propietario", "anio")
+
+    def __str__(self):
+        return f"Totales Cert70 {self.empresa} - {self.propietario} ({self.anio})"
+
+
 class Corredor(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="corredor_profile")
     rut = models.CharField(max_length=12, db_index=True)
@@ -197,3 +236,121 @@ class Corredor(models.Model):
 
     def __str__(self):
         return f"{self.empresa_corredora} ({self.user.username})"
+
+
+class Tarea(models.Model):
+    """Background job executed by `manage.py procesar_tareas` (DB-backed queue, no broker)."""
+    ESTADOS = (
+        ("pendiente", "pendiente"),
+        ("en_proceso", "en_proceso"),
+        ("completada", "completada"),
+        ("fallida", "fallida"),
+    )
+    tipo = models.CharField(max_length=50)  # handler name, e.g. "carga_tabular", "cert70"
+    estado = models.CharField(max_length=20, choices=ESTADOS, default="pendiente", db_index=True)
+    parametros = JSONField(default=dict, blank=True)
+    resultado = JSONField(blank=True, null=True)
+    error = models.TextField(blank=True, null=True)
+
+    progreso = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(blank=True, null=True)
+
+    # Retry policy: failed jobs go back to "pendiente" until max_intentos, with backoff via disponible_en
+    intentos = models.PositiveIntegerField(default=0)
+    max_intentos = models.PositiveIntegerField(default=3)
+    disponible_en = models.DateTimeField(default=timezone.now)
+
+    worker = models.CharField(max_length=100, blank=True, null=True)
+    latido_en = models.DateTimeField(blank=True, null=True)  # heartbeat, to requeue jobs of dead workers
+
+    creado_por = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    creado_en = models.DateTimeField(auto_now_add=True)
+    iniciado_en = models.DateTimeField(blank=True, null=True)
+    finalizado_en = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = "tareas"
+        indexes = [models.Index(fields=["estado", "disponible_en"])]
+
+    def __str__(self):
+        return f"Tarea {self.pk} {self.tipo} ({self.estado})"
+
+
+class CargaFragmentada(models.Model):
+    """
+    Resumable upload: the client PUTs numbered fragments that are written in
+    place into `ruta` (preallocated to `tamano` bytes), then finalizes it.
+    """
+    ESTADOS = (
+        ("iniciada", "iniciada"),
+        ("finalizada", "finalizada"),
+        ("cancelada", "cancelada"),
+    )
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    nombre_archivo = models.CharField(max_length=255)
+    tamano = models.BigIntegerField()
+    tamano_fragmento = models.PositiveIntegerField()
+    fragmentos_recibidos = JSONField(default=list, blank=True)
+    sha256 = models.CharField(max_length=64, blank=True, null=True)  # expected checksum of the whole file
+    ruta = models.CharField(max_length=1024)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default="iniciada")
+    creado_por = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    creado_en = models.DateTimeField(auto_now_add=True)
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "cargas_fragmentadas"
+
+    @property
+    def total_fragmentos(self):
+        return max(1, -(-self.tamano // self.tamano_fragmento))
+
+    def tamano_de(self, numero):
+        """Expected byte size of fragment `numero` (0-based; only the last one is shorter)."""
+        if numero == self.total_fragmentos - 1:
+            return self.tamano - numero * self.tamano_fragmento
+        return self.tamano_fragmento
+
+    def fragmentos_faltantes(self):
+        recibidos = set(self.fragmentos_recibidos)
+        return [n for n in range(self.total_fragmentos) if n not in recibidos]
+
+    def __str__(self):
+        return f"Carga {self.pk} {self.nombre_archivo} ({self.estado})"
+
+
+class ResultadoParseo(models.Model):
+    """
+    Cached PDFParser.parse_data output, keyed by the file's SHA-256 and the
+    parser version that produced it (see services/parse_cache.py).
+    """
+    sha256 = models.CharField(max_length=64)
+    version = models.CharField(max_length=40)
+    datos = JSONField()
+    tamano = models.PositiveIntegerField()  # bytes of `datos` serialized, for the size bound
+    aciertos = models.PositiveIntegerField(default=0)
+    creado_en = models.DateTimeField(auto_now_add=True)
+    usado_en = models.DateTimeField(default=timezone.now, db_index=True)  # LRU order
+
+    class Meta:
+        db_table = "resultados_parseo"
+        unique_together = ("sha256", "version")
+
+    def __str__(self):
+        return f"Parseo {self.sha256[:12]} v{self.version}"
+
+
+class ContadorParseo(models.Model):
+    """
+    Hit / miss counters and stored size of the parse cache
+    (services/parse_cache.py), kept in the DB so that every worker process
+    adds to the same ones.
+    """
+    nombre = models.CharField(max_length=20, unique=True)  # "hits" / "misses" / "bytes"
+    valor = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        db_table = "contadores_parseo"
+
+    def __str__(self):
+        return f"{self.nombre}: {self.valor}"
@@ -1,7 +1,7 @@
 from rest_framework import serializers
 from .models import (
     Empresa, Propietario, RegistroEmpresarial, ArchivoCargado,
-    CalificacionTributaria, Accion, CreditoIDPC, Auditoria, Certificado70, Corredor
+    CalificacionTributaria, Accion, CreditoIDPC, Auditoria, Certificado70, Corredor, Tarea, CargaFragmentada
 )
 from django.db.models import Sum
 from .validators import validate_rut, validate_positive
@@ -110,4 +110,19 @@ class CorredorSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Corredor
-        fields = "__all__"
\ No newline at end of file
+        fields = "__all__"
+
+class TareaSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Tarea
+        # parametros may hold server paths / id lists, so they are not exposed
+        exclude = ["parametros", "worker", "latido_en"]
+
+class CargaFragmentadaSerializer(serializers.ModelSerializer):
+    total_fragmentos = serializers.ReadOnlyField()
+    fragmentos_faltantes = serializers.ReadOnlyField()
+
+    class Meta:
+        model = CargaFragmentada
+        exclude = ["ruta"]
+        read_only_fields = ["fragmentos_recibidos", "estado", "creado_por"]
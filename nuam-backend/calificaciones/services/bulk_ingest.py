@@ -0,0 +1,258 @@
+import time
+from collections import defaultdict
+import pandas as pd
+from django.conf import settings
+from django.db import connection, transaction
+from calificaciones import audit
+from calificaciones.models import Empresa, Propietario, CalificacionTributaria
+from . import cert70_totals
+from .tabular_reader import TabularReader, TabularReadError
+from .upload_validation import validate_rows, format_errors
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+class BulkIngestor:
+    """
+    Set-based ingest for tabular uploads (CSV/XLSX).
+
+    Every batch is validated column-wise first (validate_rows); then, instead
+    of three get_or_create/create round trips per row, every chunk:
+      1. dedupes empresas and propietarios inside the chunk,
+      2. resolves the existing ones with one IN query per model,
+      3. bulk_creates the missing ones and all the calificaciones.
+    Row numbers in error messages match the spreadsheet (header = row 1).
+    """
+
+    def __init__(self, user=None, chunk_size=None, archivo=None, caches=None):
+        self.user = user
+        self.archivo = archivo  # ArchivoCargado the rows come from (archivo_origen)
+        self.chunk_size = chunk_size or getattr(settings, 'BULK_UPLOAD_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+        self.results = {
+            "created": 0,
+            "errors": []
+        }
+        self.rows = 0
+        self.validation_errors = []
+        self._start = time.perf_counter()
+        # Caches shared across chunks so repeated RUTs are only resolved once per upload.
+        # `caches` lets several ingestors of one batch (e.g. the files of a ZIP) share them.
+        self._empresas, self._propietarios = caches or ({}, {})  # rut -> Empresa, (empresa_id, rut) -> Propietario
+
+    def ingest(self, df):
+        """Ingests a whole DataFrame in chunks and returns the results summary."""
+        return self.ingest_batches([df])
+
+    def ingest_batches(self, batches, progress=None):
+        """
+        Ingests an iterable of DataFrames (e.g. a TabularReader) without ever
+        holding more than one batch in memory. Every batch goes through the
+        column-wise validation stage first; only clean rows reach the DB.
+        `progress(rows)` is called after every chunk.
+        """
+        self._start = time.perf_counter()
+        for batch in batches:
+            clean, errors = validate_rows(batch)
+            self.ingest_validated(clean, errors, len(batch))
+            if progress:
+                progress(self.rows)
+        return self.summary()
+
+    def ingest_validated(self, clean, errors, rows):
+        """Persists the output of validate_rows (validated elsewhere, e.g. in a worker process)."""
+        self.rows += rows
+        self._add_validation_errors(errors)
+        for offset in range(0, len(clean), self.chunk_size):
+            self.ingest_chunk(clean.iloc[offset:offset + self.chunk_size])
+
+    def summary(self):
+        elapsed = time.perf_counter() - self._start
+        results = dict(self.results)
+        results["rows"] = self.rows
+        results["rejected"] = len({e["fila"] for e in self.validation_errors})
+        results["validation_errors"] = self.validation_errors
+        results["elapsed_seconds"] = round(elapsed, 3)
+        results["rows_per_sec"] = round(self.rows / elapsed, 1) if elapsed > 0 else None
+        return results
+
+    def _add_validation_errors(self, errors):
+        self.validation_errors.extend(errors)
+        self.results["errors"].extend(format_errors(errors))
+
+    def ingest_chunk(self, chunk):
+        """Persists an already validated chunk (see validate_rows)."""
+        records = self._prepare_records(chunk)
+        if not records:
+            return
+
+        with transaction.atomic():
+            self._resolve_empresas(records)
+            self._resolve_propietarios(records)
+            self._create_calificaciones(records)
+            # Audit entries of the chunk commit together with its rows
+            audit.flush()
+
+    # --- Row preparation (no DB work) ---
+
+    def _prepare_records(self, chunk):
+        estados = chunk['estado'] if 'estado' in chunk.columns else None
+        records = []
+        for i, (index, row) in enumerate(zip(chunk.index, chunk.itertuples(index=False))):
+            estado = estados.iat[i] if estados is not None else None
+            records.append({
+                "line": index + 2,
+                "rut_empresa": row.rut_empresa,
+                "razon_social": row.razon_social,
+                "rut_propietario": row.rut_propietario,
+                "nombre_propietario": None if pd.isna(row.nombre_propietario) else row.nombre_propietario,
+                "fecha": row.fecha,
+                "tipo": row.tipo_calificacion,
+                "monto": int(row.monto),
+                "estado": estado if isinstance(estado, str) and estado else 'pendiente',
+            })
+        return records
+
+    # --- Set-based resolution ---
+
+    def _resolve_empresas(self, records):
+        missing = {}
+        for rec in records:
+            if rec["rut_empresa"] not in self._empresas:
+                missing.setdefault(rec["rut_empresa"], rec["razon_social"])
+        if not missing:
+            return
+
+        # Oldest row wins, same as get_or_create would return for duplicated RUTs
+        for empresa in Empresa.objects.filter(rut__in=list(missing)).order_by('-id'):
+            self._empresas[empresa.rut] = empresa
+
+        to_create = [
+            Empresa(rut=rut, razon_social=razon_social)
+            for rut, razon_social in missing.items() if rut not in self._empresas
+        ]
+        if to_create:
+            created = Empresa.objects.bulk_create(to_create, batch_size=self.chunk_size)
+            if any(e.pk is None for e in created):
+                # Backends without RETURNING (MySQL) don't set pks on bulk_create
+                created = Empresa.objects.filter(rut__in=[e.rut for e in to_create]).order_by('-id')
+            for empresa in created:
+                self._empresas[empresa.rut] = empresa
+
+    def _resolve_propietarios(self, records):
+        missing = {}
+        for rec in records:
+            empresa = self._empresas[rec["rut_empresa"]]
+            key = (empresa.pk, rec["rut_propietario"])
+            if key not in self._propietarios:
+                missing.setdefault(key, rec["nombre_propietario"])
+        if not missing:
+            return
+
+        existing = Propietario.objects.filter(
+            empresa_id__in={empresa_id for empresa_id, _ in missing},
+            rut__in={rut for _, rut in missing},
+        ).order_by('-id')
+        for propietario in existing:
+            key = (propietario.empresa_id, propietario.rut)
+            if key in missing:
+                self._propietarios[key] = propietario
+
+        to_create = [
+            Propietario(empresa_id=empresa_id, rut=rut, nombre=nombre)
+            for (empresa_id, rut), nombre in missing.items() if (empresa_id, rut) not in self._propietarios
+        ]
+        if to_create:
+            created = Propietario.objects.bulk_create(to_create, batch_size=self.chunk_size)
+            if any(p.pk is None for p in created):
+                created = Propietario.objects.filter(
+                    empresa_id__in={p.empresa_id for p in to_create},
+                    rut__in={p.rut for p in to_create},
+                ).order_by('-id')
+            for propietario in created:
+                self._propietarios[(propietario.empresa_id, propietario.rut)] = propietario
+
+    def _create_calificaciones(self, records):
+        objs = []
+        for rec in records:
+            empresa = self._empresas[rec["rut_empresa"]]
+            objs.append(CalificacionTributaria(
+                empresa=empresa,
+                propietario=self._propietarios[(empresa.pk, rec["rut_propietario"])],
+                fecha=rec["fecha"],
+                tipo=rec["tipo"],
+                monto_original=rec["monto"],
+                estado=rec["estado"],
+                creado_por=self.user,
+                archivo_origen=self.archivo,
+            ))
+
+        # Backends without RETURNING (MySQL) don't set pks on bulk_create: remember where the ids start
+        last_id = None
+        if not connection.features.can_return_rows_from_bulk_insert:
+            if self.archivo is None:
+                # No ArchivoCargado tells this upload's rows apart from a concurrent identical one:
+                # hold the empresas until the chunk commits (this runs inside ingest_chunk's transaction)
+                list(Empresa.objects.select_for_update().filter(
+                    pk__in={obj.empresa_id for obj in objs}).order_by('pk').values_list('pk', flat=True))
+            last_id = CalificacionTributaria.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        try:
+            with transaction.atomic():
+                created = CalificacionTributaria.objects.bulk_create(objs, batch_size=self.chunk_size)
+        except Exception:
+            # A bad row poisons the whole batch: retry row by row to report exactly which one failed.
+            # save() goes through the regular audit signals (buffered inside audit.bulk_audit()).
+            for rec, obj in zip(records, objs):
+                try:
+                    with transaction.atomic():
+                        obj.save()
+                    self.results["created"] += 1
+                except Exception as e:
+                    self.results["errors"].append(f"Row {rec['line']}: {str(e)}")
+            return
+
+        self.results["created"] += len(created)
+        if any(cal.pk is None for cal in created):
+            _fill_pks(created, last_id, self.archivo)
+        # bulk_create skips the post_save audit / Cert70 totals signals
+        deltas = cert70_totals.Deltas()
+        for cal in created:
+            audit.record_calificacion(cal, "crear")
+            deltas.add(cal)
+        deltas.apply()
+
+
+def _fill_pks(objs, last_id, archivo=None):
+    """
+    Sets the pks of bulk_created calificaciones, read back by natural key
+    among the ids above `last_id` that came from the same `archivo` (each
+    upload has its own ArchivoCargado, so concurrent uploads don't mix).
+    """
+    pending = defaultdict(list)
+    for obj in reversed(objs):
+        pending[(obj.propietario_id, obj.fecha, obj.tipo, obj.monto_original)].append(obj)
+    rows = CalificacionTributaria.objects.filter(
+        pk__gt=last_id, propietario_id__in={obj.propietario_id for obj in objs},
+        archivo_origen=archivo, creado_por_id=objs[0].creado_por_id,
+    ).order_by('id').values_list('id', 'propietario_id', 'fecha', 'tipo', 'monto_original')
+    for pk, *key in rows:
+        same = pending.get(tuple(key))
+        if same:
+            same.pop().pk = pk
+
+
+def ingest_file(file_obj, user=None, chunk_size=None, progress=None, archivo=None):
+    """
+    Streams a CSV/XLSX file through BulkIngestor. Raises MissingColumnsError
+    if the header is incomplete; read errors midway are reported in "errors"
+    (rows of the batches already read stay committed).
+    """
+    ingestor = BulkIngestor(user=user, chunk_size=chunk_size, archivo=archivo)
+    # Stream the file in batches of the ingest chunk size so memory stays bounded
+    reader = TabularReader(file_obj, batch_size=ingestor.chunk_size)
+    reader.read_header()
+    try:
+        return ingestor.ingest_batches(reader, progress=progress)
+    except TabularReadError as e:
+        results = ingestor.summary()
+        results["errors"].append(str(e))
+        return results
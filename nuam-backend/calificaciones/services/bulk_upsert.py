@@ -0,0 +1,299 @@
+import time
+import pandas as pd
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from calificaciones import audit
+from calificaciones.models import Empresa, Propietario, CalificacionTributaria
+from calificaciones.serializers import CalificacionTributariaSerializer
+from . import cert70_totals
+from .bulk_ingest import DEFAULT_CHUNK_SIZE
+from .import_preview import DiffPreview
+
+SIN_NOMBRE = 'Propietario Sin Nombre'
+DEFAULT_IMPUTACION = 'SIN CLASIFICAR'
+
+
+class BulkUpserter:
+    """
+    Batched version of the BulkCreateView confirm step (PDF preview -> DB).
+
+    Same semantics as one update_or_create per line, keyed on
+    (empresa, propietario, fecha, tipo, monto_original), but:
+      1. fechas and montos are parsed column-wise once,
+      2. all propietarios of the payload are resolved with one IN query,
+      3. every chunk fetches its existing calificaciones with one lookup
+         and is written with bulk_create / bulk_update.
+    """
+
+    def __init__(self, user=None, chunk_size=None, sample_size=None):
+        self.user = user
+        self.sample_size = sample_size
+        self.chunk_size = chunk_size or getattr(settings, 'BULK_UPLOAD_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+        self.results = {
+            "created": 0,
+            "updated": 0,
+            "errors": []
+        }
+
+    def upsert(self, data):
+        rut_empresa = data.get('rut_empresa')
+        rut_propietario = data.get('rut_propietario')
+        calificaciones = data.get('calificaciones', [])
+        razon_social = data.get('razon_social', 'Empresa sin nombre')
+        nombre_propietario = data.get('nombre_propietario', 'Propietario sin nombre')
+
+        records = self._prepare_records(calificaciones, rut_propietario, nombre_propietario)
+        try:
+            with transaction.atomic():
+                empresa, _ = Empresa.objects.get_or_create(
+                    rut=rut_empresa,
+                    defaults={'razon_social': razon_social}
+                )
+                propietarios = self._resolve_propietarios(empresa, records)
+                for offset in range(0, len(records), self.chunk_size):
+                    self._upsert_chunk(empresa, propietarios, records[offset:offset + self.chunk_size])
+        except Exception as e:
+            # Everything was rolled back: nothing was created or updated
+            audit.discard()
+            self.results["created"] = 0
+            self.results["updated"] = 0
+            self.results["errors"].append(str(e))
+        return self.results
+
+    def preview(self, data):
+        """
+        Dry run of upsert(): what would be created, updated or left unchanged,
+        using the same lookups (one per model, one per chunk) and no writes.
+        """
+        start = time.perf_counter()
+        rut_empresa = data.get('rut_empresa')
+        rut_propietario = data.get('rut_propietario')
+        records = self._prepare_records(
+            data.get('calificaciones', []), rut_propietario, data.get('nombre_propietario', 'Propietario sin nombre')
+        )
+        diff = DiffPreview(self.sample_size)
+
+        empresa = Empresa.objects.filter(rut=rut_empresa).order_by('id').first()
+        diff.add("empresas", "unchanged" if empresa else "created", {
+            "rut": rut_empresa, "razon_social": empresa.razon_social if empresa else data.get('razon_social')
+        })
+
+        propietarios = {}
+        nombres = self._nombres(records)
+        if empresa and nombres:
+            for propietario in Propietario.objects.filter(empresa=empresa, rut__in=list(nombres)).order_by('-id'):
+                propietarios[propietario.rut] = propietario
+        for rut, nombre in nombres.items():
+            propietario = propietarios.get(rut)
+            if propietario is None:
+                diff.add("propietarios", "created", {"rut": rut, "nombre": nombre})
+            elif propietario.nombre == SIN_NOMBRE and nombre != SIN_NOMBRE:
+                diff.add("propietarios", "updated", {"rut": rut, "antes": {"nombre": propietario.nombre}, "despues": {"nombre": nombre}})
+            else:
+                diff.add("propietarios", "unchanged", {"rut": rut, "nombre": propietario.nombre})
+
+        for offset in range(0, len(records), self.chunk_size):
+            wanted = {}
+            for rec in records[offset:offset + self.chunk_size]:
+                key = (rec["rut_propietario"], rec["fecha"], rec["tipo"], rec["monto"])
+                if key in wanted:
+                    diff.count("calificaciones", "duplicates")
+                wanted[key] = rec
+            existing = self._existing(empresa, {
+                (propietarios[k[0]].pk,) + k[1:] for k in wanted if k[0] in propietarios
+            })
+            for (rut, fecha, tipo, monto), rec in wanted.items():
+                sample = {"rut_propietario": rut, "fecha": fecha.isoformat(), "tipo": tipo, "monto": monto}
+                cal = existing.get((propietarios[rut].pk, fecha, tipo, monto)) if rut in propietarios else None
+                if cal is None:
+                    diff.add("calificaciones", "created", {**sample, "imputacion": rec["imputacion"]})
+                elif cal.imputacion == rec["imputacion"] and cal.estado == 'pendiente':
+                    diff.add("calificaciones", "unchanged", {**sample, "id": cal.pk})
+                else:
+                    diff.add("calificaciones", "updated", {
+                        **sample,
+                        "id": cal.pk,
+                        "antes": {"imputacion": cal.imputacion, "estado": cal.estado},
+                        "despues": {"imputacion": rec["imputacion"], "estado": 'pendiente'},
+                    })
+
+        return {
+            "dry_run": True,
+            "errors": self.results["errors"],
+            **diff.as_dict(),
+            "elapsed_seconds": round(time.perf_counter() - start, 3),
+        }
+
+    # --- Row preparation (no DB work) ---
+
+    def _prepare_records(self, calificaciones, rut_propietario, nombre_propietario):
+        if not calificaciones:
+            return []
+        raw = pd.DataFrame({
+            'fecha': [cal.get('fecha') for cal in calificaciones],
+            'monto': [cal.get('monto') for cal in calificaciones],
+        })
+        fechas = pd.to_datetime(raw['fecha'], dayfirst=True, format='mixed', errors='coerce')
+        montos = pd.to_numeric(raw['monto'], errors='coerce')
+
+        records = []
+        for i, cal in enumerate(calificaciones):
+            if rut_propietario:
+                rut, nombre = rut_propietario, nombre_propietario
+            else:
+                rut = cal.get('rut_propietario')
+                if not rut:
+                    self.results["errors"].append(f"Falta RUT de propietario en fila (Fecha: {cal.get('fecha')})")
+                    continue
+                nombre = cal.get('nombre_propietario') or cal.get('nombre') or SIN_NOMBRE
+            if pd.isna(fechas.iat[i]):
+                self.results["errors"].append(f"Fecha no válida en fila {i + 1}: {cal.get('fecha')}")
+                continue
+            if pd.isna(montos.iat[i]):
+                self.results["errors"].append(f"Monto no válido en fila {i + 1}: {cal.get('monto')}")
+                continue
+            records.append({
+                "rut_propietario": rut,
+                "nombre_propietario": nombre,
+                "fecha": fechas.iat[i].date(),
+                "tipo": cal.get('tipo'),
+                "monto": int(montos.iat[i]),
+                "imputacion": cal.get('imputacion', DEFAULT_IMPUTACION),
+            })
+        return records
+
+    # --- Set-based resolution ---
+
+    def _nombres(self, records):
+        nombres = {}
+        for rec in records:
+            # Keep the first real name seen for each RUT
+            if nombres.get(rec["rut_propietario"], SIN_NOMBRE) == SIN_NOMBRE:
+                nombres[rec["rut_propietario"]] = rec["nombre_propietario"]
+        return nombres
+
+    def _existing(self, empresa, keys):
+        """
+        (propietario_id, fecha, tipo, monto) -> stored calificacion, for one
+        chunk with a single lookup: a superset filtered on each column,
+        matched exactly in Python.
+        """
+        existing = {}
+        if not keys:
+            return existing
+        candidates = CalificacionTributaria.objects.filter(
+            empresa=empresa,
+            propietario_id__in={k[0] for k in keys},
+            fecha__in={k[1] for k in keys},
+            tipo__in={k[2] for k in keys},
+            monto_original__in={k[3] for k in keys},
+        ).select_related('empresa', 'propietario').order_by('id')
+        for cal in candidates:
+            key = (cal.propietario_id, cal.fecha, cal.tipo, cal.monto_original)
+            if key in keys:
+                existing.setdefault(key, cal)
+        return existing
+
+    def _resolve_propietarios(self, empresa, records):
+        """rut -> Propietario for every owner in the payload (one SELECT, one INSERT)."""
+        nombres = self._nombres(records)
+        if not nombres:
+            return {}
+
+        propietarios = {}
+        # Oldest row wins, same as get_or_create would return for duplicated RUTs
+        for propietario in Propietario.objects.filter(empresa=empresa, rut__in=list(nombres)).order_by('-id'):
+            propietarios[propietario.rut] = propietario
+
+        renamed = []
+        for rut, propietario in propietarios.items():
+            if propietario.nombre == SIN_NOMBRE and nombres[rut] != SIN_NOMBRE:
+                propietario.nombre = nombres[rut]
+                renamed.append(propietario)
+        if renamed:
+            Propietario.objects.bulk_update(renamed, ['nombre'], batch_size=self.chunk_size)
+
+        to_create = [
+            Propietario(empresa=empresa, rut=rut, nombre=nombre)
+            for rut, nombre in nombres.items() if rut not in propietarios
+        ]
+        if to_create:
+            created = Propietario.objects.bulk_create(to_create, batch_size=self.chunk_size)
+            if any(p.pk is None for p in created):
+                # Backends without RETURNING (MySQL) don't set pks on bulk_create
+                created = Propietario.objects.filter(
+                    empresa=empresa, rut__in=[p.rut for p in to_create]
+                ).order_by('-id')
+            for propietario in created:
+                propietarios[propietario.rut] = propietario
+        return propietarios
+
+    def _upsert_chunk(self, empresa, propietarios, records):
+        wanted = {}
+        for rec in records:
+            key = (propietarios[rec["rut_propietario"]].pk, rec["fecha"], rec["tipo"], rec["monto"])
+            if key in wanted:
+                # Repeated line in the payload: update_or_create would have updated the first one
+                self.results["updated"] += 1
+            wanted[key] = rec
+
+        existing = self._existing(empresa, wanted)
+
+        now = timezone.now()
+        to_create, to_update, antes = [], [], []
+        for key, rec in wanted.items():
+            cal = existing.get(key)
+            if cal is None:
+                to_create.append(CalificacionTributaria(
+                    empresa=empresa,
+                    propietario=propietarios[rec["rut_propietario"]],
+                    fecha=rec["fecha"],
+                    tipo=rec["tipo"],
+                    monto_original=rec["monto"],
+                    imputacion=rec["imputacion"],
+                    estado='pendiente',
+                    creado_por=self.user,
+                ))
+            else:
+                antes.append(CalificacionTributariaSerializer(cal).data)
+                cal.imputacion = rec["imputacion"]
+                cal.estado = 'pendiente'
+                cal.actualizado_en = now
+                to_update.append(cal)
+
+        created = CalificacionTributaria.objects.bulk_create(to_create, batch_size=self.chunk_size)
+        if any(cal.pk is None for cal in created):
+            # Backends without RETURNING (MySQL) don't set pks on bulk_create: none of
+            # these keys existed before, so the lookup returns exactly the new rows
+            created = list(self._existing(empresa, {
+                (cal.propietario_id, cal.fecha, cal.tipo, cal.monto_original) for cal in created
+            }).values())
+        if to_update:
+            CalificacionTributaria.objects.bulk_update(
+                to_update, ['imputacion', 'estado', 'actualizado_en'], batch_size=self.chunk_size
+            )
+        self.results["created"] += len(created)
+        self.results["updated"] += len(to_update)
+        # bulk_create / bulk_update skip the audit and Cert70 totals signals
+        deltas = cert70_totals.Deltas()
+        for cal in created:
+            audit.record_calificacion(cal, "crear")
+            deltas.add(cal)
+        for cal, previous in zip(to_update, antes):
+            audit.record_calificacion(cal, "modificar", antes=previous)
+            deltas.cambio(previous, cal)
+        deltas.apply()
+        audit.flush()
+
+
+def upsert_calificaciones(data, user=None, chunk_size=None, dry_run=False):
+    """
+    Confirms a parsed PDF payload; returns {"created", "updated", "errors"}.
+    With dry_run, returns the BulkUpserter.preview() diff instead and writes nothing.
+    """
+    upserter = BulkUpserter(user=user, chunk_size=chunk_size)
+    if dry_run:
+        return upserter.preview(data)
+    with audit.bulk_audit(usuario=user, batch_size=upserter.chunk_size):
+        return upserter.upsert(data)
@@ -0,0 +1,84 @@
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max
+from calificaciones.models import Certificado70, Empresa, TotalCert70
+from .bulk_ingest import DEFAULT_CHUNK_SIZE
+from .cert70_engine import compute_company_year
+from .cert70_totals import totales
+
+# Written again on regeneration; the folio stays the one the certificate was issued with
+CERT_FIELDS = ('totales', 'detalles', 'creado_por', 'revision_totales')
+FIRST_FOLIO = 101
+
+
+def generate_certificates(empresa, anio, usuario, propietario_id=None):
+    """
+    Aggregates the vigente calificaciones of (empresa, anio) into one
+    Certificado70 per partner. Returns (created_count, last_cert).
+
+    Partners and totales are read directly from the running totals
+    (TotalCert70, services/cert70_totals.py): partners without movements get
+    no certificate. A certificate generated from the current revision of its
+    totals is left as is; only the stale ones get their detalles from the
+    columnar engine (services/cert70_engine.py, two queries for all of them)
+    and are written with one bulk upsert on (empresa, propietario, anio_comercial).
+
+    Folios are numbered per company and year: a new certificate takes the
+    next one after the highest issued (FIRST_FOLIO for the first) and keeps
+    it on every regeneration.
+    """
+    acumulados = TotalCert70.objects.filter(empresa=empresa, anio=anio, movimientos__gt=0)
+    certificados = Certificado70.objects.filter(empresa=empresa, anio_comercial=anio)
+    if propietario_id:
+        acumulados = acumulados.filter(propietario_id=propietario_id)
+        certificados = certificados.filter(propietario_id=propietario_id)
+    acumulados = list(acumulados.order_by('propietario_id'))
+    if not acumulados:
+        return 0, None
+
+    revisiones = dict(certificados.values_list('propietario_id', 'revision_totales'))
+    stale = [row for row in acumulados if revisiones.get(row.propietario_id) != row.revision]
+
+    if stale:
+        # Whole company-year in one go when every partner is stale (no IN list)
+        ids = None if len(stale) == len(acumulados) else [row.propietario_id for row in stale]
+        resultados = compute_company_year(empresa, anio, propietario_id, propietarios=ids)
+        nuevos = [
+            Certificado70(
+                empresa=empresa,
+                propietario_id=row.propietario_id,
+                anio_comercial=anio,
+                totales=totales(row),
+                detalles=resultados.get(row.propietario_id, (None, []))[1],
+                creado_por=usuario,
+                revision_totales=row.revision,
+            )
+            for row in stale
+        ]
+        # Same result as one update_or_create per partner: existing certificates keep their id, folio and fecha_emision
+        upsert = {"update_conflicts": True, "update_fields": CERT_FIELDS}
+        if connection.features.supports_update_conflicts_with_target:
+            upsert["unique_fields"] = ('empresa', 'propietario', 'anio_comercial')
+        with transaction.atomic():
+            nuevos_socios = [c for c in nuevos if c.propietario_id not in revisiones]
+            if nuevos_socios:
+                _assign_folios(empresa, anio, nuevos_socios)
+            Certificado70.objects.bulk_create(
+                nuevos,
+                batch_size=getattr(settings, 'BULK_UPLOAD_CHUNK_SIZE', DEFAULT_CHUNK_SIZE),
+                **upsert,
+            )
+    # Upserted rows don't get their pk back on every backend: the last one is read again
+    last_cert = Certificado70.objects.get(
+        empresa=empresa, propietario_id=acumulados[-1].propietario_id, anio_comercial=anio
+    )
+    return len(acumulados), last_cert
+
+
+def _assign_folios(empresa, anio, certificados):
+    """Next free folios of (empresa, anio) for `certificados`; the empresa row is locked so concurrent runs don't share them."""
+    list(Empresa.objects.select_for_update().filter(pk=empresa.pk).values_list('pk'))
+    ultimo = Certificado70.objects.filter(empresa=empresa, anio_comercial=anio).aggregate(ultimo=Max('folio'))['ultimo']
+    siguiente = (ultimo or FIRST_FOLIO - 1) + 1
+    for n, certificado in enumerate(certificados):
+        certificado.folio = siguiente + n
@@ -0,0 +1,128 @@
+"""
+Columnar Cert70 computation for a whole company-year.
+
+The vigente calificaciones of (empresa, año) and their CreditoIDPC rows are
+loaded with one query each into pandas frames. Imputaciones and credit
+types are mapped to certificate columns once per distinct value and
+broadcast back with the factorize codes. Every partner's totales then come
+from one groupby, and its detail rows from slicing a single list of dicts.
+Cert70Calculator (one partner) and generate_certificates (every partner)
+both use this engine.
+"""
+import numpy as np
+import pandas as pd
+from calificaciones.models import CalificacionTributaria, CreditoIDPC
+
+IMPUTACIONES = ("rai", "ddan", "rex", "inr", "sac")
+CREDITOS = ("credito_con_dev", "credito_sin_dev", "credito_restitucion", "isfut", "otros_creditos")
+TOTALES = ("monto_historico", "monto_actualizado", *IMPUTACIONES, *CREDITOS)
+DETALLE = ("fecha", "tipo", "monto_historico", "monto_actualizado", "imputacion", *IMPUTACIONES, *CREDITOS)
+MOVIMIENTOS = ("id", "propietario_id", "fecha", "tipo", "monto_original", "monto_reajustado", "imputacion")
+# Detail dates as stored in Certificado70.detalles (ISO, as generated certificates always had them)
+DATE_FORMAT = "%Y-%m-%d"
+
+
+def imputacion_column(imputacion):
+    """Index in IMPUTACIONES of the column an imputacion goes to, or -1."""
+    imputacion = imputacion.upper()
+    return next((n for n, code in enumerate(IMPUTACIONES) if code.upper() in imputacion), -1)
+
+
+def credito_column(tipo):
+    """Index in CREDITOS of the column a credit type goes to (otros_creditos by default)."""
+    tipo = tipo.lower()
+    if "con devolución" in tipo or "con devolucion" in tipo:
+        return 0
+    if "sin devolución" in tipo or "sin devolucion" in tipo:
+        return 1
+    if "restitución" in tipo or "restitucion" in tipo:
+        return 2
+    if "isfut" in tipo:
+        return 3
+    return 4
+
+
+def _lookup(values, mapper):
+    # One mapper call per distinct value; factorize codes broadcast it to every row
+    codes, uniques = pd.factorize(values.fillna(""))
+    table = np.array([mapper(u) for u in uniques], dtype=np.int64)
+    return table[codes] if len(table) else np.empty(0, dtype=np.int64)
+
+
+def load(empresa, anio, propietario_id=None, propietarios=None):
+    """
+    (movimientos, creditos) frames of the vigente calificaciones of (empresa, anio),
+    optionally of one partner or of the `propietarios` ids only.
+    """
+    calificaciones = CalificacionTributaria.objects.filter(empresa=empresa, fecha__year=anio, estado='vigente')
+    creditos = CreditoIDPC.objects.filter(
+        calificacion__empresa=empresa, calificacion__fecha__year=anio, calificacion__estado='vigente',
+    )
+    if propietario_id:
+        calificaciones = calificaciones.filter(propietario_id=propietario_id)
+        creditos = creditos.filter(calificacion__propietario_id=propietario_id)
+    if propietarios is not None:
+        calificaciones = calificaciones.filter(propietario_id__in=propietarios)
+        creditos = creditos.filter(calificacion__propietario_id__in=propietarios)
+    movimientos = pd.DataFrame.from_records(
+        calificaciones.order_by('propietario_id', 'id').values_list(*MOVIMIENTOS), columns=list(MOVIMIENTOS)
+    )
+    creditos = pd.DataFrame.from_records(
+        creditos.values_list('calificacion_id', 'tipo', 'monto'), columns=["calificacion_id", "tipo", "monto"]
+    )
+    return movimientos, creditos
+
+
+def compute(movimientos, creditos):
+    """
+    {propietario_id: (totales, detalles)} for the partners in `movimientos`,
+    ordered by propietario_id; detalles are in calificacion id order.
+    """
+    if movimientos.empty:
+        return {}
+    movimientos = movimientos.sort_values(["propietario_id", "id"], kind="stable", ignore_index=True)
+    n = len(movimientos)
+    historico = movimientos["monto_original"].to_numpy(dtype=np.int64)
+    reajustado = movimientos["monto_reajustado"].astype("Int64").fillna(0).to_numpy(dtype=np.int64)
+    actualizado = np.where(reajustado != 0, reajustado, historico)
+
+    values = np.zeros((n, len(TOTALES)), dtype=np.int64)
+    values[:, 0] = historico
+    values[:, 1] = actualizado
+    column = _lookup(movimientos["imputacion"], imputacion_column)
+    hit = np.flatnonzero(column >= 0)
+    values[hit, 2 + column[hit]] = actualizado[hit]
+
+    if not creditos.empty:
+        rows = pd.Index(movimientos["id"]).get_indexer(creditos["calificacion_id"])
+        column = _lookup(creditos["tipo"], credito_column)
+        keep = rows >= 0
+        np.add.at(values, (rows[keep], 2 + len(IMPUTACIONES) + column[keep]), creditos["monto"].to_numpy(dtype=np.int64)[keep])
+
+    propietarios = movimientos["propietario_id"].to_numpy()
+    columns = pd.DataFrame(values, columns=list(TOTALES))
+    totales = columns.groupby(propietarios, sort=False).sum().to_dict("index")
+
+    # Detail rows: each distinct date is formatted once, and the dicts are built
+    # from plain Python columns (tolist) rather than per-cell pandas boxing
+    fechas, unique_fechas = pd.factorize(movimientos["fecha"])
+    fechas = np.array([f.strftime(DATE_FORMAT) for f in unique_fechas], dtype=object)[fechas]
+    montos = values.T.tolist()
+    detalle = [
+        dict(zip(DETALLE, row))
+        for row in zip(
+            fechas.tolist(), movimientos["tipo"].tolist(), montos[0], montos[1],
+            movimientos["imputacion"].fillna("").tolist(), *montos[2:],
+        )
+    ]
+    # Rows are grouped by partner: each one's detalles are a contiguous slice
+    starts = np.flatnonzero(np.r_[True, propietarios[1:] != propietarios[:-1]])
+    ends = np.r_[starts[1:], n]
+    return {
+        int(propietarios[start]): (totales[propietarios[start]], detalle[start:end])
+        for start, end in zip(starts, ends)
+    }
+
+
+def compute_company_year(empresa, anio, propietario_id=None, propietarios=None):
+    return compute(*load(empresa, anio, propietario_id, propietarios))
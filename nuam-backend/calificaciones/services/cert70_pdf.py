@@ -1,4 +1,7 @@
+import io
 import os
+import time
+from types import SimpleNamespace
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4, landscape
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
@@ -6,17 +9,60 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import cm
 from django.conf import settings
 
+# Part of the render cache key (services/cert70_pdf_cache.py): bump on any change to the layout below
+TEMPLATE_VERSION = "1"
+
+
+def snapshot(certificado):
+    """
+    Picklable copy of what Cert70PDFGenerator reads from a Certificado70
+    (with its empresa and propietario), for rendering in another process.
+    """
+    emp, prop = certificado.empresa, certificado.propietario
+    return SimpleNamespace(
+        id=certificado.id,
+        folio=certificado.folio,
+        anio_comercial=certificado.anio_comercial,
+        fecha_emision=certificado.fecha_emision,
+        totales=certificado.totales,
+        detalles=certificado.detalles,
+        archivo_pdf=certificado.archivo_pdf,
+        empresa=SimpleNamespace(rut=emp.rut, razon_social=emp.razon_social, regimen_tributario=emp.regimen_tributario),
+        propietario=SimpleNamespace(
+            rut=prop.rut, nombre=prop.nombre, calidad=prop.calidad,
+            porcentaje_participacion=prop.porcentaje_participacion,
+        ),
+    )
+
+
+def render_pdf(certificado):
+    """
+    Renders a snapshot in memory: (id, filename, pdf bytes, seconds). Runs in
+    worker processes (services/cert70_render.py): no DB access, no files.
+    """
+    start = time.perf_counter()
+    generator = Cert70PDFGenerator(certificado)
+    buffer = io.BytesIO()
+    generator.render(buffer)
+    return certificado.id, generator.filename, buffer.getvalue(), time.perf_counter() - start
+
+
 class Cert70PDFGenerator:
     def __init__(self, certificado):
         self.certificado = certificado
         self.output_dir = os.path.join(settings.MEDIA_ROOT, 'certificados')
-        os.makedirs(self.output_dir, exist_ok=True)
         self.filename = f"Cert70_{self.certificado.id}.pdf"
         self.filepath = os.path.join(self.output_dir, self.filename)
 
     def generate(self):
+        os.makedirs(os.path.dirname(self.filepath) or '.', exist_ok=True)
+        self.render(self.filepath)
+        return self.filepath
+
+    def render(self, out):
+        """Builds the certificate into `out` (a path or a binary file object)."""
         # Use landscape for better table fit
-        doc = SimpleDocTemplate(self.filepath, pagesize=landscape(A4),
+        doc = SimpleDocTemplate(out, pagesize=landscape(A4),
                                 rightMargin=1*cm, leftMargin=1*cm,
                                 topMargin=1*cm, bottomMargin=1*cm)
         
@@ -165,4 +211,3 @@ class Cert70PDFGenerator:
         elements.append(Paragraph(f"RUT: {emp.rut}", style_normal))
 
         doc.build(elements)
-        return self.filepath
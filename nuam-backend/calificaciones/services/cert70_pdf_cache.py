@@ -0,0 +1,166 @@
+"""
+Content-addressed cache of rendered Certificado 70 PDFs.
+
+A certificate's PDF depends only on its render inputs (folio, año, fecha de
+emisión, totales, detalles, empresa and propietario fields) and on the
+template (cert70_pdf.TEMPLATE_VERSION). render_key() hashes them and the
+PDF is stored once under MEDIA_ROOT/certificados/cache/<aa>/<key>.pdf;
+Certificado70.archivo_pdf points at it. A render is skipped whenever that
+file exists; changed inputs give another key, so a new file, and leave the
+old one orphaned.
+
+Hits refresh the file's mtime, which evict() uses as its LRU order:
+orphans older than CERT70_PDF_CACHE_MAX_AGE_DAYS go first, then, above
+CERT70_PDF_CACHE_MAX_BYTES, orphans and finally still referenced files,
+oldest first (their certificates simply render again on next use).
+"""
+import hashlib
+import json
+import os
+import tempfile
+import time
+from django.conf import settings
+from calificaciones.models import Certificado70
+from .cert70_pdf import TEMPLATE_VERSION, render_pdf, snapshot
+
+DEFAULT_MAX_BYTES = 1024 ** 3
+DEFAULT_MAX_AGE_DAYS = 30
+
+
+def enabled():
+    return getattr(settings, 'CERT70_PDF_CACHE_ENABLED', True)
+
+
+def cache_dir():
+    return os.path.join(settings.MEDIA_ROOT, 'certificados', 'cache')
+
+
+def render_key(certificado):
+    """SHA-256 of the template version and everything the PDF shows (snapshot or Certificado70)."""
+    emp, prop = certificado.empresa, certificado.propietario
+    inputs = {
+        "template": TEMPLATE_VERSION,
+        "folio": certificado.folio,
+        "anio_comercial": certificado.anio_comercial,
+        "fecha_emision": certificado.fecha_emision,
+        "totales": certificado.totales,
+        "detalles": certificado.detalles,
+        "empresa": [emp.rut, emp.razon_social, emp.regimen_tributario],
+        "propietario": [prop.rut, prop.nombre, prop.calidad, prop.porcentaje_participacion],
+    }
+    encoded = json.dumps(inputs, sort_keys=True, separators=(",", ":"), default=str, ensure_ascii=False)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def path_for(key):
+    return os.path.join(cache_dir(), key[:2], f"{key}.pdf")
+
+
+def lookup(key):
+    """Path of the cached PDF for `key`, or None. A hit refreshes its LRU position."""
+    path = path_for(key)
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return path
+
+
+def store(key, pdf):
+    """Writes the PDF bytes of `key` (atomically: readers never see a partial file). Returns its path."""
+    path = path_for(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            out.write(pdf)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return path
+
+
+def get_or_render(certificado):
+    """
+    Path of the PDF of a Certificado70, rendered only when no file with the
+    same render inputs exists. Keeps certificado.archivo_pdf pointing at it.
+    """
+    key = render_key(certificado)
+    path = lookup(key) if enabled() else None
+    if path is None:
+        _, _, pdf, _ = render_pdf(snapshot(certificado))
+        path = store(key, pdf)
+    if certificado.archivo_pdf != path:
+        Certificado70.objects.filter(pk=certificado.pk).update(archivo_pdf=path)
+        certificado.archivo_pdf = path
+    return path
+
+
+def _files():
+    """[(mtime, size, path)] of the cache, oldest first."""
+    files = []
+    for root, _, names in os.walk(cache_dir()):
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((st.st_mtime, st.st_size, path))
+    return sorted(files)
+
+
+def evict(max_bytes=None, max_age_days=None, dry_run=False):
+    """
+    Removes orphaned files older than `max_age_days`, then orphans and
+    referenced files (oldest first) until the cache fits in `max_bytes`;
+    archivo_pdf of certificates whose file went is cleared. Returns counts.
+    """
+    if max_bytes is None:
+        max_bytes = getattr(settings, 'CERT70_PDF_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)
+    if max_age_days is None:
+        max_age_days = getattr(settings, 'CERT70_PDF_CACHE_MAX_AGE_DAYS', DEFAULT_MAX_AGE_DAYS)
+
+    files = _files()
+    referenced = set(
+        Certificado70.objects.filter(archivo_pdf__startswith=cache_dir()).values_list('archivo_pdf', flat=True).distinct()
+    )
+    total = sum(size for _, size, _ in files)
+    cutoff = time.time() - max_age_days * 86400
+    removed, freed = set(), 0
+
+    def remove(entry):
+        nonlocal total, freed
+        removed.add(entry[2])
+        total -= entry[1]
+        freed += entry[1]
+
+    orphans = [f for f in files if f[2] not in referenced]
+    for entry in orphans:
+        if entry[0] < cutoff:
+            remove(entry)
+    # Size bound: orphans first, then referenced files, both oldest first
+    for entry in orphans + [f for f in files if f[2] in referenced]:
+        if total <= max_bytes:
+            break
+        if entry[2] not in removed:
+            remove(entry)
+
+    if not dry_run:
+        for path in removed:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        cleared = list(removed & referenced)
+        if cleared:
+            Certificado70.objects.filter(archivo_pdf__in=cleared).update(archivo_pdf=None)
+    return {
+        "archivos": len(files),
+        "eliminados": len(removed),
+        "huerfanos_eliminados": len(removed - referenced),
+        "bytes_liberados": freed,
+        "bytes": total,
+        "max_bytes": max_bytes,
+    }
@@ -0,0 +1,147 @@
+"""
+Batch rendering of Certificados 70 into one ZIP archive.
+
+Certificates are read in chunks (select_related, in the order of `ids`) and
+turned into picklable snapshots of their already computed totales /
+detalles (cert70_pdf.snapshot), so workers never touch the DB. Snapshots
+whose render inputs are already in the PDF cache (services/cert70_pdf_cache.py)
+are copied into the ZIP as is; the rest go to a ProcessPoolExecutor that
+renders them in memory, and the parent stores each PDF in the cache and
+writes it into the ZIP as soon as it is done. At most `workers * 2`
+certificates are in flight, so memory does not grow with the batch, and
+entries are STORED (reportlab output is already compressed) to keep the
+parent off the critical path: throughput is bounded by the workers, not by
+the writer.
+
+The report carries the render time of every certificate plus the totals.
+"""
+import os
+import statistics
+import time
+import zipfile
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ProcessPoolExecutor, wait
+from django.conf import settings
+from calificaciones.models import Certificado70
+from . import cert70_pdf_cache
+from .cert70_pdf import Cert70PDFGenerator, render_pdf, snapshot
+from .exports import iter_in_order
+
+
+def default_workers():
+    return getattr(settings, 'CERT70_RENDER_WORKERS', 0) or os.cpu_count() or 1
+
+
+def _snapshots(ids, chunk_size):
+    queryset = Certificado70.objects.select_related('empresa', 'propietario')
+    for certificado in iter_in_order(queryset, ids, chunk_size):
+        yield snapshot(certificado)
+
+
+class ZipRenderer:
+    """Renders the Certificados 70 `ids` into the ZIP written to `out` (a path or a binary stream)."""
+
+    def __init__(self, workers=None, chunk_size=200, progress=None, cache=None):
+        self.workers = workers or default_workers()
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.cache = cert70_pdf_cache.enabled() if cache is None else cache
+        self.tiempos = []
+        self.errores = []
+        self._archivos = {}  # certificado id -> cached PDF path, for archivo_pdf
+
+    def render(self, ids, out):
+        ids = list(ids)
+        return self.render_snapshots(_snapshots(ids, self.chunk_size), out, len(ids))
+
+    def render_snapshots(self, snapshots, out, total):
+        """Same as render() for already built snapshots (`total` of them at most)."""
+        start = time.perf_counter()
+        workers = max(1, min(self.workers, total))
+        with zipfile.ZipFile(out, 'w', compression=zipfile.ZIP_STORED) as archive:
+            misses = self._from_cache(archive, snapshots, total)
+            if workers == 1:
+                for certificado, key in misses:
+                    self._write(archive, certificado, key, lambda: render_pdf(certificado), total)
+            else:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    pending = {}
+                    for certificado, key in misses:
+                        if len(pending) >= workers * 2:
+                            self._drain(archive, pending, total, FIRST_COMPLETED)
+                        pending[pool.submit(render_pdf, certificado)] = (certificado, key)
+                    self._drain(archive, pending, total)
+        self._save_archivos()
+        return self._report(total, workers, time.perf_counter() - start)
+
+    def _from_cache(self, archive, snapshots, total):
+        """Writes the cached certificates; yields (snapshot, cache key) of those to render."""
+        for certificado in snapshots:
+            if not self.cache:
+                yield certificado, None
+                continue
+            key = cert70_pdf_cache.render_key(certificado)
+            path = cert70_pdf_cache.lookup(key)
+            if path is None:
+                yield certificado, key
+                continue
+            filename = Cert70PDFGenerator(certificado).filename
+            archive.write(path, arcname=filename)
+            self._done(certificado, path, {"archivo": filename, "segundos": 0.0, "bytes": os.path.getsize(path), "cache": True}, total)
+
+    def _drain(self, archive, pending, total, return_when=ALL_COMPLETED):
+        done, _ = wait(pending, return_when=return_when)
+        for future in done:
+            certificado, key = pending.pop(future)
+            self._write(archive, certificado, key, future.result, total)
+
+    def _write(self, archive, certificado, key, result, total):
+        try:
+            _, filename, pdf, seconds = result()
+        except Exception as e:
+            self.errores.append({"id": certificado.id, "error": str(e)})
+            self._progress(total)
+            return
+        archive.writestr(filename, pdf)
+        path = cert70_pdf_cache.store(key, pdf) if key else None
+        self._done(certificado, path, {"archivo": filename, "segundos": round(seconds, 4), "bytes": len(pdf), "cache": False}, total)
+
+    def _done(self, certificado, path, tiempo, total):
+        self.tiempos.append({"id": certificado.id, **tiempo})
+        if path and getattr(certificado, 'archivo_pdf', None) != path:
+            self._archivos[certificado.id] = path
+        self._progress(total)
+
+    def _progress(self, total):
+        if self.progress:
+            self.progress(len(self.tiempos) + len(self.errores), total)
+
+    def _save_archivos(self):
+        if self._archivos:
+            Certificado70.objects.bulk_update(
+                [Certificado70(pk=pk, archivo_pdf=path) for pk, path in self._archivos.items()],
+                ['archivo_pdf'], batch_size=self.chunk_size,
+            )
+            self._archivos = {}
+
+    def _report(self, total, workers, elapsed):
+        segundos = [t["segundos"] for t in self.tiempos if not t["cache"]]
+        return {
+            "certificados": len(self.tiempos),
+            "faltantes": total - len(self.tiempos) - len(self.errores),
+            "errores": self.errores,
+            "workers": workers,
+            "elapsed_seconds": round(elapsed, 3),
+            "certificados_por_segundo": round(len(self.tiempos) / elapsed, 1) if elapsed else None,
+            "cache": {"aciertos": len(self.tiempos) - len(segundos), "renderizados": len(segundos)},
+            "render_segundos": {
+                "total": round(sum(segundos), 3),
+                "mediana": round(statistics.median(segundos), 4) if segundos else None,
+                "max": max(segundos, default=None),
+            },
+            "bytes": sum(t["bytes"] for t in self.tiempos),
+            "tiempos": self.tiempos,
+        }
+
+
+def render_zip(ids, out, workers=None, progress=None):
+    return ZipRenderer(workers=workers, progress=progress).render(ids, out)
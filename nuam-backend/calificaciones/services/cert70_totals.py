@@ -0,0 +1,290 @@
+"""
+Incrementally maintained Cert70 totales (TotalCert70).
+
+Every write to a CalificacionTributaria or CreditoIDPC becomes a delta on the
+(empresa, propietario, año) row it counts towards: the signals handle single
+saves and deletes, the bulk paths collect the deltas of a chunk in one
+Deltas and apply it inside the chunk's transaction. Deltas are applied as
+UPDATE ... SET col = col + n (INSERT the first time), so concurrent writers
+don't lose increments and the totals commit or roll back with the rows that
+caused them.
+
+Writes that skip both (queryset.update(), raw SQL) leave the table drifted:
+`manage.py reconciliar_totales_cert70` recomputes it from source with
+expected() and reports / fixes the differences.
+"""
+from collections import defaultdict
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Coalesce, ExtractYear, NullIf
+from django.utils import timezone
+from calificaciones.models import CalificacionTributaria, CreditoIDPC, TotalCert70
+from .cert70_engine import IMPUTACIONES, TOTALES, credito_column, imputacion_column
+
+COLUMNS = ("movimientos", *TOTALES)
+_IMPUTACION = 3  # after movimientos, monto_historico, monto_actualizado
+_CREDITO = _IMPUTACION + len(IMPUTACIONES)
+STATE_FIELDS = ("empresa_id", "propietario_id", "fecha", "estado", "monto_original", "monto_reajustado", "imputacion")
+
+
+def _state(cal):
+    """Fields of a calificación that decide its contribution (instance, values() row or serializer data)."""
+    if isinstance(cal, dict):
+        return {
+            **cal,
+            "empresa_id": cal.get("empresa_id", cal.get("empresa")),
+            "propietario_id": cal.get("propietario_id", cal.get("propietario")),
+        }
+    return {field: getattr(cal, field) for field in STATE_FIELDS}
+
+
+def key_of(cal):
+    """(empresa_id, propietario_id, anio) a calificación counts towards, or None if it doesn't count."""
+    if cal is None:
+        return None
+    state = _state(cal)
+    if state["estado"] != 'vigente':
+        return None
+    fecha = state["fecha"]
+    anio = fecha.year if hasattr(fecha, "year") else int(str(fecha)[:4])
+    return (state["empresa_id"], state["propietario_id"], anio)
+
+
+def totales(row):
+    """Certificate totales dict of a TotalCert70."""
+    return {column: getattr(row, column) for column in TOTALES}
+
+
+class Deltas:
+    """Changes to TotalCert70 collected in memory and written by apply()."""
+
+    def __init__(self):
+        self.pending = defaultdict(lambda: [0] * len(COLUMNS))
+        self._moved = []  # (calificacion_id, antes, despues) whose credits change row
+
+    def add(self, cal, sign=1):
+        """Movement count, montos and imputación of a calificación (+1 written, -1 removed)."""
+        key = key_of(cal)
+        if key is None:
+            return
+        state = _state(cal)
+        row = self.pending[key]
+        historico = state["monto_original"] or 0
+        actualizado = state["monto_reajustado"] or historico
+        row[0] += sign
+        row[1] += sign * historico
+        row[2] += sign * actualizado
+        column = imputacion_column(state["imputacion"] or "")
+        if column >= 0:
+            row[_IMPUTACION + column] += sign * actualizado
+
+    def credito(self, cal, tipo, monto, sign=1):
+        """One CreditoIDPC of `cal`."""
+        key = key_of(cal)
+        if key is not None:
+            self.pending[key][_CREDITO + credito_column(tipo or "")] += sign * (monto or 0)
+
+    def cambio(self, antes, despues):
+        """
+        A saved calificación went from `antes` to `despues`. Its credits only
+        move when the row it counts towards changes (year, partner, estado...);
+        they are read in apply(), with one query for all of them.
+        """
+        self.add(antes, -1)
+        self.add(despues)
+        if despues.pk and key_of(antes) != key_of(despues):
+            self._moved.append((despues.pk, antes, despues))
+
+    def _move_creditos(self):
+        moved = {pk: (antes, despues) for pk, antes, despues in self._moved}
+        self._moved = []
+        if not moved:
+            return
+        creditos = CreditoIDPC.objects.filter(calificacion_id__in=list(moved)).values_list('calificacion_id', 'tipo', 'monto')
+        for calificacion_id, tipo, monto in creditos:
+            antes, despues = moved[calificacion_id]
+            self.credito(antes, tipo, monto, -1)
+            self.credito(despues, tipo, monto)
+
+    def apply(self):
+        """
+        Writes the pending deltas (one UPDATE per touched row, keys in a fixed
+        order so concurrent writers lock them alike). Rows touched with a
+        zero delta still get a new revision: their certificates' detalles changed.
+        """
+        self._move_creditos()
+        pending, self.pending = self.pending, defaultdict(lambda: [0] * len(COLUMNS))
+        if not pending:
+            return
+        now = timezone.now()
+        with transaction.atomic():
+            for (empresa_id, propietario_id, anio), row in sorted(pending.items()):
+                lookup = {"empresa_id": empresa_id, "propietario_id": propietario_id, "anio": anio}
+                changes = {column: F(column) + delta for column, delta in zip(COLUMNS, row) if delta}
+                if _increment(lookup, changes, now) or not any(row):
+                    continue
+                if any(delta < 0 for delta in row):
+                    # Nothing to subtract from: the row went with its empresa /
+                    # propietario (cascade delete) or was never there (reconcile fixes it)
+                    continue
+                try:
+                    with transaction.atomic():
+                        TotalCert70.objects.create(**lookup, **dict(zip(COLUMNS, row)), revision=1, actualizado_en=now)
+                except IntegrityError:
+                    # Inserted by a concurrent writer in the meantime
+                    _increment(lookup, changes, now)
+
+
+def _increment(lookup, changes, now):
+    return TotalCert70.objects.filter(**lookup).update(**changes, revision=F('revision') + 1, actualizado_en=now)
+
+
+def resumen(anio):
+    """Cert70 totales of every partner with movements in `anio`, summed (one aggregate query)."""
+    data = TotalCert70.objects.filter(anio=anio, movimientos__gt=0).aggregate(
+        socios=Count('id'), **{column: Sum(column) for column in COLUMNS}
+    )
+    return {"anio": anio, **{k: v or 0 for k, v in data.items()}}
+
+
+# --- Signal entry points (one saved / deleted instance) ---
+
+def calificacion_saved(instance, antes):
+    deltas = Deltas()
+    if antes:
+        deltas.cambio(antes, instance)
+    else:
+        deltas.add(instance)
+    deltas.apply()
+
+
+def calificacion_deleted(instance):
+    # Its credits are deleted first by the cascade and subtract themselves
+    deltas = Deltas()
+    deltas.add(instance, -1)
+    deltas.apply()
+
+
+def _calificacion(calificacion_id):
+    return CalificacionTributaria.objects.filter(pk=calificacion_id).values(*STATE_FIELDS).first()
+
+
+def credito_saved(instance, antes):
+    """`antes`: (calificacion_id, tipo, monto) before the save, None when created."""
+    deltas = Deltas()
+    if antes:
+        calificacion_id, tipo, monto = antes
+        cal = instance.calificacion if calificacion_id == instance.calificacion_id else _calificacion(calificacion_id)
+        deltas.credito(cal, tipo, monto, -1)
+    deltas.credito(instance.calificacion, instance.tipo, instance.monto)
+    deltas.apply()
+
+
+def credito_deleted(instance):
+    deltas = Deltas()
+    deltas.credito(_calificacion(instance.calificacion_id), instance.tipo, instance.monto, -1)
+    deltas.apply()
+
+
+# --- Reconciliation ---
+
+def expected(calificaciones=None, creditos=None):
+    """
+    {(empresa_id, propietario_id, anio): [COLUMNS]} recomputed from source:
+    the vigente rows of `calificaciones` and `creditos` (querysets, all rows
+    by default), with two grouped queries (one result row per partner-year
+    and distinct imputación / credit type).
+    """
+    if calificaciones is None:
+        calificaciones = CalificacionTributaria.objects.all()
+    if creditos is None:
+        creditos = CreditoIDPC.objects.all()
+    result = defaultdict(lambda: [0] * len(COLUMNS))
+
+    grupos = (
+        calificaciones.filter(estado='vigente')
+        .values('empresa_id', 'propietario_id', 'imputacion', anio_fecha=ExtractYear('fecha'))
+        .annotate(
+            n=Count('id'),
+            historico=Sum('monto_original'),
+            actualizado=Sum(Coalesce(NullIf('monto_reajustado', Value(0)), 'monto_original')),
+        )
+        .order_by()
+    )
+    for g in grupos:
+        row = result[(g['empresa_id'], g['propietario_id'], g['anio_fecha'])]
+        row[0] += g['n']
+        row[1] += g['historico']
+        row[2] += g['actualizado']
+        column = imputacion_column(g['imputacion'] or "")
+        if column >= 0:
+            row[_IMPUTACION + column] += g['actualizado']
+
+    grupos = (
+        creditos.filter(calificacion__estado='vigente')
+        .values(
+            'tipo',
+            empresa=F('calificacion__empresa_id'),
+            propietario=F('calificacion__propietario_id'),
+            anio_fecha=ExtractYear('calificacion__fecha'),
+        )
+        .annotate(total=Sum('monto'))
+        .order_by()
+    )
+    for g in grupos:
+        result[(g['empresa'], g['propietario'], g['anio_fecha'])][_CREDITO + credito_column(g['tipo'] or "")] += g['total']
+    return dict(result)
+
+
+def reconcile(empresa_id=None, anio=None, corregir=False):
+    """
+    Compares TotalCert70 (optionally one empresa / year) with expected().
+    Returns {"revisados", "diferencias": [...], "corregidos"}; with corregir=True
+    drifted rows are overwritten with the recomputed values (and a new revision).
+    Deltas committed while it runs can be overwritten: run it with writes quiet.
+    """
+    calificaciones = CalificacionTributaria.objects.all()
+    creditos = CreditoIDPC.objects.all()
+    tabla = TotalCert70.objects.all()
+    if empresa_id:
+        calificaciones = calificaciones.filter(empresa_id=empresa_id)
+        creditos = creditos.filter(calificacion__empresa_id=empresa_id)
+        tabla = tabla.filter(empresa_id=empresa_id)
+    if anio:
+        calificaciones = calificaciones.filter(fecha__year=anio)
+        creditos = creditos.filter(calificacion__fecha__year=anio)
+        tabla = tabla.filter(anio=anio)
+
+    fuente = expected(calificaciones, creditos)
+    actual = {
+        (row[0], row[1], row[2]): list(row[3:])
+        for row in tabla.values_list('empresa_id', 'propietario_id', 'anio', *COLUMNS)
+    }
+    cero = [0] * len(COLUMNS)
+    diferencias = []
+    for key in sorted(set(fuente) | set(actual)):
+        esperado, guardado = fuente.get(key, cero), actual.get(key)
+        if guardado == esperado or (guardado is None and esperado == cero):
+            continue
+        diferencias.append({
+            "empresa_id": key[0], "propietario_id": key[1], "anio": key[2],
+            "faltante": guardado is None,
+            "columnas": {
+                column: [g, e] for column, g, e in zip(COLUMNS, guardado or cero, esperado) if g != e
+            },
+        })
+
+    corregidos = 0
+    if corregir and diferencias:
+        now = timezone.now()
+        with transaction.atomic():
+            for d in diferencias:
+                key = (d["empresa_id"], d["propietario_id"], d["anio"])
+                values = dict(zip(COLUMNS, fuente.get(key, cero)))
+                lookup = {"empresa_id": key[0], "propietario_id": key[1], "anio": key[2]}
+                TotalCert70.objects.update_or_create(
+                    **lookup, defaults={**values, "revision": F('revision') + 1, "actualizado_en": now},
+                    create_defaults={**values, "revision": 1, "actualizado_en": now},
+                )
+                corregidos += 1
+    return {"revisados": len(set(fuente) | set(actual)), "diferencias": diferencias, "corregidos": corregidos}
@@ -0,0 +1,122 @@
+import hashlib
+import os
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from calificaciones.models import CargaFragmentada
+
+EXTENSIONES = ('.csv', '.xls', '.xlsx', '.pdf')
+DEFAULT_FRAGMENT_SIZE = 8 * 1024 * 1024
+READ_SIZE = 64 * 1024
+
+
+class FragmentoError(Exception):
+    """Rejected fragment (wrong size, checksum mismatch...). The client should resend it."""
+
+
+def cargas_dir():
+    path = os.path.join(settings.MEDIA_ROOT, 'cargas')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def iniciar(nombre_archivo, tamano, usuario, tamano_fragmento=None, sha256=None):
+    """Registers a resumable upload and preallocates its file on disk."""
+    nombre_archivo = os.path.basename(nombre_archivo or '')
+    if not nombre_archivo.lower().endswith(EXTENSIONES):
+        raise ValueError(f"Tipo de archivo no soportado (permitidos: {', '.join(EXTENSIONES)})")
+    if tamano <= 0 or tamano > getattr(settings, 'CARGA_MAX_TAMANO', 2 * 1024 ** 3):
+        raise ValueError("Tamaño de archivo no válido")
+    maximo = getattr(settings, 'CARGA_FRAGMENTO_MAX', 64 * 1024 * 1024)
+    tamano_fragmento = tamano_fragmento or getattr(settings, 'CARGA_FRAGMENTO_SIZE', DEFAULT_FRAGMENT_SIZE)
+    if tamano_fragmento <= 0 or tamano_fragmento > maximo:
+        raise ValueError(f"tamano_fragmento debe estar entre 1 y {maximo} bytes")
+
+    carga = CargaFragmentada(
+        nombre_archivo=nombre_archivo,
+        tamano=tamano,
+        tamano_fragmento=tamano_fragmento,
+        sha256=sha256 or None,
+        creado_por=usuario,
+    )
+    carga.ruta = os.path.join(cargas_dir(), f"{carga.id.hex}.part")
+    with open(carga.ruta, 'wb') as f:
+        f.truncate(tamano)  # sparse file: fragments can arrive in any order
+    carga.save()
+    return carga
+
+
+def escribir_fragmento(carga, numero, stream, length, checksum):
+    """
+    Copies fragment `numero` from `stream` (the raw request body) straight to
+    its offset in the upload file, READ_SIZE bytes at a time, and checks its
+    SHA-256. Resending a fragment simply overwrites it.
+    """
+    if not 0 <= numero < carga.total_fragmentos:
+        raise FragmentoError(f"Fragmento fuera de rango (0-{carga.total_fragmentos - 1})")
+    esperado = carga.tamano_de(numero)
+    if length != esperado:
+        raise FragmentoError(f"El fragmento {numero} debe medir {esperado} bytes (recibidos {length})")
+    if not checksum:
+        raise FragmentoError("Falta el encabezado X-Chunk-SHA256")
+
+    digest = hashlib.sha256()
+    restante = esperado
+    with open(carga.ruta, 'r+b') as f:
+        f.seek(numero * carga.tamano_fragmento)
+        while restante:
+            data = stream.read(min(READ_SIZE, restante))
+            if not data:
+                break
+            digest.update(data)
+            f.write(data)
+            restante -= len(data)
+    if restante:
+        raise FragmentoError(f"Fragmento {numero} incompleto")
+    if digest.hexdigest() != checksum.strip().lower():
+        raise FragmentoError(f"Checksum del fragmento {numero} no coincide")
+
+    # Concurrent PUTs of different fragments update the same row
+    with transaction.atomic():
+        carga = CargaFragmentada.objects.select_for_update().get(pk=carga.pk)
+        if numero not in carga.fragmentos_recibidos:
+            carga.fragmentos_recibidos = sorted(carga.fragmentos_recibidos + [numero])
+            carga.save(update_fields=["fragmentos_recibidos", "actualizado_en"])
+    return carga
+
+
+def descartar(carga, estado="cancelada"):
+    if carga.ruta and os.path.exists(carga.ruta):
+        os.remove(carga.ruta)
+    carga.estado = estado
+    carga.save(update_fields=["estado", "actualizado_en"])
+
+
+def limpiar_vencidas(horas=None):
+    """
+    Deletes the uploads without activity for `horas` (CARGA_EXPIRA_HORAS by
+    default) and the .part files of unfinished ones, plus .part files that
+    old with no upload row left. A finalized upload's file belongs to its
+    handler (or job) and is not touched. Returns {"cargas", "archivos"} deleted.
+    """
+    horas = horas if horas is not None else getattr(settings, 'CARGA_EXPIRA_HORAS', 24)
+    limite = timezone.now() - timedelta(hours=horas)
+    archivos = 0
+    vencidas = CargaFragmentada.objects.filter(actualizado_en__lt=limite)
+    for carga in vencidas.exclude(estado="finalizada").only('ruta'):
+        if carga.ruta and os.path.exists(carga.ruta):
+            os.remove(carga.ruta)
+            archivos += 1
+    cargas = vencidas.delete()[0]
+
+    # .part files whose row is gone (e.g. deleted by hand, or iniciar failed after preallocating)
+    vivas = {f"{pk.hex}.part" for pk in CargaFragmentada.objects.values_list('id', flat=True)}
+    corte = time.time() - horas * 3600
+    with os.scandir(cargas_dir()) as entries:
+        for entry in entries:
+            if entry.name.endswith('.part') and entry.name not in vivas and entry.stat().st_mtime < corte:
+                os.remove(entry.path)
+                archivos += 1
+    return {"cargas": cargas, "archivos": archivos}
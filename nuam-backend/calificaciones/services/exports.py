@@ -0,0 +1,126 @@
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.lib.styles import getSampleStyleSheet
+import pandas as pd
+
+
+def render_calificaciones_pdf(queryset, output):
+    """Writes the calificaciones report PDF into `output` (HttpResponse or file)."""
+    doc = SimpleDocTemplate(output, pagesize=landscape(A4))
+    elements = []
+    styles = getSampleStyleSheet()
+
+    # Header
+    elements.append(Paragraph("<b>Reporte de Calificaciones Tributarias</b>", styles['Heading1']))
+    elements.append(Spacer(1, 10))
+
+    # Table Data
+    data = [["Fecha", "Empresa", "Propietario", "Tipo", "Monto", "Estado"]]
+
+    for cal in queryset:
+        data.append([
+            Paragraph(str(cal.fecha), styles['Normal']),
+            Paragraph(cal.empresa.razon_social or "", styles['Normal']),
+            Paragraph(cal.propietario.nombre if cal.propietario else "Sin propietario", styles['Normal']),
+            Paragraph(cal.tipo, styles['Normal']),
+            Paragraph(f"${cal.monto_original:,.0f}", styles['Normal']),
+            Paragraph(cal.estado.capitalize(), styles['Normal']),
+        ])
+
+    # Table Style
+    # Cols: Fecha(80), Empresa(200), Prop(150), Tipo(80), Monto(100), Estado(80) = ~700
+    t = Table(data, colWidths=[80, 200, 150, 80, 100, 80])
+    t.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.darkred), # NUAM Red?
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ]))
+
+    elements.append(t)
+    doc.build(elements)
+    return output
+
+
+def render_auditoria_pdf(logs, output):
+    """Writes the audit log PDF into `output` (HttpResponse or file)."""
+    doc = SimpleDocTemplate(output, pagesize=landscape(A4)) # Landscape for more width
+    elements = []
+    styles = getSampleStyleSheet()
+
+    # Header
+    elements.append(Paragraph("<b>Reporte de Auditoría</b>", styles['Heading1']))
+    elements.append(Spacer(1, 10))
+
+    # Table Header
+    data = [["Fecha", "Usuario", "Acción", "Entidad", "Detalle"]]
+
+    # Table Body
+    for log in logs:
+        date_str = log.fecha.strftime("%Y-%m-%d %H:%M") if log.fecha else ""
+        user_str = log.usuario.username if log.usuario else "Sistema"
+        # Detalle is JSON, use simple string repr or empty if None
+        # Truncate detail to avoid huge cells
+        detail_str = str(log.detalle)[:50] + "..." if log.detalle else ""
+        if len(str(log.detalle)) < 50: detail_str = str(log.detalle) or ""
+
+        data.append([
+            Paragraph(date_str, styles['Normal']),
+            Paragraph(user_str, styles['Normal']),
+            Paragraph(log.accion, styles['Normal']),
+            Paragraph(log.entidad, styles['Normal']),
+            Paragraph(detail_str, styles['Normal']), # Use Paragraph to wrap text
+        ])
+
+    # Table Styling
+    # Widths: A4 Landscape is ~840pts.
+    t = Table(data, colWidths=[110, 100, 80, 120, 300])
+    t.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.gray),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ]))
+
+    elements.append(t)
+    doc.build(elements)
+    return output
+
+
+def render_auditoria_xlsx(logs, output):
+    """Writes the audit log spreadsheet into `output` (HttpResponse or file)."""
+    data = []
+    for log in logs:
+        data.append({
+            "Fecha": log.fecha.strftime("%Y-%m-%d %H:%M") if log.fecha else "",
+            "Usuario": log.usuario.username if log.usuario else "Sistema",
+            "Accion": log.accion,
+            "Entidad": log.entidad,
+            "Detalle": log.detalle
+        })
+
+    df = pd.DataFrame(data)
+    df.to_excel(output, index=False)
+    return output
+
+
+def iter_in_order(queryset, ids, chunk_size=1000):
+    """
+    Yields the objects of `queryset` for `ids`, keeping the order of `ids`.
+    Used by background exports, which receive the ids the view had filtered.
+    """
+    for offset in range(0, len(ids), chunk_size):
+        chunk = ids[offset:offset + chunk_size]
+        objs = queryset.in_bulk(chunk)
+        for pk in chunk:
+            if pk in objs:
+                yield objs[pk]
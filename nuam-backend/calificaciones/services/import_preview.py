@@ -0,0 +1,165 @@
+import time
+from django.conf import settings
+from calificaciones.models import Empresa, Propietario, CalificacionTributaria
+from .bulk_ingest import DEFAULT_CHUNK_SIZE
+from .tabular_reader import TabularReader, TabularReadError
+from .upload_validation import validate_rows
+
+DEFAULT_SAMPLE_SIZE = 20
+
+
+class DiffPreview:
+    """Counts + capped samples of what an import would create / update / leave unchanged, per entity."""
+
+    CATEGORIES = ("created", "updated", "unchanged")
+
+    def __init__(self, sample_size=None):
+        self.sample_size = sample_size or getattr(settings, 'IMPORT_PREVIEW_SAMPLE_SIZE', DEFAULT_SAMPLE_SIZE)
+        self.entities = {}
+
+    def _entity(self, entidad):
+        if entidad not in self.entities:
+            self.entities[entidad] = {
+                **{c: 0 for c in self.CATEGORIES},
+                "samples": {c: [] for c in self.CATEGORIES},
+            }
+        return self.entities[entidad]
+
+    def add(self, entidad, categoria, sample):
+        entity = self._entity(entidad)
+        entity[categoria] += 1
+        if len(entity["samples"][categoria]) < self.sample_size:
+            entity["samples"][categoria].append(sample)
+
+    def add_many(self, entidad, categoria, n, samples):
+        """Counts n rows at once; `samples(room)` builds at most `room` samples, only if there is room."""
+        entity = self._entity(entidad)
+        entity[categoria] += n
+        room = self.sample_size - len(entity["samples"][categoria])
+        if room > 0:
+            entity["samples"][categoria].extend(samples(room))
+
+    def count(self, entidad, key, n=1):
+        """Extra counters that are not a create/update/unchanged category (e.g. duplicates)."""
+        entity = self._entity(entidad)
+        entity[key] = entity.get(key, 0) + n
+
+    def as_dict(self):
+        for entidad in ("empresas", "propietarios", "calificaciones"):
+            self._entity(entidad)
+        return dict(self.entities)
+
+
+class TabularPreview:
+    """
+    Dry run of BulkIngestor: same reading and validation, then one IN lookup
+    per model per batch against the DB; nothing is written.
+
+    The ingest never updates empresas/propietarios and always inserts
+    calificaciones, so existing empresas/propietarios count as "unchanged"
+    and calificaciones identical to one already stored are flagged as
+    "duplicates" (they would be inserted again).
+    """
+
+    def __init__(self, chunk_size=None, sample_size=None):
+        self.chunk_size = chunk_size or getattr(settings, 'BULK_UPLOAD_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+        self.diff = DiffPreview(sample_size)
+        self.rows = 0
+        self.validation_errors = []
+        self.errors = []
+        self._empresas = {}      # rut -> exists
+        self._propietarios = {}  # (rut_empresa, rut) -> pk or None
+
+    def preview(self, batches):
+        start = time.perf_counter()
+        try:
+            for batch in batches:
+                self.rows += len(batch)
+                clean, errors = validate_rows(batch)
+                self.validation_errors.extend(errors)
+                if len(clean):
+                    self._classify_empresas(clean)
+                    self._classify_propietarios(clean)
+                    self._classify_calificaciones(clean)
+        except TabularReadError as e:
+            self.errors.append(str(e))
+
+        return {
+            "dry_run": True,
+            "rows": self.rows,
+            "rejected": len({e["fila"] for e in self.validation_errors}),
+            "validation_error_count": len(self.validation_errors),
+            "validation_errors": self.validation_errors[:self.diff.sample_size],
+            "errors": self.errors,
+            **self.diff.as_dict(),
+            "elapsed_seconds": round(time.perf_counter() - start, 3),
+        }
+
+    def _classify_empresas(self, clean):
+        nuevas = clean.drop_duplicates('rut_empresa')
+        nuevas = nuevas[~nuevas['rut_empresa'].isin(self._empresas.keys())]
+        if nuevas.empty:
+            return
+        existing = set(Empresa.objects.filter(rut__in=list(nuevas['rut_empresa'])).values_list('rut', flat=True))
+        for rut, razon_social in zip(nuevas['rut_empresa'], nuevas['razon_social']):
+            self._empresas[rut] = rut in existing
+            self.diff.add("empresas", "unchanged" if rut in existing else "created", {
+                "rut": rut, "razon_social": razon_social
+            })
+
+    def _classify_propietarios(self, clean):
+        nuevos = clean.drop_duplicates(['rut_empresa', 'rut_propietario'])
+        keys = list(zip(nuevos['rut_empresa'], nuevos['rut_propietario'], nuevos['nombre_propietario']))
+        keys = [k for k in keys if (k[0], k[1]) not in self._propietarios]
+        if not keys:
+            return
+        existing = {}
+        # Oldest row wins, same as the ingest resolves duplicated RUTs
+        for pk, rut_empresa, rut in Propietario.objects.filter(
+            empresa__rut__in={k[0] for k in keys},
+            rut__in={k[1] for k in keys},
+        ).order_by('-id').values_list('id', 'empresa__rut', 'rut'):
+            existing[(rut_empresa, rut)] = pk
+        for rut_empresa, rut, nombre in keys:
+            pk = existing.get((rut_empresa, rut))
+            self._propietarios[(rut_empresa, rut)] = pk
+            self.diff.add("propietarios", "unchanged" if pk else "created", {
+                "rut_empresa": rut_empresa, "rut": rut, "nombre": nombre
+            })
+
+    def _classify_calificaciones(self, clean):
+        propietario_ids = [
+            self._propietarios.get((e, p)) for e, p in zip(clean['rut_empresa'], clean['rut_propietario'])
+        ]
+        known = {pk for pk in propietario_ids if pk}
+        stored = set()
+        if known:
+            stored = set(CalificacionTributaria.objects.filter(
+                propietario_id__in=known,
+                fecha__in=set(clean['fecha']),
+                tipo__in=set(clean['tipo_calificacion']),
+                monto_original__in={int(m) for m in clean['monto']},
+            ).values_list('propietario_id', 'fecha', 'tipo', 'monto_original'))
+
+        if stored:
+            keys = zip(propietario_ids, clean['fecha'], clean['tipo_calificacion'], clean['monto'])
+            self.diff.count("calificaciones", "duplicates", sum(1 for k in keys if k in stored))
+
+        def samples(room):
+            return [{
+                "fila": int(index) + 2,
+                "rut_empresa": row.rut_empresa,
+                "rut_propietario": row.rut_propietario,
+                "fecha": row.fecha.isoformat(),
+                "tipo": row.tipo_calificacion,
+                "monto": int(row.monto),
+            } for index, row in zip(clean.index, clean.head(room).itertuples(index=False))]
+        self.diff.add_many("calificaciones", "created", len(clean), samples)
+
+
+def preview_file(file_obj, chunk_size=None):
+    """Dry run of ingest_file: what the upload would write, without writing it."""
+    previewer = TabularPreview(chunk_size=chunk_size)
+    reader = TabularReader(file_obj, batch_size=previewer.chunk_size)
+    reader.read_header()
+    return previewer.preview(reader)
@@ -0,0 +1,211 @@
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework.response import Response
+from calificaciones.models import Tarea
+
+# tipo -> (handler, max_intentos)
+HANDLERS = {}
+
+
+class JobError(Exception):
+    """
+    Raised by a handler for a failure that must not be retried (bad input,
+    permission problem...). `detalle` is stored as the job result.
+    """
+    def __init__(self, message, detalle=None):
+        super().__init__(message)
+        self.detalle = detalle
+
+
+def register(tipo, max_intentos=None):
+    """
+    Registers a job handler: `handler(parametros, job)` returns a JSON-serializable result.
+    Non-idempotent handlers should pass max_intentos=1.
+    """
+    def decorator(func):
+        HANDLERS[tipo] = (func, max_intentos)
+        return func
+    return decorator
+
+
+def enqueue(tipo, parametros=None, usuario=None):
+    if tipo not in HANDLERS:
+        raise ValueError(f"Tipo de tarea desconocido: {tipo}")
+    _, max_intentos = HANDLERS[tipo]
+    return Tarea.objects.create(
+        tipo=tipo,
+        parametros=parametros or {},
+        creado_por=usuario,
+        max_intentos=max_intentos or getattr(settings, 'TAREAS_MAX_INTENTOS', 3),
+    )
+
+
+def wants_async(request):
+    """Views run inline unless the client asks for ?async=1."""
+    return str(request.query_params.get('async', '')).lower() in ('1', 'true', 'yes')
+
+
+def accepted_response(tarea):
+    return Response({
+        "tarea_id": tarea.id,
+        "estado": tarea.estado,
+        "url": f"/api/tareas/{tarea.id}/",
+    }, status=202)
+
+
+def jobs_dir(*parts):
+    path = os.path.join(settings.MEDIA_ROOT, 'tareas', *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def save_upload(file_obj):
+    """Persists an uploaded file so a worker can pick it up after the request ends."""
+    name = os.path.basename(file_obj.name or 'archivo')
+    path = os.path.join(jobs_dir('entrada'), f"{uuid.uuid4().hex}_{name}")
+    with open(path, 'wb') as dest:
+        for chunk in file_obj.chunks():
+            dest.write(chunk)
+    return path
+
+
+def result_path(tarea, extension):
+    return os.path.join(jobs_dir('resultados'), f"tarea_{tarea.id}.{extension}")
+
+
+class JobContext:
+    """Handed to handlers to report progress."""
+
+    def __init__(self, tarea, min_interval=1.0):
+        self.tarea = tarea
+        self.min_interval = min_interval
+        self._last_write = 0.0
+
+    def progress(self, actual, total=None, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_write < self.min_interval:
+            return
+        self._last_write = now
+        self.tarea.progreso = actual
+        if total is not None:
+            self.tarea.total = total
+        Tarea.objects.filter(pk=self.tarea.pk).update(
+            progreso=self.tarea.progreso,
+            total=self.tarea.total,
+        )
+
+
+class Heartbeat(threading.Thread):
+    """Touches `latido_en` while a job runs, even if the handler never reports progress."""
+
+    def __init__(self, tarea_id, interval):
+        super().__init__(daemon=True)
+        self.tarea_id = tarea_id
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        try:
+            while not self._stop_event.wait(self.interval):
+                Tarea.objects.filter(pk=self.tarea_id, estado="en_proceso").update(latido_en=timezone.now())
+        finally:
+            connection.close()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim_next(worker_id):
+    """
+    Atomically takes the oldest runnable job. Several worker processes can poll
+    the same table: the conditional UPDATE guarantees a job is claimed only once.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        qs = Tarea.objects.filter(estado="pendiente", disponible_en__lte=now).order_by("disponible_en", "id")
+        if connection.features.has_select_for_update_skip_locked:
+            qs = qs.select_for_update(skip_locked=True)
+        candidate = qs.values_list("id", flat=True).first()
+        if candidate is None:
+            return None
+        claimed = Tarea.objects.filter(pk=candidate, estado="pendiente").update(
+            estado="en_proceso",
+            worker=worker_id,
+            intentos=F("intentos") + 1,
+            iniciado_en=now,
+            latido_en=now,
+        )
+    if not claimed:
+        return None
+    return Tarea.objects.get(pk=candidate)
+
+
+def run(tarea):
+    """Executes a claimed job and applies the retry policy on failure."""
+    handler, _ = HANDLERS.get(tarea.tipo, (None, None))
+    ctx = JobContext(tarea)
+    heartbeat = Heartbeat(tarea.pk, getattr(settings, 'TAREAS_HEARTBEAT_TIMEOUT', 600) / 4)
+    heartbeat.start()
+    try:
+        if handler is None:
+            raise JobError(f"Tipo de tarea desconocido: {tarea.tipo}")
+        resultado = handler(tarea.parametros, ctx)
+    except JobError as e:
+        _finish(tarea, "fallida", resultado=e.detalle, error=str(e))
+    except Exception as e:
+        error = f"{e}\n{traceback.format_exc()}"
+        if tarea.intentos < tarea.max_intentos:
+            backoff = getattr(settings, 'TAREAS_RETRY_BACKOFF', 30) * (2 ** (tarea.intentos - 1))
+            tarea.estado = "pendiente"
+            tarea.error = error
+            tarea.disponible_en = timezone.now() + timedelta(seconds=backoff)
+            tarea.worker = None
+            tarea.save(update_fields=["estado", "error", "disponible_en", "worker"])
+        else:
+            _finish(tarea, "fallida", error=error)
+    else:
+        _finish(tarea, "completada", resultado=resultado)
+    finally:
+        heartbeat.stop()
+    return tarea
+
+
+def _finish(tarea, estado, resultado=None, error=None):
+    tarea.estado = estado
+    tarea.resultado = resultado
+    tarea.error = error
+    tarea.finalizado_en = timezone.now()
+    if estado == "completada" and tarea.total is not None:
+        tarea.progreso = tarea.total
+    tarea.save(update_fields=["estado", "resultado", "error", "finalizado_en", "progreso"])
+
+
+def requeue_stale(timeout=None):
+    """
+    Jobs whose worker stopped sending heartbeats (killed, OOM, deploy) go back
+    to the queue, or fail if they already used all their attempts.
+    """
+    timeout = timeout or getattr(settings, 'TAREAS_HEARTBEAT_TIMEOUT', 600)
+    limit = timezone.now() - timedelta(seconds=timeout)
+    stale = Tarea.objects.filter(estado="en_proceso", latido_en__lt=limit)
+    failed = stale.filter(intentos__gte=F("max_intentos")).update(
+        estado="fallida",
+        error="El worker dejó de responder",
+        finalizado_en=timezone.now(),
+    )
+    requeued = stale.update(estado="pendiente", worker=None, disponible_en=timezone.now())
+    return requeued, failed
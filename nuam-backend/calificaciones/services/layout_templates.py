@@ -0,0 +1,239 @@
+"""
+Layout templates for PDFs in a known fixed format.
+
+A template is a JSON file (see layouts/) describing:
+  - "huella": texts the document must contain (looked up page by page in
+    pdfium's text, no layout analysis needed) and, optionally, the size of
+    its first page in points;
+  - "columnas": every column of the data table, either by its x-range in
+    points from the left edge ("x0" / "x1", forms printed on a fixed grid)
+    or by its "titulo" in the table header: each column then starts where
+    its title does on that page, so tables sized to their content (whose
+    columns move from page to page) are read too. A column with "patron"
+    ("rut", "fecha" or a regex) must match for a line to count as a data row;
+  - "cabecera" (optional): regexes (first group) for rut_empresa,
+    rut_propietario and fecha; by default the first RUT / date of the text.
+
+Rows are read straight from pdfium: text lines are found from the page's
+text rectangles and every cell is the text inside its column's box on that
+line, so neither pdfplumber nor the row heuristics run. Adding a format is
+dropping a JSON file in layouts/ (or in a directory listed in
+PDF_LAYOUT_DIRS).
+"""
+import glob
+import hashlib
+import json
+import logging
+import os
+import re
+from functools import lru_cache
+from django.conf import settings
+from pypdfium2 import PdfiumError
+from .row_classifier import AMOUNT_STRIP, DATE_RE, DEFAULT_IMPUTACION, DEFAULT_TIPO, RUT_RE, TIPO_BY_CODE
+
+logger = logging.getLogger(__name__)
+
+LAYOUTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'layouts')
+PATTERNS = {"rut": RUT_RE, "fecha": DATE_RE}
+# Points of tolerance for the page size and for grouping text rectangles into lines
+SIZE_TOLERANCE = 2
+LINE_TOLERANCE = 3
+# Points a column starts before its title (cell padding)
+TITLE_MARGIN = 2
+
+
+class LayoutTemplate:
+    def __init__(self, spec, origen=None):
+        self.nombre = spec["nombre"]
+        self.origen = origen
+        self.spec = spec
+        huella = spec.get("huella", {})
+        self.textos = huella.get("textos", [])
+        self.tamano_pagina = huella.get("tamano_pagina")
+        self.cabecera = {campo: re.compile(patron) for campo, patron in spec.get("cabecera", {}).items()}
+        self.columnas = spec["columnas"]
+        self.por_titulo = any("titulo" in col for col in self.columnas)
+        self.cajas = None if self.por_titulo else [(col["x0"], col["x1"]) for col in self.columnas]
+        self.patrones = [
+            (n, PATTERNS.get(col["patron"]) or re.compile(col["patron"]))
+            for n, col in enumerate(self.columnas) if col.get("patron")
+        ]
+        if not self.textos or not self.patrones:
+            raise ValueError(f"Plantilla {self.nombre}: se requieren huella.textos y al menos una columna con patron")
+        if self.por_titulo and not all(col.get("titulo") for col in self.columnas):
+            raise ValueError(f"Plantilla {self.nombre}: si una columna usa titulo, todas deben tenerlo")
+
+    def __repr__(self):
+        return f"<LayoutTemplate {self.nombre}>"
+
+    def matches(self, parser):
+        if self.tamano_pagina:
+            width, height = parser.pdfium_document()[0].get_size()
+            if (abs(width - self.tamano_pagina[0]) > SIZE_TOLERANCE
+                    or abs(height - self.tamano_pagina[1]) > SIZE_TOLERANCE):
+                return False
+        # Cover / instruction pages may come first: stop at the page where the last text shows up
+        pending = set(self.textos)
+        for index in range(parser.page_count):
+            text = parser.fast_text(index)
+            pending = {t for t in pending if t not in text}
+            if not pending:
+                return True
+        return False
+
+    def header(self, parser):
+        text = "".join(parser.fast_text(i) + "\n" for i in range(parser.page_count))
+        data = {
+            "rut_empresa": parser._extract_rut(text, "empresa"),
+            "rut_propietario": None,
+            "fecha": parser._extract_date(text),
+        }
+        for campo, patron in self.cabecera.items():
+            match = patron.search(text)
+            if match:
+                data[campo] = match.group(1)
+        return data
+
+    def page_rows(self, parser, index, fecha):
+        """Calificaciones of page `index`; rows without a date take `fecha`."""
+        page = parser.pdfium_document()[index]
+        textpage = page.get_textpage()
+        try:
+            boxes = self._boxes(textpage, page.get_width())
+            if boxes is None:
+                # No table header on this page (cover, instructions)
+                return []
+            rows = []
+            for bottom, top in _lines(textpage):
+                cells = [textpage.get_text_bounded(x0, bottom, x1, top).strip() for x0, x1 in boxes]
+                if all(patron.search(cells[n]) for n, patron in self.patrones):
+                    rows.append(self._row(cells, fecha))
+            return rows
+        finally:
+            textpage.close()
+            page.close()
+
+    def _boxes(self, textpage, width):
+        """(x0, x1) of every column: the fixed ones, or those given by the titles' line on this page."""
+        if not self.por_titulo:
+            return self.cajas
+        found = [_occurrences(textpage, col["titulo"]) for col in self.columnas]
+        for left, center in found[0]:
+            lefts = [left]
+            for occurrences in found[1:]:
+                same_line = [x for x, c in occurrences if abs(c - center) <= LINE_TOLERANCE]
+                if not same_line:
+                    break
+                lefts.append(same_line[0])
+            else:
+                edges = [x - TITLE_MARGIN for x in lefts] + [width]
+                return list(zip(edges, edges[1:]))
+        return None
+
+    def _row(self, cells, fecha):
+        values = {}
+        imputacion = None
+        for col, cell in zip(self.columnas, cells):
+            if col["campo"] == "imputacion" and "valor" in col:
+                # One amount column per imputación: the first non-zero one names it
+                if imputacion is None and _amount(cell):
+                    imputacion = col["valor"]
+            else:
+                values[col["campo"]] = cell
+
+        code = values.get("codigo", "").upper()
+        if values.get("tipo"):
+            tipo = values["tipo"].lower()
+        else:
+            tipo = TIPO_BY_CODE.get(code, DEFAULT_TIPO)
+        return {
+            "fecha": values.get("fecha") or fecha,
+            "rut_propietario": values.get("rut_propietario") or None,
+            "nombre_propietario": values.get("nombre_propietario") or None,
+            "tipo": tipo,
+            "monto": _amount(values.get("monto", "")),
+            "imputacion": code or imputacion or values.get("imputacion") or DEFAULT_IMPUTACION,
+            "original_line": " | ".join(cells),
+        }
+
+
+def _amount(cell):
+    digits = cell.translate(AMOUNT_STRIP)
+    return int(digits) if digits.isdigit() else 0
+
+
+def _occurrences(textpage, text):
+    """(left, vertical center) of every occurrence of `text` on the page."""
+    searcher = textpage.search(text, match_case=True)
+    try:
+        found = []
+        hit = searcher.get_next()
+        while hit is not None:
+            left, bottom, _, top = textpage.get_charbox(hit[0])
+            found.append((left, (bottom + top) / 2))
+            hit = searcher.get_next()
+        return found
+    finally:
+        searcher.close()
+
+
+def _lines(textpage):
+    """(bottom, top) bands of the page's text lines, top to bottom, from pdfium's text rectangles."""
+    rects = [textpage.get_rect(i) for i in range(textpage.count_rects())]
+    rects.sort(key=lambda r: -(r[1] + r[3]))
+    lines = []
+    for _, bottom, _, top in rects:
+        center = (bottom + top) / 2
+        if lines and abs(lines[-1][2] - center) <= LINE_TOLERANCE:
+            line = lines[-1]
+            line[0], line[1] = min(line[0], bottom), max(line[1], top)
+        else:
+            lines.append([bottom, top, center])
+    return [(bottom - 1, top + 1) for bottom, top, _ in lines]
+
+
+@lru_cache(maxsize=None)
+def _load(dirs):
+    templates = []
+    for directory in dirs:
+        for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    templates.append(LayoutTemplate(json.load(f), origen=path))
+            except (OSError, ValueError, KeyError, re.error) as e:
+                # A broken template must not break every upload: it is skipped
+                logger.error("Plantilla PDF inválida %s: %s", path, e)
+    return templates
+
+
+def registry():
+    """Every template: the bundled ones, then those in PDF_LAYOUT_DIRS."""
+    return _load((LAYOUTS_DIR, *getattr(settings, 'PDF_LAYOUT_DIRS', [])))
+
+
+@lru_cache(maxsize=None)
+def _fingerprint(enabled, dirs):
+    specs = [t.spec for t in _load((LAYOUTS_DIR, *dirs))] if enabled else []
+    encoded = json.dumps([enabled, dirs, specs], sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(encoded.encode()).hexdigest()[:8]
+
+
+def fingerprint():
+    """Short hash of PDF_LAYOUT_TEMPLATES, PDF_LAYOUT_DIRS and every loaded template: parse output depends on them."""
+    return _fingerprint(
+        bool(getattr(settings, 'PDF_LAYOUT_TEMPLATES', True)), tuple(getattr(settings, 'PDF_LAYOUT_DIRS', [])),
+    )
+
+
+def match(parser):
+    """The first template whose fingerprint matches the document, or None (generic parsing)."""
+    if not getattr(settings, 'PDF_LAYOUT_TEMPLATES', True):
+        return None
+    try:
+        for template in registry():
+            if template.matches(parser):
+                return template
+    except (PdfiumError, OSError, IndexError) as e:
+        # Unreadable for pdfium (or no pages): pdfplumber's generic path decides
+        logger.warning("Sin detección de plantilla para %s: %s", parser.file_path, e)
+    return None
@@ -0,0 +1,230 @@
+"""
+Persistent cache of PDFParser.parse_data results.
+
+parse_data is pure given the file bytes, so results are stored in the
+`resultados_parseo` table keyed by (sha256, version()): PARSER_VERSION, the
+text engine and a hash of the layout templates in use (their contents,
+PDF_LAYOUT_DIRS and PDF_LAYOUT_TEMPLATES). Entries of another version are
+never returned. When the stored JSON exceeds
+PARSE_CACHE_MAX_BYTES, stale-version entries and then the least recently
+used ones are evicted. The stored size is a running "bytes" counter, so a
+put only sums the table when that counter goes over the limit (evict()
+then resets it to the exact total).
+
+Hit/miss counters are rows of `contadores_parseo` (ContadorParseo), so
+every process adds to the same ones whatever cache backend is configured.
+They, and each entry's aciertos / usado_en, are buffered per process and
+written every PARSE_CACHE_FLUSH_EVERY lookups or PARSE_CACHE_FLUSH_SECONDS
+(and before stats() / evict()): counts are approximate by what a process
+had not flushed yet, and the LRU order by as much.
+"""
+import json
+import threading
+import time
+from collections import Counter
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+from calificaciones.models import ContadorParseo, ResultadoParseo
+from calificaciones.utils import hash_path
+from . import layout_templates, parser_sandbox
+from .pdf_parser import PARSER_VERSION
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def version():
+    return f"{PARSER_VERSION}-{getattr(settings, 'PDF_TEXT_ENGINE', 'pdfplumber')}-{layout_templates.fingerprint()}"
+
+
+def enabled():
+    return getattr(settings, 'PARSE_CACHE_ENABLED', True)
+
+
+def _incr(counter, n=1):
+    if ContadorParseo.objects.filter(nombre=counter).update(valor=F('valor') + n):
+        return
+    try:
+        with transaction.atomic():
+            ContadorParseo.objects.create(nombre=counter, valor=n)
+    except IntegrityError:
+        # Created by another process in the meantime
+        ContadorParseo.objects.filter(nombre=counter).update(valor=F('valor') + n)
+
+
+class _Pending:
+    """Lookups of this process not written yet: hits/misses and aciertos per entry id."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.counters, self.aciertos, self.since = Counter(), Counter(), time.monotonic()
+
+    def add(self, counter, entry_id=None):
+        with self.lock:
+            self.counters[counter] += 1
+            if entry_id is not None:
+                self.aciertos[entry_id] += 1
+            return (sum(self.counters.values()) >= getattr(settings, 'PARSE_CACHE_FLUSH_EVERY', 50)
+                    or time.monotonic() - self.since >= getattr(settings, 'PARSE_CACHE_FLUSH_SECONDS', 30))
+
+    def take(self):
+        with self.lock:
+            counters, aciertos = self.counters, self.aciertos
+            self.reset()
+        return counters, aciertos
+
+
+_pending = _Pending()
+
+
+def flush():
+    """Writes this process's buffered counters: one UPDATE per counter and per distinct aciertos increment."""
+    counters, aciertos = _pending.take()
+    for counter, n in sorted(counters.items()):
+        _incr(counter, n)
+    by_increment = {}
+    for pk, n in aciertos.items():
+        by_increment.setdefault(n, []).append(pk)
+    now = timezone.now()
+    for n, pks in sorted(by_increment.items()):
+        ResultadoParseo.objects.filter(pk__in=sorted(pks)).update(aciertos=F('aciertos') + n, usado_en=now)
+
+
+def _count(counter, entry_id=None):
+    if _pending.add(counter, entry_id):
+        flush()
+
+
+def get(sha256):
+    """Cached parse_data output for these bytes and the current parser version, or None."""
+    entry = ResultadoParseo.objects.filter(sha256=sha256, version=version()).only('id', 'datos').first()
+    if entry is None:
+        _count("misses")
+        return None
+    _count("hits", entry.pk)
+    return entry.datos
+
+
+def put(sha256, datos):
+    tamano = len(json.dumps(datos, default=str))
+    try:
+        _, created = ResultadoParseo.objects.update_or_create(
+            sha256=sha256, version=version(),
+            defaults={"datos": datos, "tamano": tamano, "usado_en": timezone.now()},
+        )
+    except IntegrityError:
+        return  # same document stored concurrently by another process
+    if created:
+        _incr("bytes", tamano)
+    # A replaced entry is not subtracted: at worst the counter runs high and evict() recounts early
+    stored = ContadorParseo.objects.filter(nombre="bytes").values_list('valor', flat=True).first() or 0
+    if stored > getattr(settings, 'PARSE_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES):
+        evict()
+
+
+def evict(max_bytes=None):
+    """
+    Drops stale-version entries, then least recently used ones, until the
+    cache fits, and resets the "bytes" counter to what is left. Returns rows deleted.
+    """
+    max_bytes = max_bytes if max_bytes is not None else getattr(settings, 'PARSE_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)
+    flush()  # LRU order needs this process's usado_en
+    total = ResultadoParseo.objects.aggregate(total=Sum('tamano'))['total'] or 0
+    if total <= max_bytes:
+        _set_bytes(total)
+        return 0
+
+    deleted = 0
+    stale = ResultadoParseo.objects.exclude(version=version())
+    freed = stale.aggregate(total=Sum('tamano'))['total'] or 0
+    if freed:
+        deleted += stale.delete()[0]
+        total -= freed
+
+    ids = []
+    for pk, tamano in ResultadoParseo.objects.order_by('usado_en').values_list('id', 'tamano').iterator():
+        if total <= max_bytes:
+            break
+        ids.append(pk)
+        total -= tamano
+    if ids:
+        deleted += ResultadoParseo.objects.filter(id__in=ids).delete()[0]
+    _set_bytes(total)
+    return deleted
+
+
+def _set_bytes(total):
+    # Puts of other processes between the aggregate and here are lost: the next evict() recounts them
+    if not ContadorParseo.objects.filter(nombre="bytes").update(valor=total):
+        try:
+            with transaction.atomic():
+                ContadorParseo.objects.create(nombre="bytes", valor=total)
+        except IntegrityError:
+            ContadorParseo.objects.filter(nombre="bytes").update(valor=total)
+
+
+def parse_pdf(path, sha256=None, **parser_kwargs):
+    """
+    PDFParser(path).parse_data() (in the parser sandbox), served from the
+    cache when these bytes were already parsed.
+    """
+    if not enabled():
+        return parser_sandbox.parse(path, **parser_kwargs)
+    sha256 = sha256 or hash_path(path)
+    datos = get(sha256)
+    if datos is None:
+        datos = parser_sandbox.parse(path, **parser_kwargs)
+        put(sha256, datos)
+    return datos
+
+
+def iter_parse_pdf(path, sha256=None):
+    """
+    Streaming parse_pdf: yields PDFParser.iter_parse()'s header and then one
+    list of calificaciones per page (a single list on a cache hit). The full
+    result is stored in the cache once the last page has been yielded.
+    """
+    sha256 = sha256 or hash_path(path)
+    datos = get(sha256) if enabled() else None
+    if datos is not None:
+        yield {k: v for k, v in datos.items() if k != "calificaciones"}
+        yield datos.get("calificaciones", [])
+        return
+
+    parts = parser_sandbox.iter_parse(path)
+    datos = {**next(parts), "calificaciones": []}
+    yield {k: v for k, v in datos.items() if k != "calificaciones"}
+    for calificaciones in parts:
+        datos["calificaciones"].extend(calificaciones)
+        yield calificaciones
+    if enabled():
+        put(sha256, datos)
+
+
+def stats():
+    flush()
+    totals = ResultadoParseo.objects.aggregate(bytes=Sum('tamano'), aciertos=Sum('aciertos'))
+    counters = dict(ContadorParseo.objects.values_list('nombre', 'valor'))
+    hits, misses = counters.get("hits", 0), counters.get("misses", 0)
+    return {
+        "version": version(),
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / (hits + misses), 4) if hits + misses else None,
+        "entradas": ResultadoParseo.objects.count(),
+        "entradas_obsoletas": ResultadoParseo.objects.exclude(version=version()).count(),
+        "bytes": totals["bytes"] or 0,
+        "max_bytes": getattr(settings, 'PARSE_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES),
+        "aciertos_almacenados": totals["aciertos"] or 0,
+    }
+
+
+def clear():
+    _pending.take()
+    deleted = ResultadoParseo.objects.all().delete()[0]
+    ContadorParseo.objects.all().delete()
+    return deleted
@@ -0,0 +1,282 @@
+"""
+PDFParser in sandboxed worker processes.
+
+A malformed or huge PDF can keep pdfplumber busy for minutes and grow its
+memory without bound. Uploads therefore parse in a small pool of worker
+processes: every document gets PDF_SANDBOX_TIMEOUT seconds of wall-clock
+time, every worker runs under an RLIMIT_AS cap of PDF_SANDBOX_MEMORY_MB, and
+a worker that times out, runs out of memory or dies is killed and replaced
+on the next request. The caller gets a SandboxError whose message (and
+`criterio`) end up in the usual error report (pdf_error_context).
+
+Inside a worker, documents of PDF_PARSER_PARALLEL_MIN_PAGES pages or more
+are split across PDF_PARSER_WORKERS page-range processes, as outside the
+sandbox (set PDF_PARSER_WORKERS = 1 to keep one CPU per document). Those
+processes are forked from the worker, so each runs under the same RLIMIT_AS
+cap, and they share the worker's process group: a timeout or crash kills the
+whole group. Workers are started through a forkserver where available (never
+forked from a threaded server process), so they set up Django on their own.
+With PDF_SANDBOX_ENABLED = False parsing runs in the calling process.
+"""
+import atexit
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from django.conf import settings
+
+try:
+    import resource
+except ImportError:  # not available on Windows: no memory cap there
+    resource = None
+
+
+class SandboxError(Exception):
+    """A document the sandbox could not parse; `criterio` goes to the error report."""
+    criterio = "Error de Procesamiento"
+
+
+class ParseFailed(SandboxError):
+    """PDFParser raised inside the worker (same message as in-process)."""
+
+
+class ParseTimeout(SandboxError):
+    criterio = "Tiempo máximo de análisis excedido"
+
+
+class ParseMemoryError(SandboxError):
+    criterio = "Límite de memoria del análisis excedido"
+
+
+class ParserCrashed(SandboxError):
+    criterio = "Falla del proceso de análisis"
+
+
+def enabled():
+    return getattr(settings, 'PDF_SANDBOX_ENABLED', True)
+
+
+def _init_worker(memory_mb):
+    # Needed under the spawn/forkserver start methods; a no-op for fork
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+    # SIGINT/SIGTERM are the server's business: the parent kills workers itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Own process group, shared with the page-range processes of parallel parsing
+    if hasattr(os, "setpgrp"):
+        os.setpgrp()
+    # Daemonic processes may not start children; the group kill (see _Worker.stop) cleans them up instead
+    multiprocessing.current_process().daemon = False
+    if memory_mb and resource is not None:
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _serve(conn, memory_mb):
+    """Worker loop: (mode, path, kwargs) tasks in, ("ok" | "parte" | "fin" | "error" | "memoria", value) out."""
+    _init_worker(memory_mb)
+    from .pdf_parser import PDFParser
+
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        mode, path, kwargs = task
+        try:
+            parser = PDFParser(path, **kwargs)
+            if mode == "parse":
+                conn.send(("ok", parser.parse_data()))
+            else:
+                for part in parser.iter_parse():
+                    conn.send(("parte", part))
+                conn.send(("fin", None))
+        except MemoryError:
+            # The heap may be in no state to serve another document: report and exit
+            conn.send(("memoria", None))
+            return
+        except Exception as e:
+            conn.send(("error", str(e)))
+
+
+class _Worker:
+    def __init__(self, context, memory_mb):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=_serve, args=(child, memory_mb), name="pdf-sandbox", daemon=True)
+        self.process.start()
+        child.close()
+        self.tasks = 0
+
+    def exit_reason(self):
+        self.process.join(timeout=5)
+        code = self.process.exitcode
+        if code is not None and code < 0:
+            try:
+                return f"señal {signal.Signals(-code).name}"
+            except ValueError:
+                return f"señal {-code}"
+        return f"código de salida {code}"
+
+    def stop(self):
+        # The whole group: page-range processes must not outlive a killed worker
+        if hasattr(os, "killpg"):
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                pass
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class SandboxPool:
+    """Up to `size` workers, started on demand and handed to one document at a time."""
+
+    def __init__(self, size, memory_mb=0, max_tasks=0, start_method=None):
+        self.size = size
+        self.memory_mb = memory_mb
+        self.max_tasks = max_tasks
+        if start_method is None and "forkserver" in multiprocessing.get_all_start_methods():
+            start_method = "forkserver"
+        self.context = multiprocessing.get_context(start_method)
+        self.pid = os.getpid()
+        self._idle = []
+        self._count = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def _acquire(self):
+        with self._cond:
+            while True:
+                while self._idle:
+                    worker = self._idle.pop()
+                    if worker.process.is_alive():
+                        return worker
+                    # Died while idle (e.g. the OOM killer): replaced below
+                    worker.stop()
+                    self._count -= 1
+                if self._count < self.size:
+                    break
+                self._cond.wait()
+            self._count += 1
+        try:
+            return _Worker(self.context, self.memory_mb)
+        except Exception:
+            with self._cond:
+                self._count -= 1
+                self._cond.notify()
+            raise
+
+    def _release(self, worker, reusable):
+        worker.tasks += 1
+        if not reusable or self._closed or (self.max_tasks and worker.tasks >= self.max_tasks):
+            worker.stop()
+            with self._cond:
+                self._count -= 1
+                self._cond.notify()
+            return
+        with self._cond:
+            self._idle.append(worker)
+            self._cond.notify()
+
+    def run(self, mode, path, kwargs, timeout=None):
+        """
+        Yields the worker's results for one document: parse_data's dict
+        ("parse"), or iter_parse's parts ("iter"). The timeout covers the
+        whole document. Closing the generator early kills the worker.
+        """
+        worker = self._acquire()
+        reusable = False
+        deadline = time.monotonic() + timeout if timeout else None
+        try:
+            worker.conn.send((mode, path, kwargs))
+            while True:
+                remaining = max(deadline - time.monotonic(), 0) if deadline else None
+                if not worker.conn.poll(remaining):
+                    raise ParseTimeout(f"El análisis del PDF superó el tiempo máximo de {timeout} s")
+                try:
+                    kind, value = worker.conn.recv()
+                except (EOFError, OSError):
+                    raise ParserCrashed(f"El proceso de análisis del PDF terminó inesperadamente ({worker.exit_reason()})")
+                if kind == "parte":
+                    yield value
+                    continue
+                if kind == "memoria":
+                    raise ParseMemoryError(f"El análisis del PDF superó el límite de memoria ({self.memory_mb} MB)")
+                reusable = True
+                if kind == "error":
+                    raise ParseFailed(value)
+                if kind == "ok":
+                    yield value
+                return
+        finally:
+            self._release(worker, reusable)
+
+    def parse(self, path, timeout=None, **parser_kwargs):
+        """parse_data of one document; consumed to the end so the worker goes back to the pool right away."""
+        return list(self.run("parse", path, parser_kwargs, timeout))[0]
+
+    def shutdown(self):
+        with self._cond:
+            # Workers busy right now are stopped when released
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._count -= len(idle)
+        for worker in idle:
+            worker.stop()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def pool():
+    """The process-wide pool, rebuilt after a fork (preloading servers) or a settings change."""
+    global _pool
+    size = getattr(settings, 'PDF_SANDBOX_WORKERS', 0) or os.cpu_count() or 1
+    memory_mb = getattr(settings, 'PDF_SANDBOX_MEMORY_MB', 1024)
+    max_tasks = getattr(settings, 'PDF_SANDBOX_MAX_TASKS', 200)
+    with _pool_lock:
+        current = _pool
+        if (current is None or current.pid != os.getpid()
+                or (current.size, current.memory_mb, current.max_tasks) != (size, memory_mb, max_tasks)):
+            if current is not None and current.pid == os.getpid():
+                current.shutdown()
+            _pool = SandboxPool(size, memory_mb, max_tasks)
+        return _pool
+
+
+def shutdown():
+    with _pool_lock:
+        if _pool is not None and _pool.pid == os.getpid():
+            _pool.shutdown()
+
+
+atexit.register(shutdown)
+
+
+def _timeout():
+    return getattr(settings, 'PDF_SANDBOX_TIMEOUT', 120)
+
+
+def parse(path, **parser_kwargs):
+    """PDFParser(path, **parser_kwargs).parse_data(), run in the sandbox."""
+    if not enabled():
+        from .pdf_parser import PDFParser
+        return PDFParser(path, **parser_kwargs).parse_data()
+    return pool().parse(path, _timeout(), **parser_kwargs)
+
+
+def iter_parse(path, **parser_kwargs):
+    """PDFParser(path, **parser_kwargs).iter_parse(), run in the sandbox."""
+    if not enabled():
+        from .pdf_parser import PDFParser
+        yield from PDFParser(path, **parser_kwargs).iter_parse()
+        return
+    yield from pool().run("iter", path, parser_kwargs, _timeout())
@@ -1,161 +1,304 @@
+import os
 import pdfplumber
+import pypdfium2 as pdfium
 import re
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
+from django.conf import settings
+from . import layout_templates
+from .row_classifier import classify_row, is_rut
+
+# Bump whenever parse_data output can change (parser or row_classifier logic):
+# cached results of older versions are then ignored and evicted first.
+PARSER_VERSION = "5"
+
+# Text engines (PDF_TEXT_ENGINE):
+#   pdfplumber - text and tables from pdfplumber's layout analysis
+#   hybrid     - page text from pdfium (~10x faster); pdfplumber only runs
+#                extract_tables() on pages whose text holds a RUT
+TEXT_ENGINES = ("pdfplumber", "hybrid")
+
+# Document date: DD/MM/YYYY or DD-MM-YYYY
+DATE_RE = re.compile(r"\b\d{1,2}[-/]\d{1,2}[-/]\d{4}\b")
+
+
+def _parse_page_range(file_path, start, stop, engine):
+    """Worker side of the parallel mode: (text, rows) for pages [start, stop)."""
+    with PDFParser(file_path, workers=1, engine=engine) as parser:
+        return [(parser.page_text(i), parser.page_rows(i)) for i in range(start, stop)]
+
 
 class PDFParser:
-    def __init__(self, file_path):
+    """
+    Parses DJ1948 / certificate PDFs.
+
+    The document is opened once (per parse_data call, or for the whole
+    `with PDFParser(path) as parser:` block) and every page's text, tables and
+    classified rows are computed lazily and memoized, so all strategies share
+    a single layout analysis per page.
+
+    DJ1948 documents (judged by their first page) with at least
+    `parallel_min_pages` pages are split into contiguous page ranges parsed
+    by a process pool; each worker opens the file on its own and the results
+    fill the same per-page caches, so the output is identical to the serial
+    path.
+
+    Documents in a known fixed format (services/layout_templates.py) skip
+    all of the above: their cells are read from the template's column boxes.
+    When no line fits those columns the generic path runs after all.
+
+    With the "hybrid" engine the text comes from pdfium and pdfplumber is
+    only opened for the pages that can hold DJ1948 rows (see TEXT_ENGINES).
+    """
+
+    def __init__(self, file_path, workers=None, parallel_min_pages=None, engine=None):
         self.file_path = file_path
+        # Parallel mode (see _prefetch_parallel); None -> PDF_PARSER_WORKERS / PDF_PARSER_PARALLEL_MIN_PAGES
+        self.workers = workers
+        self.parallel_min_pages = parallel_min_pages
+        self.engine = engine or getattr(settings, 'PDF_TEXT_ENGINE', 'pdfplumber')
+        if self.engine not in TEXT_ENGINES:
+            raise ValueError(f"Motor de texto PDF desconocido: {self.engine} (opciones: {', '.join(TEXT_ENGINES)})")
+        self._pdf = None
+        self._pdfium = None
+        self._sessions = 0
+        self._page_text = {}
+        self._page_rows = {}
+        self._fast_text = {}
+        self._layout = False  # not looked up yet
+
+    def __enter__(self):
+        self._sessions += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._sessions -= 1
+        if not self._sessions:
+            self.close()
+
+    def open(self):
+        """The pdfplumber document, opened on first use."""
+        if self._pdf is None:
+            self._pdf = pdfplumber.open(self.file_path)
+        return self._pdf
+
+    def pdfium_document(self):
+        """The pdfium document, opened on first use (hybrid text, layout templates)."""
+        if self._pdfium is None:
+            self._pdfium = pdfium.PdfDocument(self.file_path)
+        return self._pdfium
+
+    def _text_document(self):
+        if self.engine == "pdfplumber":
+            return self.open().pages
+        return self.pdfium_document()
+
+    def close(self):
+        if self._pdf is not None:
+            self._pdf.close()
+            self._pdf = None
+        if self._pdfium is not None:
+            self._pdfium.close()
+            self._pdfium = None
+
+    @property
+    def page_count(self):
+        return len(self._text_document())
+
+    def page_text(self, index):
+        if index not in self._page_text:
+            if self.engine == "pdfplumber":
+                text = self.open().pages[index].extract_text() or ""
+            else:
+                text = self._pdfium_text(index)
+            self._page_text[index] = text
+        return self._page_text[index]
+
+    def fast_text(self, index):
+        """Page text from pdfium whatever the engine (cheap: for fingerprints and headers)."""
+        if self.engine == "hybrid":
+            return self.page_text(index)
+        if index not in self._fast_text:
+            self._fast_text[index] = self._pdfium_text(index)
+        return self._fast_text[index]
+
+    def _pdfium_text(self, index):
+        page = self.pdfium_document()[index]
+        textpage = page.get_textpage()
+        try:
+            text = textpage.get_text_bounded()
+        finally:
+            textpage.close()
+            page.close()
+        # Same line breaks as pdfplumber
+        return text.replace("\r\n", "\n").replace("\r", "\n")
+
+    def page_rows(self, index):
+        """Classified DJ1948 rows of a page (fecha None when the row has no date of its own)."""
+        if index not in self._page_rows:
+            rows = []
+            # Rows need a RUT cell: with pdfium text, pages without any RUT skip pdfplumber entirely
+            if self.engine == "pdfplumber" or is_rut(self.page_text(index)):
+                tables = self.open().pages[index].extract_tables()
+            else:
+                tables = []
+            for table in tables:
+                for row in table:
+                    # Clean row data (remove None and empty strings)
+                    cleaned_row = [str(cell).strip() if cell else "" for cell in row]
+                    calificacion = classify_row(cleaned_row)
+                    if calificacion:
+                        rows.append(calificacion)
+            self._page_rows[index] = rows
+        return self._page_rows[index]
+
+    @contextmanager
+    def _document(self):
+        """Keeps the document(s) open for the block; the outermost block (or `with parser:`) closes them."""
+        with self:
+            yield self
 
     def extract_text(self):
         """Extracts text from the PDF file."""
-        text = ""
-        with pdfplumber.open(self.file_path) as pdf:
-            for page in pdf.pages:
-                text += page.extract_text() + "\n"
-        return text
+        with self._document():
+            return "".join(self.page_text(i) + "\n" for i in range(self.page_count))
+
+    def layout(self):
+        """The layout template matching this document (services/layout_templates.py), or None."""
+        if self._layout is False:
+            with self._document():
+                self._layout = layout_templates.match(self)
+        return self._layout
 
     def parse_data(self):
         """Parses the extracted text to find relevant data."""
-        text = self.extract_text()
-        
-        # Determine strict parsing strategy based on content
-        if "1948" in text or "Retiros" in text:
-            return self._parse_dj1948(text)
-        
-        # Legacy/Generic Parsing
-        data = {
+        with self._document():
+            # Known fixed format: cells are read from the template's column boxes
+            template = self.layout()
+            if template is not None:
+                data = {**template.header(self), "calificaciones": []}
+                for index in range(self.page_count):
+                    data["calificaciones"].extend(template.page_rows(self, index, data["fecha"]))
+                if data["calificaciones"]:
+                    return data
+                # Fingerprint matched but no line fits its columns (e.g. another version of the form)
+
+            # Only documents that look like a DJ1948 from their first page are worth the process pool
+            if self._parallel_workers() > 1 and self._is_dj1948(self.page_text(0)):
+                self._prefetch_parallel()
+            text = self.extract_text()
+
+            # Determine strict parsing strategy based on content
+            if self._is_dj1948(text):
+                return self._parse_dj1948(text)
+
+            # Legacy/Generic Parsing
+            return self._parse_generic(text)
+
+    def iter_parse(self):
+        """
+        Streaming version of parse_data: yields the header (parse_data's dict
+        without "calificaciones"), then the calificaciones of each page as a
+        list as soon as that page is parsed. Always serial.
+
+        Header fields are the first RUT / date of the document, so only the
+        pages up to the first ones holding them (and the DJ1948 marker) are
+        read before the header; documents that are not DJ1948 are read whole.
+        """
+        with self._document():
+            template = self.layout()
+            if template is not None:
+                header = template.header(self)
+                pages = (template.page_rows(self, index, header["fecha"]) for index in range(self.page_count))
+                first = next((rows for rows in pages if rows), None)
+                if first is not None:
+                    yield header
+                    yield first
+                    yield from pages
+                    return
+                # No row fits the template's columns: generic parsing, as in parse_data
+
+            text = ""
+            scanned = 0
+            while scanned < self.page_count and not self._header_complete(text):
+                text += self.page_text(scanned) + "\n"
+                scanned += 1
+
+            if not self._is_dj1948(text):
+                data = self._parse_generic(text)
+                calificaciones = data.pop("calificaciones")
+                yield data
+                yield calificaciones
+                return
+
+            header = self._dj1948_header(text)
+            yield header
+            yield from self._iter_dj1948(header["fecha"])
+
+    @staticmethod
+    def _is_dj1948(text):
+        return "1948" in text or "Retiros" in text
+
+    def _header_complete(self, text):
+        return self._is_dj1948(text) and is_rut(text) and DATE_RE.search(text) is not None
+
+    def _parse_generic(self, text):
+        return {
             "rut_empresa": self._extract_rut(text, "empresa"),
             "rut_propietario": self._extract_rut(text, "propietario"),
             "fecha": self._extract_date(text),
             "calificaciones": self._extract_calificaciones(text)
         }
-        return data
 
-    def _parse_dj1948(self, text):
-        """Specialized parser for DJ1948 Structure."""
-        data = {
+    def _parallel_workers(self):
+        workers = self.workers
+        if workers is None:
+            workers = getattr(settings, 'PDF_PARSER_WORKERS', 0) or os.cpu_count() or 1
+        min_pages = self.parallel_min_pages
+        if min_pages is None:
+            min_pages = getattr(settings, 'PDF_PARSER_PARALLEL_MIN_PAGES', 50)
+        pages = self.page_count
+        if workers <= 1 or pages < max(min_pages, 2):
+            return 1
+        return min(workers, pages)
+
+    def _prefetch_parallel(self):
+        """Fills the page caches (text + classified rows) from a process pool, one page range per worker."""
+        pages = self.page_count
+        workers = self._parallel_workers()
+        bounds = [pages * n // workers for n in range(workers + 1)]
+        starts, stops = bounds[:-1], bounds[1:]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for start, results in zip(starts, pool.map(
+                _parse_page_range, [self.file_path] * workers, starts, stops, [self.engine] * workers
+            )):
+                for offset, (text, rows) in enumerate(results):
+                    self._page_text[start + offset] = text
+                    self._page_rows[start + offset] = rows
+
+    def _dj1948_header(self, text):
+        return {
             "rut_empresa": self._extract_rut(text, "empresa"),
             "rut_propietario": None, # Will be extracted per row
             "fecha": self._extract_date(text),
-            "calificaciones": []
         }
 
-        # Use pdfplumber table extraction for better accuracy
-        with pdfplumber.open(self.file_path) as pdf:
-            for page in pdf.pages:
-                tables = page.extract_tables()
-                for table in tables:
-                    for row in table:
-                        # Clean row data (remove None and empty strings)
-                        cleaned_row = [str(cell).strip() if cell else "" for cell in row]
-                        
-                        # Heuristic: Check if row looks like a data row (Pattern: RUT, Name, Code, Amount)
-                        # 1. RUT Search: Scan ALL columns, not just first 2
-                        rut_candidate = next((cell for cell in cleaned_row if self._is_valid_rut(cell)), None)
-                        
-                        if rut_candidate:
-                            # 2. Type/Code Mapping
-                            tipo_mapping = {
-                                "DIV": "dividendo",
-                                "RET": "retiro",
-                                "REM": "remesa",
-                                "RAI": "retiro", # Default fallback
-                                "REX": "retiro"
-                            }
-                            found_code = None
-                            found_tipo = "retiro" # Default
-                            found_imputacion = "SIN CLASIFICAR"
-                            for cell in cleaned_row:
-                                upper_cell = cell.upper()
-                                # Handle cases where code might be joined with other text or strictly exact
-                                # For safety, look for exact match in split words or the cell itself
-                                if upper_cell in tipo_mapping or any(word in tipo_mapping for word in upper_cell.split()):
-                                    # Identify which code it is
-                                    code = upper_cell if upper_cell in tipo_mapping else next((w for w in upper_cell.split() if w in tipo_mapping), "RAI")
-                                    found_code = code
-                                    found_tipo = tipo_mapping.get(code, "retiro")
-                                    found_imputacion = code
-                                    break
-                            
-                            # 3. Amount Extraction: Valid numbers, pick largest (heuristic for 'Monto Actualizado')
-                            found_monto = 0
-                            numeric_values = []
-                            for cell in cleaned_row:
-                                # Remove common currency formatting (dots, commas, symbols)
-                                clean_val = cell.replace("$", "").replace(".", "").replace(",", "").replace(" ", "").strip()
-                                # Ensure it's a number and not a date part (simple check)
-                                if clean_val.isdigit():
-                                    val = int(clean_val)
-                                    # Heuristic: Amounts in DJ1948 are usually significant. 
-                                    # Ignore unlikely small integers that could be flags/counts unless they are the ONLY number.
-                                    # Also ignore if it matches the RUT digits (unlikely but possible cleanup artifact).
-                                    numeric_values.append(val)
-                            
-                            if numeric_values:
-                                found_monto = max(numeric_values)
-
-                            # 4. Date Extraction
-                            row_date = data["fecha"] # Fallback to document date
-                            date_in_row = next((cell for cell in cleaned_row if re.match(r"\d{1,2}[-/]\d{1,2}[-/]\d{4}", cell)), None)
-                            if date_in_row:
-                                row_date = date_in_row
-
-                            # 5. Name Extraction (Heuristic)
-                            # The name is usually a string (not a date, not a number, not the RUT).
-                            # We pick the longest remaining string that DOESN'T look like a transaction type.
-                            found_nombre = None
-                            potential_names = []
-                            KEYWORDS_TO_IGNORE = ["RETIRO", "REMESA", "DIVIDENDO", "DEVOLUCION", "CAPITAL", "RAI", "DDAN", "REX", "RAP", "SAC", "ISFUT"]
-                            
-                            for cell in cleaned_row:
-                                # Clean potential name
-                                clean_cell = cell.strip()
-                                print(f"DEBUG CELL: '{clean_cell}'")
-                                
-                                # Skip if it looks like the RUT we just found or another RUT
-                                if self._is_valid_rut(clean_cell) or clean_cell == rut_candidate:
-                                    print("  -> Skipped (RUT)")
-                                    continue
-                                
-                                # Skip if it's a date
-                                if re.match(r"\d{1,2}[-/]\d{1,2}[-/]\d{4}", clean_cell):
-                                    print("  -> Skipped (Date)")
-                                    continue
-                                
-                                # Skip if it's purely numeric/currency
-                                if re.match(r"^[\d\.,\$]+$", clean_cell.replace(" ", "")):
-                                    print("  -> Skipped (Numeric)")
-                                    continue
-                                    
-                                # Skip if it contains known transaction keywords (e.g. "RETIRO / RAI")
-                                if any(kw in clean_cell.upper() for kw in KEYWORDS_TO_IGNORE):
-                                    print("  -> Skipped (Keyword)")
-                                    continue
-                                    
-                                # Ideally names have letters.
-                                if re.search(r"[a-zA-Z]", clean_cell):
-                                    print("  -> Candidate!")
-                                    potential_names.append(clean_cell)
-
-                            if potential_names:
-                                # Pick the longest string as the name
-                                found_nombre = max(potential_names, key=len)
-                                print(f"DEBUG SELECTED: {found_nombre}")
-                                
-                            data["calificaciones"].append({
-                                "fecha": row_date,
-                                "rut_propietario": rut_candidate,
-                                "nombre_propietario": found_nombre,
-                                "tipo": found_tipo,
-                                "monto": found_monto,
-                                "imputacion": found_imputacion,
-                                "original_line": " | ".join(cleaned_row)
-                            })
-                            
+    def _iter_dj1948(self, fecha):
+        """Yields the calificaciones of each page; rows without a date of their own take `fecha`."""
+        # Use pdfplumber table extraction for better accuracy (same page objects as the text pass)
+        for index in range(self.page_count):
+            yield [{**row, "fecha": row["fecha"] or fecha} for row in self.page_rows(index)]
+
+    def _parse_dj1948(self, text):
+        """Specialized parser for DJ1948 Structure."""
+        data = {**self._dj1948_header(text), "calificaciones": []}
+        for rows in self._iter_dj1948(data["fecha"]):
+            data["calificaciones"].extend(rows)
         return data
 
     def _is_valid_rut(self, text):
-        return bool(re.search(r"\b\d{1,2}\.?\d{3}\.?\d{3}-[\dkK]\b", text))
+        return is_rut(text)
 
     def _extract_rut(self, text, entity_type):
         """
@@ -175,9 +318,7 @@ class PDFParser:
 
     def _extract_date(self, text):
         """Extracts the document date."""
-        # Pattern DD/MM/YYYY or DD-MM-YYYY
-        date_pattern = r"\b\d{1,2}[-/]\d{1,2}[-/]\d{4}\b"
-        dates = re.findall(date_pattern, text)
+        dates = DATE_RE.findall(text)
         if dates:
             return dates[0]
         return datetime.now().strftime("%Y-%m-%d")
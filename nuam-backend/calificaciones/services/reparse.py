@@ -0,0 +1,156 @@
+"""
+Re-parses stored DJ PDFs (ArchivoCargado.ruta) with the current parser.
+
+ArchivoCargado.metadata of a PDF upload is the parse_data result at upload
+time, so parser improvements never reach older files. ArchiveReparser walks
+the PDF uploads by id in chunks, parses each chunk in the parser sandbox
+(its own pool of `workers` processes, with the usual time and memory
+limits) and diffs the result against the stored metadata. With write=True
+changed metadata is saved back with one bulk_update per chunk.
+
+After every chunk the last id and the counters are saved to the checkpoint
+file, so an interrupted run over a large archive resumes where it stopped.
+"""
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from calificaciones.models import ArchivoCargado
+from . import parse_cache
+from .parser_sandbox import SandboxPool
+
+HEADER_FIELDS = ("rut_empresa", "rut_propietario", "fecha")
+COUNTERS = ("procesados", "cambiados", "sin_cambios", "escritos", "errores", "faltantes")
+
+
+def _row_key(row):
+    # original_line only records how the row was read: not a change of data
+    return tuple(sorted((k, str(v)) for k, v in row.items() if k != "original_line"))
+
+
+def diff(before, after):
+    """Differences between two parse_data results, or None when they hold the same data."""
+    before = before or {}
+    cabecera = {
+        campo: [before.get(campo), after.get(campo)]
+        for campo in HEADER_FIELDS if before.get(campo) != after.get(campo)
+    }
+    old_rows = Counter(_row_key(r) for r in before.get("calificaciones") or [])
+    new_rows = Counter(_row_key(r) for r in after.get("calificaciones") or [])
+    agregadas = sum((new_rows - old_rows).values())
+    eliminadas = sum((old_rows - new_rows).values())
+    if not (cabecera or agregadas or eliminadas):
+        return None
+    return {"cabecera": cabecera, "agregadas": agregadas, "eliminadas": eliminadas}
+
+
+class ArchiveReparser:
+    def __init__(self, workers=None, chunk_size=500, write=False, checkpoint=None, progress=None, report=None):
+        self.workers = workers or getattr(settings, 'PDF_SANDBOX_WORKERS', 0) or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.write = write
+        self.checkpoint = checkpoint
+        # progress(summary) after every chunk; report(archivo, diff_or_error) for every changed / failed file
+        self.progress = progress
+        self.report = report
+        self.ultimo_id = 0
+        self.totals = dict.fromkeys(COUNTERS, 0)
+
+    def queryset(self):
+        return ArchivoCargado.objects.filter(ruta__iendswith='.pdf').order_by('id')
+
+    def run(self):
+        self._load_checkpoint()
+        pending = self.queryset().filter(id__gt=self.ultimo_id)
+        total = pending.count()
+        start = time.perf_counter()
+        done = 0
+        pool = SandboxPool(
+            self.workers,
+            memory_mb=getattr(settings, 'PDF_SANDBOX_MEMORY_MB', 1024),
+            max_tasks=getattr(settings, 'PDF_SANDBOX_MAX_TASKS', 200),
+        )
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as threads:
+                while True:
+                    # Keyset pagination: constant cost per chunk however far into the table
+                    chunk = list(pending.filter(id__gt=self.ultimo_id).only('id', 'ruta', 'metadata')[:self.chunk_size])
+                    if not chunk:
+                        break
+                    results = threads.map(lambda archivo: self._parse(pool, archivo), chunk)
+                    self._apply(chunk, list(results))
+                    done += len(chunk)
+                    self.ultimo_id = chunk[-1].id
+                    self._save_checkpoint()
+                    if self.progress:
+                        elapsed = time.perf_counter() - start
+                        self.progress({
+                            **self.totals, "total": total, "avance": done, "ultimo_id": self.ultimo_id,
+                            "archivos_por_segundo": round(done / elapsed, 2) if elapsed else None,
+                        })
+        finally:
+            pool.shutdown()
+        return {
+            **self.totals,
+            "ultimo_id": self.ultimo_id,
+            "elapsed_seconds": round(time.perf_counter() - start, 3),
+        }
+
+    def _parse(self, pool, archivo):
+        if not os.path.exists(archivo.ruta):
+            return {"faltante": True}
+        try:
+            return {"data": pool.parse(archivo.ruta, timeout=getattr(settings, 'PDF_SANDBOX_TIMEOUT', 120))}
+        except Exception as e:
+            return {"error": str(e)}
+
+    def _apply(self, chunk, results):
+        changed = []
+        for archivo, result in zip(chunk, results):
+            self.totals["procesados"] += 1
+            if result.get("faltante"):
+                self.totals["faltantes"] += 1
+                self._report(archivo, {"error": f"Archivo no encontrado: {archivo.ruta}"})
+                continue
+            if "error" in result:
+                self.totals["errores"] += 1
+                self._report(archivo, result)
+                continue
+            cambios = diff(archivo.metadata, result["data"])
+            if cambios is None:
+                self.totals["sin_cambios"] += 1
+                continue
+            self.totals["cambiados"] += 1
+            self._report(archivo, cambios)
+            archivo.metadata = result["data"]
+            changed.append(archivo)
+        if self.write and changed:
+            ArchivoCargado.objects.bulk_update(changed, ["metadata"], batch_size=self.chunk_size)
+            self.totals["escritos"] += len(changed)
+
+    def _report(self, archivo, detalle):
+        if self.report:
+            self.report(archivo, detalle)
+
+    def _load_checkpoint(self):
+        if not self.checkpoint or not os.path.exists(self.checkpoint):
+            return
+        with open(self.checkpoint, encoding='utf-8') as f:
+            state = json.load(f)
+        # Progress of another parser version (or a dry run when writing now) does not count
+        if state.get("version") != parse_cache.version() or state.get("write") != self.write:
+            return
+        self.ultimo_id = state["ultimo_id"]
+        self.totals.update({k: state.get(k, 0) for k in COUNTERS})
+
+    def _save_checkpoint(self):
+        if not self.checkpoint:
+            return
+        state = {"version": parse_cache.version(), "write": self.write, "ultimo_id": self.ultimo_id, **self.totals}
+        tmp = f"{self.checkpoint}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        # Atomic: a run killed mid-write keeps the previous checkpoint
+        os.replace(tmp, self.checkpoint)
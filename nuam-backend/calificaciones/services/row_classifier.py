@@ -0,0 +1,112 @@
+"""
+DJ1948 table-row classifier.
+
+Turns one cleaned table row (list of stripped cell strings) into a
+calificacion dict in a single pass over its cells. Lookup tables and
+patterns are built once at import time; per-cell tracing goes to the
+`calificaciones.services.row_classifier` logger at DEBUG level.
+"""
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# Code found in the row -> tipo. The code itself is stored as imputacion.
+TIPO_BY_CODE = {
+    "DIV": "dividendo",
+    "RET": "retiro",
+    "REM": "remesa",
+    "RAI": "retiro", # Default fallback
+    "REX": "retiro",
+}
+DEFAULT_TIPO = "retiro"
+DEFAULT_IMPUTACION = "SIN CLASIFICAR"
+
+# Cells containing any of these are transaction descriptions, never a name
+NAME_STOPWORDS = ("RETIRO", "REMESA", "DIVIDENDO", "DEVOLUCION", "CAPITAL", "RAI", "DDAN", "REX", "RAP", "SAC", "ISFUT")
+
+RUT_RE = re.compile(r"\b\d{1,2}\.?\d{3}\.?\d{3}-[\dkK]\b")
+DATE_RE = re.compile(r"\d{1,2}[-/]\d{1,2}[-/]\d{4}")
+NUMERIC_RE = re.compile(r"^[\d\.,\$]+$")
+LETTER_RE = re.compile(r"[a-zA-Z]")
+# Currency formatting removed before reading an amount
+AMOUNT_STRIP = str.maketrans("", "", "$., ")
+
+
+def is_rut(text):
+    return RUT_RE.search(text) is not None
+
+
+def classify_row(cells):
+    """
+    Returns {"fecha", "rut_propietario", "nombre_propietario", "tipo", "monto",
+    "imputacion", "original_line"} for a data row, or None when no cell holds
+    a RUT. fecha is None when the row has no date (callers use the document date).
+
+    Heuristics:
+      - rut: first cell containing a RUT,
+      - tipo/imputacion: first cell that is, or contains a word that is, a known code,
+      - monto: largest cell that is a number once currency formatting is removed,
+      - fecha: first cell starting with a DD/MM/YYYY or DD-MM-YYYY date,
+      - nombre: longest cell with letters that is not a RUT, date, amount or keyword.
+    """
+    debug = logger.isEnabledFor(logging.DEBUG)
+    rut = None
+    code = None
+    fecha = None
+    monto = None
+    nombre = None
+
+    for cell in cells:
+        cell_is_rut = RUT_RE.search(cell) is not None
+        if cell_is_rut and rut is None:
+            rut = cell
+
+        upper = cell.upper()
+        if code is None:
+            if upper in TIPO_BY_CODE:
+                code = upper
+            else:
+                code = next((w for w in upper.split() if w in TIPO_BY_CODE), None)
+
+        amount = cell.translate(AMOUNT_STRIP).strip()
+        if amount.isdigit():
+            value = int(amount)
+            if monto is None or value > monto:
+                monto = value
+
+        is_date = DATE_RE.match(cell) is not None
+        if is_date and fecha is None:
+            fecha = cell
+
+        # Name candidates: cells with letters that are nothing else
+        if cell_is_rut:
+            reason = "RUT"
+        elif is_date:
+            reason = "Date"
+        elif NUMERIC_RE.match(cell.replace(" ", "")):
+            reason = "Numeric"
+        elif any(kw in upper for kw in NAME_STOPWORDS):
+            reason = "Keyword"
+        elif LETTER_RE.search(cell):
+            reason = None
+            if nombre is None or len(cell) > len(nombre):
+                nombre = cell
+        else:
+            reason = "No letters"
+        if debug:
+            logger.debug("cell %r -> %s", cell, f"skipped ({reason})" if reason else "name candidate")
+
+    if rut is None:
+        return None
+    if debug:
+        logger.debug("row %r -> rut=%s code=%s monto=%s nombre=%s", cells, rut, code, monto, nombre)
+    return {
+        "fecha": fecha,
+        "rut_propietario": rut,
+        "nombre_propietario": nombre,
+        "tipo": TIPO_BY_CODE[code] if code else DEFAULT_TIPO,
+        "monto": monto or 0,
+        "imputacion": code or DEFAULT_IMPUTACION,
+        "original_line": " | ".join(cells),
+    }
@@ -0,0 +1,137 @@
+import datetime
+import pandas as pd
+from openpyxl import load_workbook
+
+REQUIRED_COLUMNS = [
+    'rut_empresa', 'razon_social',
+    'rut_propietario', 'nombre_propietario',
+    'fecha', 'tipo_calificacion', 'monto'
+]
+OPTIONAL_COLUMNS = ['estado']
+
+# Everything is read as text: RUTs must keep their format and bad dates/amounts
+# are reported per row by the ingest stage instead of failing the whole read.
+COLUMN_DTYPES = {col: str for col in REQUIRED_COLUMNS + OPTIONAL_COLUMNS}
+
+
+class MissingColumnsError(ValueError):
+    def __init__(self, missing):
+        self.missing = missing
+        super().__init__(f"Missing columns: {', '.join(missing)}")
+
+
+class TabularReadError(Exception):
+    pass
+
+
+class TabularReader:
+    """
+    Streams a CSV/XLSX upload as fixed-size DataFrame batches.
+
+    Only the required (and known optional) columns are loaded, so peak memory
+    depends on batch_size and not on the size of the file. The index of every
+    batch is the 0-based data row number, so `index + 2` is the spreadsheet line.
+    """
+
+    def __init__(self, file_obj, batch_size=1000):
+        self.file_obj = file_obj
+        self.batch_size = batch_size
+        name = getattr(file_obj, 'name', '') or ''
+        if name.lower().endswith('.csv'):
+            self.format = 'csv'
+        elif name.lower().endswith('.xls'):
+            self.format = 'xls'  # legacy binary format, openpyxl can't stream it
+        else:
+            self.format = 'xlsx'
+        self.columns = None
+
+    def read_header(self):
+        """Reads only the header row and validates required columns."""
+        if self.format == 'csv':
+            self.columns = list(pd.read_csv(self.file_obj, nrows=0).columns)
+            self.file_obj.seek(0)
+        elif self.format == 'xls':
+            self.columns = list(pd.read_excel(self.file_obj, nrows=0).columns)
+            self.file_obj.seek(0)
+        else:
+            wb = load_workbook(self.file_obj, read_only=True, data_only=True)
+            try:
+                header = next(wb.active.iter_rows(max_row=1, values_only=True), ())
+                self.columns = [str(c) if c is not None else '' for c in header]
+            finally:
+                wb.close()
+            self.file_obj.seek(0)
+
+        missing = [col for col in REQUIRED_COLUMNS if col not in self.columns]
+        if missing:
+            raise MissingColumnsError(missing)
+        return self.columns
+
+    def batches(self):
+        if self.columns is None:
+            self.read_header()
+        wanted = [col for col in self.columns if col in COLUMN_DTYPES]
+        try:
+            if self.format == 'csv':
+                yield from self._csv_batches(wanted)
+            elif self.format == 'xls':
+                yield from self._xls_batches(wanted)
+            else:
+                yield from self._xlsx_batches(wanted)
+        except MissingColumnsError:
+            raise
+        except Exception as e:
+            raise TabularReadError(f"Error reading file: {str(e)}") from e
+
+    def __iter__(self):
+        return self.batches()
+
+    def _csv_batches(self, wanted):
+        reader = pd.read_csv(
+            self.file_obj,
+            usecols=wanted,
+            dtype={col: COLUMN_DTYPES[col] for col in wanted},
+            chunksize=self.batch_size,
+        )
+        with reader:
+            # Chunks keep a running RangeIndex, so row numbers stay global
+            yield from reader
+
+    def _xls_batches(self, wanted):
+        df = pd.read_excel(self.file_obj, usecols=wanted, dtype={col: COLUMN_DTYPES[col] for col in wanted})
+        for offset in range(0, len(df), self.batch_size):
+            yield df.iloc[offset:offset + self.batch_size]
+
+    def _xlsx_batches(self, wanted):
+        positions = [self.columns.index(col) for col in wanted]
+        wb = load_workbook(self.file_obj, read_only=True, data_only=True)
+        try:
+            rows, index = [], []
+            for line, values in enumerate(wb.active.iter_rows(min_row=2, values_only=True)):
+                cells = [values[pos] if pos < len(values) else None for pos in positions]
+                if all(cell is None for cell in cells):
+                    continue
+                rows.append([_cell_to_text(cell) for cell in cells])
+                index.append(line)
+                if len(rows) >= self.batch_size:
+                    yield pd.DataFrame(rows, columns=wanted, index=index)
+                    rows, index = [], []
+            if rows:
+                yield pd.DataFrame(rows, columns=wanted, index=index)
+        finally:
+            wb.close()
+
+
+def _cell_to_text(value):
+    """Normalizes an openpyxl cell value to the text pandas would have read."""
+    if value is None:
+        return None
+    if isinstance(value, datetime.datetime):
+        if value.time() == datetime.time(0):
+            return value.date().isoformat()
+        return value.isoformat()
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
@@ -0,0 +1,95 @@
+import pandas as pd
+from calificaciones.models import CalificacionTributaria, Empresa, Propietario
+from calificaciones.validators import rut_check_digits_valid
+
+TIPOS_VALIDOS = {tipo for tipo, _ in CalificacionTributaria.TIPOS}
+# Upload column -> model field; values over max_length would abort the chunk's bulk_create (MySQL strict mode)
+MAX_LENGTH_FIELDS = {
+    'rut_empresa': Empresa._meta.get_field('rut'),
+    'razon_social': Empresa._meta.get_field('razon_social'),
+    'rut_propietario': Propietario._meta.get_field('rut'),
+    'nombre_propietario': Propietario._meta.get_field('nombre'),
+}
+
+
+def validate_rows(df):
+    """
+    Column-wise validation of a tabular upload batch, run before any DB work.
+
+    Returns (clean, errors):
+      - clean: only the rows without errors, with typed columns
+        (fecha -> date, monto -> int, tipo_calificacion normalized to lowercase).
+      - errors: one entry per failed check, {"fila", "columna", "valor", "error"},
+        where fila is the spreadsheet line (header = 1).
+    """
+    checks = []  # (column, boolean mask of bad rows, message)
+    text = {col: df[col].astype("string").str.strip() for col in df.columns}
+
+    for col in ('rut_empresa', 'rut_propietario', 'razon_social', 'fecha', 'tipo_calificacion', 'monto'):
+        checks.append((col, text[col].isna() | (text[col] == ""), "Campo obligatorio vacío"))
+
+    for col in ('rut_empresa', 'rut_propietario'):
+        bad = ~rut_check_digits_valid(text[col].fillna("")) & text[col].notna() & (text[col] != "")
+        checks.append((col, bad, "El RUT no es válido (dígito verificador incorrecto)."))
+
+    for col, field in MAX_LENGTH_FIELDS.items():
+        if col in text:
+            checks.append((col, text[col].str.len() > field.max_length, f"Máximo {field.max_length} caracteres"))
+
+    # Fast ISO path first, dateutil fallback only for the remaining rows
+    fechas = pd.to_datetime(text['fecha'], format='ISO8601', errors='coerce')
+    retry = fechas.isna() & text['fecha'].notna()
+    if retry.any():
+        fechas[retry] = pd.to_datetime(text['fecha'][retry], format='mixed', errors='coerce')
+    checks.append(('fecha', fechas.isna() & text['fecha'].notna() & (text['fecha'] != ""), "Fecha no válida"))
+
+    montos = pd.to_numeric(text['monto'].str.replace(",", "", regex=False), errors='coerce')
+    present = text['monto'].notna() & (text['monto'] != "")
+    checks.append(('monto', montos.isna() & present, "El monto debe ser numérico"))
+    checks.append(('monto', montos.notna() & (montos % 1 != 0), "El monto debe ser un entero"))
+    checks.append(('monto', montos < 0, "El valor debe ser positivo."))
+
+    tipos = text['tipo_calificacion'].str.lower()
+    checks.append((
+        'tipo_calificacion',
+        ~tipos.isin(TIPOS_VALIDOS) & tipos.notna() & (tipos != ""),
+        f"Tipo no válido (permitidos: {', '.join(sorted(TIPOS_VALIDOS))})"
+    ))
+
+    errors = []
+    bad_rows = pd.Series(False, index=df.index)
+    for col, mask, message in checks:
+        mask = mask.fillna(False).astype(bool)
+        if not mask.any():
+            continue
+        bad_rows |= mask
+        for index, value in df.loc[mask, col].items():
+            errors.append({
+                "fila": int(index) + 2,
+                "columna": col,
+                "valor": None if pd.isna(value) else str(value),
+                "error": message,
+            })
+    errors.sort(key=lambda e: e["fila"])
+
+    ok = ~bad_rows
+    clean = pd.DataFrame({
+        'rut_empresa': text['rut_empresa'][ok],
+        'razon_social': text['razon_social'][ok],
+        'rut_propietario': text['rut_propietario'][ok],
+        'nombre_propietario': text['nombre_propietario'][ok],
+        'fecha': fechas[ok].dt.date,
+        'tipo_calificacion': tipos[ok],
+        'monto': montos[ok].astype('int64'),
+    }, index=df.index[ok])
+    if 'estado' in df.columns:
+        clean['estado'] = text['estado'][ok]
+    return clean, errors
+
+
+def format_errors(errors):
+    """Collapses the error table into the legacy "Row N: ..." strings (one per row)."""
+    by_row = {}
+    for e in errors:
+        by_row.setdefault(e["fila"], []).append(f"{e['columna']}: {e['error']}")
+    return [f"Row {fila}: {'; '.join(msgs)}" for fila, msgs in by_row.items()]
@@ -0,0 +1,327 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+from calificaciones import audit
+from calificaciones.models import ArchivoCargado
+from .bulk_ingest import BulkIngestor
+from . import parse_cache, parser_sandbox
+from .bulk_upsert import BulkUpserter
+from .pdf_parser import PDFParser
+from .tabular_reader import TabularReader
+from .upload_validation import validate_rows
+
+TABULAR_EXTENSIONS = ('.csv', '.xls', '.xlsx')
+
+
+def _init_worker():
+    # Needed under the spawn/forkserver start methods; a no-op for fork
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def parse_sandboxed(path):
+    """PDF member parsed in the parser sandbox; the exception is kept for the error report."""
+    try:
+        return {"data": parser_sandbox.parse(path)}
+    except Exception as e:
+        return {"error": str(e), "exception": e}
+
+
+def parse_member(path, nombre, kind):
+    """
+    CPU-bound part of a ZIP member, run in a worker process: PDFParser.parse_data
+    for PDFs, or reading + validate_rows for spreadsheets. Validated batches
+    are spilled to `path`.validado (read back with validated_batches) instead
+    of being returned, so neither side holds a whole spreadsheet. No DB
+    access. Errors are returned (not raised) so they pickle cleanly.
+    """
+    try:
+        if kind == "pdf":
+            # Already running in a pool: no nested page-level pool
+            return {"data": PDFParser(path, workers=1).parse_data()}
+
+        spill = path + ".validado"
+        rows = 0
+        with open(path, 'rb') as f, open(spill, 'wb') as out:
+            # Named after the member: TabularReader picks the format from the extension
+            reader = TabularReader(File(f, name=nombre))
+            reader.read_header()
+            for batch in reader:
+                clean, errors = validate_rows(batch)
+                pickle.dump((clean, errors, len(batch)), out, pickle.HIGHEST_PROTOCOL)
+                rows += len(batch)
+        return {"validado": spill, "rows": rows}
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def copy_limited(src, dest, digest, max_bytes):
+    """
+    Copies `src` to `dest`, feeding `digest` on the way. Returns the bytes
+    copied, or None as soon as more than `max_bytes` came out of `src`
+    (the sizes a ZIP declares for its members are not trusted).
+    """
+    copied = 0
+    for block in iter(lambda: src.read(1024 * 1024), b''):
+        copied += len(block)
+        if copied > max_bytes:
+            return None
+        digest.update(block)
+        dest.write(block)
+    return copied
+
+
+def validated_batches(spill):
+    """The (clean, errors, rows) batches parse_member spilled, one at a time."""
+    with open(spill, 'rb') as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
+
+class ZipIngestor:
+    """
+    Ingests every CSV/XLSX/PDF inside a ZIP archive.
+
+    Parsing fans out across a ProcessPoolExecutor (one task per member);
+    PDFs go to the parser sandbox instead (services/parser_sandbox.py), so
+    they run under its time and memory limits. Each member is persisted in
+    this process as soon as its parse is done, with the empresa/propietario
+    caches shared by all the files, and at most two members per worker are
+    in flight: memory is bounded by the workers, not by the archive. Each
+    member gets its own ArchivoCargado and an entry in the per-file report;
+    byte-identical members are parsed once and reported as duplicates.
+
+    Persistence is per member, not one batch for the archive: each member
+    is written in its own transaction, so a failure rolls back that member
+    only and its entry reports estado "error" while the rest commit.
+    Uploading the same ZIP again recovers: members already ingested are
+    reported as "duplicado" and only the failed ones are written.
+    """
+
+    def __init__(self, user=None, workers=None, chunk_size=None):
+        self.user = user
+        self.workers = workers or getattr(settings, 'ZIP_INGEST_WORKERS', 0) or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.report = []
+
+    def ingest(self, source):
+        """`source` is a path or a seekable file object with the ZIP archive."""
+        start = time.perf_counter()
+        with tempfile.TemporaryDirectory(prefix="nuam_zip_") as tmpdir:
+            with zipfile.ZipFile(source) as zf:
+                members, copias = self._extract(zf, tmpdir)
+            parse_start = time.perf_counter()
+            self._parsed_at = parse_start
+            self.report.extend(self._process(members, copias))
+            parse_seconds = self._parsed_at - parse_start
+
+        totals = {"archivos": len(self.report), "created": 0, "updated": 0}
+        for entry in self.report:
+            totals[entry["estado"]] = totals.get(entry["estado"], 0) + 1
+            totals["created"] += entry.get("created", 0)
+            totals["updated"] += entry.get("updated", 0)
+        return {
+            **totals,
+            "workers": self.workers,
+            "parse_seconds": round(parse_seconds, 3),
+            "elapsed_seconds": round(time.perf_counter() - start, 3),
+            "archivos_detalle": self.report,
+        }
+
+    # --- Extraction ---
+
+    def _extract(self, zf, tmpdir):
+        """
+        Writes the supported members to `tmpdir`, hashing them on the way.
+        Returns ([(name, path, kind, sha256)], {index of a copy: index of the first member with its bytes}).
+        """
+        infos = [i for i in zf.infolist() if not i.is_dir()]
+        limit = getattr(settings, 'ZIP_MAX_TAMANO', 2 * 1024 ** 3)
+        # Early reject on the declared sizes; the bytes actually inflated are counted below
+        if sum(i.file_size for i in infos) > limit:
+            raise ValueError(f"El ZIP descomprimido supera el máximo permitido ({limit} bytes)")
+
+        members, copias, first = [], {}, {}
+        extracted = 0
+        for n, info in enumerate(infos):
+            nombre = os.path.basename(info.filename)
+            # macOS metadata and hidden files are not uploads
+            if not nombre or nombre.startswith('.') or info.filename.startswith('__MACOSX/'):
+                continue
+            lower = nombre.lower()
+            if lower.endswith('.pdf'):
+                kind = "pdf"
+            elif lower.endswith(TABULAR_EXTENSIONS):
+                kind = "tabular"
+            else:
+                self.report.append({"archivo": info.filename, "estado": "omitido", "error": "Tipo de archivo no soportado"})
+                continue
+            # The member path is never used as a destination (no zip-slip): only its basename
+            path = os.path.join(tmpdir, f"{n}_{nombre}")
+            digest = hashlib.sha256()
+            with zf.open(info) as src, open(path, 'wb') as dest:
+                copied = copy_limited(src, dest, digest, limit - extracted)
+            if copied is None:
+                raise ValueError(f"El ZIP descomprimido supera el máximo permitido ({limit} bytes)")
+            extracted += copied
+            sha256 = digest.hexdigest()
+            if sha256 in first:
+                copias[len(members)] = first[sha256]
+                os.remove(path)
+            else:
+                first[sha256] = len(members)
+            members.append((info.filename, path, kind, sha256))
+        return members, copias
+
+    # --- Parsing + persistence, member by member ---
+
+    def _process(self, members, copias):
+        """Report entries of `members`, in archive order."""
+        self._members = members
+        self._entries = [None] * len(members)
+        self._caches = ({}, {})
+
+        # PDFs already in the parse cache skip parsing
+        pending = []
+        for n, (name, path, kind, sha256) in enumerate(members):
+            if n in copias:
+                continue
+            if kind == "pdf" and parse_cache.enabled():
+                data = parse_cache.get(sha256)
+                if data is not None:
+                    self._entries[n] = self._persist(members[n], {"data": data})
+                    continue
+            pending.append(n)
+
+        sandboxed = [n for n in pending if members[n][2] == "pdf" and parser_sandbox.enabled()]
+        pooled = [(n, (members[n][1], os.path.basename(members[n][0]), members[n][2])) for n in pending if n not in sandboxed]
+        if self.workers <= 1 or len(pooled) <= 1:
+            for n, args in pooled:
+                self._parsed(n, parse_member(*args))
+        else:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(pooled)), initializer=_init_worker) as pool:
+                self._parse_in(pool, parse_member, pooled)
+        # After the process pool (no fork while threads run); the threads only wait on sandbox workers
+        if sandboxed:
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(sandboxed))) as threads:
+                self._parse_in(threads, parse_sandboxed, [(n, (members[n][1],)) for n in sandboxed])
+
+        for n, original in copias.items():
+            entry = {"archivo": members[n][0], "tipo": members[n][2]}
+            source = self._entries[original]
+            if "archivo_id" in source:
+                entry.update(estado="duplicado", archivo_id=source["archivo_id"])
+            else:
+                entry.update({k: v for k, v in source.items() if k not in ("archivo", "tipo")})
+            self._entries[n] = entry
+        return self._entries
+
+    def _parse_in(self, executor, fn, tasks):
+        """fn(*args) for every (n, args) of `tasks`, at most two per worker in flight; each result is persisted on arrival."""
+        pending = {}
+        for n, args in tasks:
+            while len(pending) >= self.workers * 2:
+                self._drain(pending)
+            pending[executor.submit(fn, *args)] = n
+        while pending:
+            self._drain(pending)
+
+    def _drain(self, pending):
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            self._parsed(pending.pop(future), future.result())
+
+    def _parsed(self, n, result):
+        self._parsed_at = time.perf_counter()
+        member = self._members[n]
+        if member[2] == "pdf" and "data" in result and parse_cache.enabled():
+            parse_cache.put(member[3], result["data"])
+        self._entries[n] = self._persist(member, result)
+
+    def _persist(self, member, result):
+        """Report entry of one parsed member, after writing it to the DB."""
+        from calificaciones.bulk_upload_views import find_previous_upload, pdf_error_context
+
+        name, path, kind, sha256 = member
+        entry = {"archivo": name, "tipo": kind}
+        if "error" in result:
+            entry.update(estado="error", error=result["error"])
+            if kind == "pdf":
+                entry["details"] = pdf_error_context(result.get("exception") or Exception(result["error"]), self.user, name)
+            return entry
+
+        # Only uploads whose rows were written: a PDF previewed but never confirmed is ingested here
+        previous = find_previous_upload(sha256, ingerido=True)
+        if previous:
+            entry.update(estado="duplicado", archivo_id=previous["archivo_id"])
+            return entry
+
+        try:
+            # All or nothing per member (the chunk transactions become savepoints)
+            with transaction.atomic():
+                if kind == "pdf":
+                    self._persist_pdf(entry, path, sha256, result)
+                else:
+                    self._persist_tabular(entry, name, sha256, result)
+        except Exception as e:
+            entry.update(estado="error", error=str(e))
+            # They may hold empresas/propietarios created by the rolled back member
+            for cache in self._caches:
+                cache.clear()
+        return entry
+
+    def _persist_tabular(self, entry, name, sha256, result):
+        archivo = ArchivoCargado.objects.create(
+            nombre_archivo=os.path.basename(name),
+            cargado_por=self.user,
+            sha256=sha256,
+        )
+        ingestor = BulkIngestor(user=self.user, chunk_size=self.chunk_size, archivo=archivo, caches=self._caches)
+        with audit.bulk_audit(usuario=self.user, archivo=archivo, batch_size=ingestor.chunk_size):
+            for clean, errors, rows in validated_batches(result["validado"]):
+                ingestor.ingest_validated(clean, errors, rows)
+            archivo.metadata = ingestor.summary()
+            archivo.ingerido_en = timezone.now()
+            archivo.save(update_fields=["metadata", "ingerido_en"])
+        summary = archivo.metadata
+        entry.update(
+            estado="error" if summary["errors"] and not summary["created"] else "ok",
+            archivo_id=archivo.id,
+            rows=summary["rows"],
+            created=summary["created"],
+            errors=summary["errors"],
+        )
+
+    def _persist_pdf(self, entry, path, sha256, result):
+        from calificaciones.bulk_upload_views import store_pdf
+
+        data = result["data"]
+        upserter = BulkUpserter(user=self.user, chunk_size=self.chunk_size)
+        with audit.bulk_audit(usuario=self.user, batch_size=upserter.chunk_size):
+            results = upserter.upsert(data)
+        # Registered after the upsert so the ArchivoCargado links to the (maybe new) empresa
+        archivo = store_pdf(path, data, self.user, sha256, ingerido=True)
+        entry.update(
+            estado="error" if results["errors"] and not (results["created"] or results["updated"]) else "ok",
+            archivo_id=archivo.id,
+            created=results["created"],
+            updated=results["updated"],
+            errors=results["errors"],
+        )
+
+
+def ingest_zip(source, user=None, workers=None, chunk_size=None):
+    return ZipIngestor(user=user, workers=workers, chunk_size=chunk_size).ingest(source)
@@ -1,11 +1,14 @@
 from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
-from .models import CalificacionTributaria, Auditoria
+from .models import CalificacionTributaria, CreditoIDPC
 from .serializers import CalificacionTributariaSerializer
+from .services import cert70_totals
+from . import audit
 
 @receiver(pre_save, sender=CalificacionTributaria)
 def before_update(sender, instance, **kwargs):
-    if instance.pk:
+    # Bulk paths that already hold the previous state set _antes themselves (no re-SELECT)
+    if instance.pk and not hasattr(instance, "_antes"):
         try:
             instance._antes = CalificacionTributariaSerializer(sender.objects.get(pk=instance.pk)).data
         except sender.DoesNotExist:
@@ -13,29 +16,37 @@ def before_update(sender, instance, **kwargs):
 
 @receiver(post_save, sender=CalificacionTributaria)
 def after_update(sender, instance, created, **kwargs):
-    Auditoria.objects.create(
-        usuario=instance.creado_por, # Note: This attributes action to creator, ideally should be current user
-        accion="crear" if created else "modificar",
-        entidad="CalificacionTributaria",
-        entidad_id=instance.pk,
-        detalle={
-            "antes": getattr(instance, "_antes", None),
-            "despues": CalificacionTributariaSerializer(instance).data
-        }
+    antes = instance.__dict__.pop("_antes", None)
+    cert70_totals.calificacion_saved(instance, antes)
+    # Buffered when running inside audit.bulk_audit()
+    audit.record_calificacion(
+        instance,
+        "crear" if created else "modificar",
+        antes=antes,
     )
 
 @receiver(post_delete, sender=CalificacionTributaria)
 def after_delete(sender, instance, **kwargs):
+    cert70_totals.calificacion_deleted(instance)
     try:
-        Auditoria.objects.create(
-            usuario=instance.creado_por,
-            accion="eliminar",
-            entidad="CalificacionTributaria",
-            entidad_id=instance.pk,
-            detalle={
-                "antes": CalificacionTributariaSerializer(instance).data,
-                "despues": None
-            }
+        audit.record_calificacion(
+            instance,
+            "eliminar",
+            antes=CalificacionTributariaSerializer(instance).data,
         )
     except Exception as e:
         print(f"Error creating audit for deletion: {e}")
+
+@receiver(pre_save, sender=CreditoIDPC)
+def before_credito_update(sender, instance, **kwargs):
+    instance._antes = None
+    if instance.pk:
+        instance._antes = sender.objects.filter(pk=instance.pk).values_list("calificacion_id", "tipo", "monto").first()
+
+@receiver(post_save, sender=CreditoIDPC)
+def after_credito_update(sender, instance, **kwargs):
+    cert70_totals.credito_saved(instance, instance.__dict__.pop("_antes", None))
+
+@receiver(post_delete, sender=CreditoIDPC)
+def after_credito_delete(sender, instance, **kwargs):
+    cert70_totals.credito_deleted(instance)
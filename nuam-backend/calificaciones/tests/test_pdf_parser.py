@@ -1,3 +1,5 @@
+import os
+import tempfile
 from django.test import SimpleTestCase
 from unittest.mock import patch, MagicMock
 from calificaciones.services.pdf_parser import PDFParser
@@ -59,3 +61,107 @@ class PDFParserTests(SimpleTestCase):
         self.assertEqual(data['calificaciones'][1]['fecha'], '15/03/2023')
         self.assertEqual(data['calificaciones'][1]['tipo'], 'remesa')
         self.assertEqual(data['calificaciones'][1]['monto'], 500000)
+
+    @patch('pdfplumber.open')
+    def test_dj1948_opens_document_once(self, mock_open):
+        pages = []
+        for n in range(3):
+            page = MagicMock()
+            page.extract_text.return_value = f"DJ 1948 Retiros 76.543.210-3 31/12/2023 pagina {n}"
+            page.extract_tables.return_value = [[
+                ["12.345.678-9", "JUAN PEREZ", "DIV", f"{n + 1}.000.000", ""],
+                ["Total", "", "", "", ""],
+            ]]
+            pages.append(page)
+        mock_pdf = MagicMock()
+        mock_pdf.pages = pages
+        mock_open.return_value = mock_pdf
+
+        data = PDFParser("dummy.pdf").parse_data()
+
+        mock_open.assert_called_once()
+        mock_pdf.close.assert_called_once()
+        for page in pages:
+            page.extract_text.assert_called_once()
+            page.extract_tables.assert_called_once()
+        self.assertEqual([c['monto'] for c in data['calificaciones']], [1000000, 2000000, 3000000])
+        self.assertEqual(data['calificaciones'][0]['fecha'], '31/12/2023')
+        self.assertEqual(data['calificaciones'][0]['tipo'], 'dividendo')
+
+    def test_parallel_mode_matches_serial(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = build_dj1948_pdf(os.path.join(tmpdir, "dj.pdf"))
+
+            serial = PDFParser(path, workers=1).parse_data()
+            parallel = PDFParser(path, workers=3, parallel_min_pages=2).parse_data()
+
+        self.assertEqual(len(serial['calificaciones']), 8)
+        self.assertEqual(parallel, serial)
+
+    def test_parallel_mode_only_for_dj1948_first_page(self):
+        from reportlab.pdfgen import canvas
+        with tempfile.TemporaryDirectory() as tmpdir:
+            dj = build_dj1948_pdf(os.path.join(tmpdir, "dj.pdf"))
+            otro = os.path.join(tmpdir, "otro.pdf")
+            pdf = canvas.Canvas(otro)
+            for n in range(4):
+                pdf.drawString(72, 720, f"Factura electronica, pagina {n + 1}")
+                pdf.showPage()
+            pdf.save()
+
+            with patch.object(PDFParser, '_prefetch_parallel') as prefetch:
+                PDFParser(otro, workers=3, parallel_min_pages=2).parse_data()
+                self.assertFalse(prefetch.called)
+                PDFParser(dj, workers=3, parallel_min_pages=2).parse_data()
+                prefetch.assert_called_once()
+
+    def test_iter_parse_streams_pages_like_parse_data(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = build_dj1948_pdf(os.path.join(tmpdir, "dj.pdf"))
+
+            parts = list(PDFParser(path).iter_parse())
+            data = PDFParser(path, workers=1).parse_data()
+
+        header, pages = parts[0], parts[1:]
+        self.assertEqual(header, {k: v for k, v in data.items() if k != 'calificaciones'})
+        self.assertEqual([len(rows) for rows in pages], [2, 2, 2, 2])
+        self.assertEqual([row for rows in pages for row in rows], data['calificaciones'])
+
+    def test_hybrid_engine_matches_pdfplumber(self):
+        import pdfplumber
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = build_dj1948_pdf(os.path.join(tmpdir, "dj.pdf"), pages=2, text_pages=2)
+
+            expected = PDFParser(path, workers=1, engine="pdfplumber").parse_data()
+            with patch.object(pdfplumber.page.Page, 'extract_tables', autospec=True,
+                              side_effect=pdfplumber.page.Page.extract_tables) as extract_tables:
+                hybrid = PDFParser(path, workers=1, engine="hybrid").parse_data()
+
+        self.assertEqual(hybrid, expected)
+        self.assertEqual(len(expected['calificaciones']), 4)
+        # Page 2 has no RUT and never goes through pdfplumber (page 1 has the declarante's)
+        self.assertEqual(sorted(call.args[0].page_number for call in extract_tables.call_args_list), [1, 3, 4])
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            PDFParser("dummy.pdf", engine="ocr")
+
+
+def build_dj1948_pdf(path, pages=4, text_pages=0):
+    """DJ1948-like document: a header line, `text_pages` pages of plain text, then one two-row table per page."""
+    from reportlab.lib import colors
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, PageBreak
+    from reportlab.lib.styles import getSampleStyleSheet
+
+    style = getSampleStyleSheet()['Normal']
+    elements = [Paragraph("DJ 1948 Retiros 76.543.210-3 31/12/2023", style)]
+    for _ in range(text_pages):
+        elements += [Paragraph("Instrucciones de llenado del formulario. " * 40, style), PageBreak()]
+    for page in range(pages):
+        elements += [Table([
+            ["RUT", "Nombre", "Codigo", "Monto", "Fecha"],
+            [f"1{page}.345.678-9", f"SOCIO {page}", "RET", f"{page + 1}.500.000", f"0{page + 1}/03/2023"],
+            [f"2{page}.345.678-9", f"OTRO {page}", "DIV", "750.000", ""],
+        ], style=TableStyle([('GRID', (0, 0), (-1, -1), 0.5, colors.black)])), PageBreak()]
+    SimpleDocTemplate(path).build(elements)
+    return path
@@ -0,0 +1,31 @@
+from django.test import SimpleTestCase
+from calificaciones.services.row_classifier import classify_row, is_rut
+
+
+class RowClassifierTests(SimpleTestCase):
+    def test_data_row(self):
+        row = ["12.345.678-9", "Inversiones Los Andes SpA", "RETIRO / RAI", "1.500.000", "$ 1.560.000", "31/12/2023"]
+        self.assertEqual(classify_row(row), {
+            "fecha": "31/12/2023",
+            "rut_propietario": "12.345.678-9",
+            "nombre_propietario": "Inversiones Los Andes SpA",
+            "tipo": "retiro",
+            "monto": 1560000,
+            "imputacion": "RAI",
+            "original_line": " | ".join(row),
+        })
+
+    def test_defaults_when_row_has_no_code_date_or_amount(self):
+        result = classify_row(["9876543-K", "MARIA GONZALEZ", ""])
+        self.assertIsNone(result["fecha"])
+        self.assertEqual(result["tipo"], "retiro")
+        self.assertEqual(result["imputacion"], "SIN CLASIFICAR")
+        self.assertEqual(result["monto"], 0)
+
+    def test_first_code_wins(self):
+        result = classify_row(["12.345.678-9", "DIV", "REM", "100"])
+        self.assertEqual((result["tipo"], result["imputacion"]), ("dividendo", "DIV"))
+
+    def test_header_row_is_skipped(self):
+        self.assertIsNone(classify_row(["RUT", "Nombre o Razón Social", "Monto"]))
+        self.assertFalse(is_rut("RUT"))
@@ -0,0 +1,48 @@
+import io
+import pandas as pd
+from django.test import SimpleTestCase
+from calificaciones.services.tabular_reader import TabularReader, MissingColumnsError
+
+COLUMNS = {
+    'rut_empresa': ['11111111-1'] * 5,
+    'razon_social': ['Empresa'] * 5,
+    'rut_propietario': ['22222222-2'] * 5,
+    'nombre_propietario': ['Socio'] * 5,
+    'fecha': ['2023-01-01'] * 5,
+    'tipo_calificacion': ['retiro'] * 5,
+    'monto': [100, 200, 300, 400, 500],
+    'columna_extra': ['x'] * 5,
+}
+
+class TabularReaderTests(SimpleTestCase):
+    def _file(self, df, name):
+        buf = io.BytesIO()
+        if name.endswith('.csv'):
+            buf.write(df.to_csv(index=False).encode())
+        else:
+            df.to_excel(buf, index=False)
+        buf.seek(0)
+        buf.name = name
+        return buf
+
+    def test_csv_batches_keep_row_numbers(self):
+        reader = TabularReader(self._file(pd.DataFrame(COLUMNS), "data.csv"), batch_size=2)
+        batches = list(reader)
+        self.assertEqual([len(b) for b in batches], [2, 2, 1])
+        self.assertEqual(list(batches[2].index), [4])
+        self.assertNotIn('columna_extra', batches[0].columns)
+        self.assertEqual(batches[0]['monto'].tolist(), ['100', '200'])
+
+    def test_xlsx_streams_only_known_columns(self):
+        reader = TabularReader(self._file(pd.DataFrame(COLUMNS), "data.xlsx"), batch_size=3)
+        batches = list(reader)
+        self.assertEqual([len(b) for b in batches], [3, 2])
+        self.assertEqual(list(batches[1].index), [3, 4])
+        self.assertNotIn('columna_extra', batches[0].columns)
+        self.assertEqual(batches[1]['monto'].tolist(), ['400', '500'])
+
+    def test_missing_columns(self):
+        reader = TabularReader(self._file(pd.DataFrame({'wrong_col': [1]}), "bad.xlsx"))
+        with self.assertRaises(MissingColumnsError) as cm:
+            reader.read_header()
+        self.assertIn('rut_empresa', cm.exception.missing)
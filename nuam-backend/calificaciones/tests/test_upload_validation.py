@@ -0,0 +1,35 @@
+import pandas as pd
+from django.test import SimpleTestCase
+from calificaciones.services.upload_validation import validate_rows, format_errors
+
+class UploadValidationTests(SimpleTestCase):
+    def setUp(self):
+        self.df = pd.DataFrame({
+            'rut_empresa': ['11111111-1', '11111111-2', '11111111-1', '11111111-1', '11111111-1'],
+            'razon_social': ['Empresa'] * 5,
+            'rut_propietario': ['22222222-2'] * 5,
+            'nombre_propietario': ['Socio', None, 'Socio', 'Socio', 'Socio'],
+            'fecha': ['2023-01-01', '2023-01-02', '31-02-2023', '05/03/2023', '2023-04-01'],
+            'tipo_calificacion': ['Retiro', 'retiro', 'dividendo', 'DJ1948', 'remesa'],
+            'monto': ['1000', '-5', '10.5', '300', ''],
+        })
+
+    def test_only_clean_rows_pass(self):
+        clean, errors = validate_rows(self.df)
+        self.assertEqual(list(clean.index), [0])
+        self.assertEqual(clean.loc[0, 'tipo_calificacion'], 'retiro')
+        self.assertEqual(clean.loc[0, 'monto'], 1000)
+        self.assertEqual(str(clean.loc[0, 'fecha']), '2023-01-01')
+
+    def test_error_table(self):
+        _, errors = validate_rows(self.df)
+        found = {(e['fila'], e['columna']) for e in errors}
+        self.assertEqual(found, {
+            (3, 'rut_empresa'), (3, 'monto'),
+            (4, 'fecha'), (4, 'monto'),
+            (5, 'tipo_calificacion'),
+            (6, 'monto'),
+        })
+        legacy = format_errors(errors)
+        self.assertEqual(len(legacy), 4)
+        self.assertTrue(legacy[0].startswith("Row 3: "))
@@ -1,6 +1,7 @@
 from django.test import SimpleTestCase
 from rest_framework.exceptions import ValidationError
-from calificaciones.validators import validate_rut, validate_positive
+import pandas as pd
+from calificaciones.validators import validate_rut, validate_positive, rut_check_digits_valid
 
 class ValidatorTests(SimpleTestCase):
     def test_validate_rut_valid(self):
@@ -32,3 +33,7 @@ class ValidatorTests(SimpleTestCase):
         with self.assertRaises(ValidationError) as cm:
             validate_positive(-1)
         self.assertIn("El valor debe ser positivo", str(cm.exception))
+
+    def test_rut_check_digits_valid_matches_validate_rut(self):
+        ruts = pd.Series(["12.345.678-5", "30686957-4", "12.345.678-K", "12.345.ABC-5", "1", None])
+        self.assertEqual(rut_check_digits_valid(ruts).tolist(), [True, True, False, False, False, False])
@@ -1,4 +1,5 @@
 import io
+import hashlib
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter, landscape
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
@@ -108,3 +109,30 @@ def generate_error_report(filename, error_context):
     buffer.seek(0)
     # We return bytes, not response, because this might be saved to disk
     return buffer.getvalue()
+
+def copy_and_hash(file_obj, dest):
+    """
+    Copies an uploaded file into `dest` chunk by chunk and returns its SHA-256,
+    so hashing costs no extra pass over the upload.
+    """
+    digest = hashlib.sha256()
+    for chunk in file_obj.chunks():
+        digest.update(chunk)
+        dest.write(chunk)
+    return digest.hexdigest()
+
+def hash_upload(file_obj):
+    """Streaming SHA-256 of an uploaded file; rewinds it afterwards."""
+    digest = hashlib.sha256()
+    for chunk in file_obj.chunks():
+        digest.update(chunk)
+    file_obj.seek(0)
+    return digest.hexdigest()
+
+def hash_path(path):
+    """Streaming SHA-256 of a file on disk."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
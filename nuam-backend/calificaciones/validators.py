@@ -53,3 +53,37 @@ def validate_positive(value):
     if value is not None and value < 0:
         raise serializers.ValidationError("El valor debe ser positivo.")
     return value
+
+def rut_check_digits_valid(series):
+    """
+    Vectorized version of validate_rut for a pandas Series of RUT strings.
+    Returns a boolean Series (True = valid). Same cleaning and modulo 11
+    algorithm, computed for the whole column at once with NumPy.
+    """
+    import numpy as np
+    import pandas as pd
+
+    clean = series.astype("string").str.replace(".", "", regex=False).str.replace("-", "", regex=False)
+    clean = clean.str.strip().str.upper()
+    body = clean.str[:-1]
+    dv = clean.str[-1:]
+    valid = (clean.str.len() >= 2) & body.str.fullmatch(r"\d+")
+    valid = valid.fillna(False).astype(bool)
+    if not valid.any():
+        return valid
+
+    # Right-align every body into a digit matrix (leading zeros weigh nothing)
+    bodies = body[valid]
+    width = int(bodies.str.len().max())
+    padded = bodies.str.zfill(width)
+    digits = np.frombuffer("".join(padded.tolist()).encode("ascii"), dtype=np.uint8)
+    digits = digits.reshape(len(padded), width).astype(np.int64) - ord("0")
+
+    # Weights 2,3,4,5,6,7,2,3... starting from the rightmost digit
+    weights = 2 + (np.arange(width)[::-1] % 6)
+    res = 11 - (digits @ weights) % 11
+    dv_calc = np.where(res == 11, "0", np.where(res == 10, "K", res.astype(str)))
+
+    result = pd.Series(False, index=series.index)
+    result[valid] = dv[valid].to_numpy() == dv_calc
+    return result
@@ -2,11 +2,17 @@ from rest_framework import viewsets, filters
 from rest_framework.views import APIView
 from rest_framework.decorators import api_view, action, permission_classes
 from rest_framework.response import Response
-from .models import CalificacionTributaria, Empresa, Propietario, Auditoria, Accion, Corredor
+from .models import CalificacionTributaria, Empresa, Propietario, Auditoria, Accion, Corredor, Certificado70, Tarea
 from .serializers import (
     CalificacionTributariaSerializer, EmpresaSerializer, PropietarioSerializer, 
-    AuditoriaSerializer, AccionSerializer, CorredorSerializer, Certificado70Serializer
+    AuditoriaSerializer, AccionSerializer, CorredorSerializer, Certificado70Serializer,
+    TareaSerializer
 )
+from .services import jobs
+from .services.jobs import wants_async, accepted_response
+from .services.exports import render_calificaciones_pdf, render_auditoria_pdf, render_auditoria_xlsx
+from .services.cert70_batch import generate_certificates
+from .services import cert70_pdf_cache, cert70_totals
 from core.permissions import IsAdminGeneral, IsAdminTributario, IsAuditorInterno, IsCorredor
 from rest_framework.permissions import IsAuthenticated, SAFE_METHODS
 
@@ -34,56 +40,18 @@ class CalificacionTributariaViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'], url_path='export_pdf')
     def export_pdf(self, request):
-        from reportlab.lib import colors
-        from reportlab.lib.pagesizes import A4, landscape
-        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-        from reportlab.lib.styles import getSampleStyleSheet
         from django.http import HttpResponse
 
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = 'attachment; filename="calificaciones.pdf"'
-
-        doc = SimpleDocTemplate(response, pagesize=landscape(A4))
-        elements = []
-        styles = getSampleStyleSheet()
-        
-        # Header
-        elements.append(Paragraph("<b>Reporte de Calificaciones Tributarias</b>", styles['Heading1']))
-        elements.append(Spacer(1, 10))
-        
         # Use filtered queryset
         queryset = self.filter_queryset(self.get_queryset())
-        
-        # Table Data
-        data = [["Fecha", "Empresa", "Propietario", "Tipo", "Monto", "Estado"]]
-        
-        for cal in queryset:
-            data.append([
-                Paragraph(str(cal.fecha), styles['Normal']),
-                Paragraph(cal.empresa.razon_social or "", styles['Normal']),
-                Paragraph(cal.propietario.nombre if cal.propietario else "Sin propietario", styles['Normal']),
-                Paragraph(cal.tipo, styles['Normal']),
-                Paragraph(f"${cal.monto_original:,.0f}", styles['Normal']),
-                Paragraph(cal.estado.capitalize(), styles['Normal']),
-            ])
-            
-        # Table Style
-        # Cols: Fecha(80), Empresa(200), Prop(150), Tipo(80), Monto(100), Estado(80) = ~700
-        t = Table(data, colWidths=[80, 200, 150, 80, 100, 80])
-        t.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.darkred), # NUAM Red? 
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ]))
-        
-        elements.append(t)
-        doc.build(elements)
-        return response
+
+        if wants_async(request):
+            ids = list(queryset.values_list('id', flat=True))
+            return accepted_response(jobs.enqueue("export_calificaciones_pdf", {"ids": ids}, request.user))
+
+        response = HttpResponse(content_type='application/pdf')
+        response['Content-Disposition'] = 'attachment; filename="calificaciones.pdf"'
+        return render_calificaciones_pdf(queryset, response)
 
     def get_permissions(self):
         # Corredor, Auditor: Read Only
@@ -193,87 +161,32 @@ class AuditoriaViewSet(viewsets.ReadOnlyModelViewSet):
 
     @action(detail=False, methods=['get'])
     def export_pdf(self, request):
-        from reportlab.lib import colors
-        from reportlab.lib.pagesizes import A4, landscape
-        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-        from reportlab.lib.styles import getSampleStyleSheet
         from django.http import HttpResponse
 
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = 'attachment; filename="auditoria.pdf"'
-
-        doc = SimpleDocTemplate(response, pagesize=landscape(A4)) # Landscape for more width
-        elements = []
-        styles = getSampleStyleSheet()
-        
-        # Header
-        elements.append(Paragraph("<b>Reporte de Auditoría</b>", styles['Heading1']))
-        elements.append(Spacer(1, 10))
-        
         # Data
         logs = self.filter_queryset(self.get_queryset())
-        
-        # Table Header
-        data = [["Fecha", "Usuario", "Acción", "Entidad", "Detalle"]]
-        
-        # Table Body
-        for log in logs:
-            date_str = log.fecha.strftime("%Y-%m-%d %H:%M") if log.fecha else ""
-            user_str = log.usuario.username if log.usuario else "Sistema"
-            # Detalle logic: Use detail if short, or summarize? 
-            # Detalle is JSON, use simple string repr or empty if None
-            # Truncate detail to avoid huge cells
-            detail_str = str(log.detalle)[:50] + "..." if log.detalle else ""
-            if len(str(log.detalle)) < 50: detail_str = str(log.detalle) or ""
-
-            data.append([
-                Paragraph(date_str, styles['Normal']),
-                Paragraph(user_str, styles['Normal']),
-                Paragraph(log.accion, styles['Normal']),
-                Paragraph(log.entidad, styles['Normal']),
-                Paragraph(detail_str, styles['Normal']), # Use Paragraph to wrap text
-            ])
-            
-        # Table Styling
-        # Widths: A4 Landscape is ~840pts.
-        # 100, 100, 80, 100, 300 = 680. Fits. 
-        t = Table(data, colWidths=[110, 100, 80, 120, 300]) 
-        t.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 0), (-1, 0), colors.gray),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ]))
-        
-        elements.append(t)
-        doc.build(elements)
-        return response
+
+        if wants_async(request):
+            ids = list(logs.values_list('id', flat=True))
+            return accepted_response(jobs.enqueue("export_auditoria_pdf", {"ids": ids}, request.user))
+
+        response = HttpResponse(content_type='application/pdf')
+        response['Content-Disposition'] = 'attachment; filename="auditoria.pdf"'
+        return render_auditoria_pdf(logs, response)
 
     @action(detail=False, methods=['get'])
     def export_xlsx(self, request):
-        import pandas as pd
         from django.http import HttpResponse
 
         logs = self.filter_queryset(self.get_queryset())
-        data = []
-        for log in logs:
-            data.append({
-                "Fecha": log.fecha.strftime("%Y-%m-%d %H:%M") if log.fecha else "",
-                "Usuario": log.usuario.username if log.usuario else "Sistema",
-                "Accion": log.accion,
-                "Entidad": log.entidad,
-                "Detalle": log.detalle
-            })
-        
-        df = pd.DataFrame(data)
+
+        if wants_async(request):
+            ids = list(logs.values_list('id', flat=True))
+            return accepted_response(jobs.enqueue("export_auditoria_xlsx", {"ids": ids}, request.user))
+
         response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
         response['Content-Disposition'] = 'attachment; filename="auditoria.xlsx"'
-        df.to_excel(response, index=False)
-        return response
+        return render_auditoria_xlsx(logs, response)
 
 # ...
 
@@ -305,89 +218,58 @@ class Certificado70ViewSet(viewsets.ModelViewSet):
         except Empresa.DoesNotExist:
             return Response({"error": "Empresa no encontrada"}, status=404)
 
-        # Logic to aggregate data and create Certificates 70 per partner
-        # 1. Get partners (All or Single)
-        if propietario_id:
-            socios = Propietario.objects.filter(empresa=empresa, id=propietario_id)
-        else:
-            socios = Propietario.objects.filter(empresa=empresa)
-        
-        created_count = 0
-        last_cert = None
-        
-        for socio in socios:
-            # 2. Get tax movements for this partner in that year
-            calificaciones = CalificacionTributaria.objects.filter(
-                empresa=empresa,
-                propietario=socio,
-                fecha__year=anio,
-                estado='vigente'
-            )
-            
-            # Even if no movements, sometimes certificates are needed with 0 values? 
-            # For now, skip if empty to avoid noise, unless requested explicitly.
-            if not calificaciones.exists():
-                continue
-
-            # 3. Calculate Totals and Details
-            totales = {
-                'monto_historico': 0, 'monto_actualizado': 0,
-                'rai': 0, 'ddan': 0, 'rex': 0, 'inr': 0, 'sac': 0,
-                'credito_con_dev': 0, 'credito_sin_dev': 0, 'credito_restitucion': 0,
-                'isfut': 0, 'otros_creditos': 0
-            }
-            
-            detalles_list = []
-            
-            for cal in calificaciones:
-                # Map imputation string to key (naive)
-                imputacion = (cal.imputacion or "").lower()
-                
-                # Update Totals
-                totales['monto_historico'] += cal.monto_original
-                totales['monto_actualizado'] += (cal.monto_reajustado or cal.monto_original)
-                
-                if 'rai' in imputacion: totals_key = 'rai'
-                elif 'rex' in imputacion: totals_key = 'rex'
-                elif 'ddan' in imputacion: totals_key = 'ddan'
-                else: totals_key = None
-                
-                if totals_key:
-                    totales[totals_key] += (cal.monto_reajustado or cal.monto_original)
-                
-                detalles_list.append({
-                    "fecha": cal.fecha.strftime("%Y-%m-%d"),
-                    "tipo": cal.tipo,
-                    "monto_historico": cal.monto_original,
-                    "monto_actualizado": (cal.monto_reajustado or cal.monto_original),
-                    "imputacion": cal.imputacion
-                })
-
-            # 4. Create or Update Cert70
-            cert, created = Certificado70.objects.update_or_create(
-                empresa=empresa,
-                propietario=socio,
-                anio_comercial=anio,
-                defaults={
-                    'folio': 100 + created_count + 1, # Dummy folio logic
-                    'totales': totales,
-                    'detalles': detalles_list,
-                    'creado_por': request.user
-                }
-            )
-            created_count += 1
-            last_cert = cert
+        if wants_async(request):
+            return accepted_response(jobs.enqueue("cert70", {
+                "empresa_id": empresa.id,
+                "propietario_id": propietario_id,
+                "anio": anio,
+            }, request.user))
+
+        created_count, last_cert = generate_certificates(empresa, anio, request.user, propietario_id)
 
         if created_count == 1 and last_cert:
-             # Return the single object structure if only 1 generated (for frontend download link)
+             # Return the single object structure if only 1 generated (for frontend download link);
+             # its PDF is rendered by the first descargar, not here
              serializer = self.get_serializer(last_cert)
              return Response(serializer.data)
 
         return Response({"message": f"Se han generado {created_count} certificados para {empresa.razon_social}", "count": created_count})
 
+    @action(detail=True, methods=['get'])
+    def descargar(self, request, pk=None):
+        """PDF of one certificate, rendered only if no cached render of the same inputs exists."""
+        from django.http import FileResponse
+
+        certificado = self.get_object()
+        path = cert70_pdf_cache.get_or_render(certificado)
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=f"Cert70_{certificado.id}.pdf")
+
+    @action(detail=False, methods=['get'], url_path='descargar_zip')
+    def descargar_zip(self, request):
+        """PDFs of the visible certificates (?empresa_id=, ?anio=) in one ZIP, rendered in parallel."""
+        from django.http import HttpResponse
+        from .services.cert70_render import render_zip
+
+        queryset = self.filter_queryset(self.get_queryset())
+        if request.query_params.get('empresa_id'):
+            queryset = queryset.filter(empresa_id=request.query_params['empresa_id'])
+        if request.query_params.get('anio'):
+            queryset = queryset.filter(anio_comercial=request.query_params['anio'])
+        ids = list(queryset.order_by('empresa_id', 'propietario_id', 'anio_comercial').values_list('id', flat=True))
+        if not ids:
+            return Response({"error": "No hay certificados para los filtros indicados"}, status=404)
+
+        if wants_async(request):
+            return accepted_response(jobs.enqueue("cert70_zip", {"ids": ids}, request.user))
+
+        response = HttpResponse(content_type='application/zip')
+        response['Content-Disposition'] = 'attachment; filename="certificados70.zip"'
+        render_zip(ids, response)
+        return response
+
     def get_permissions(self):
         # View: All roles
-        if self.action in ['list', 'retrieve', 'descargar']:
+        if self.action in ['list', 'retrieve', 'descargar', 'descargar_zip']:
              permission_classes = [IsAuthenticated & (IsAdminGeneral | IsAdminTributario | IsAuditorInterno | IsCorredor)]
         # Generate: Admin/Tributario
         elif self.action == 'generar':
@@ -435,6 +317,30 @@ class CorredorViewSet(viewsets.ModelViewSet):
         except Corredor.DoesNotExist:
             return Response({"error": "Perfil de corredor no encontrado"}, status=404)
 
+class TareaViewSet(viewsets.ReadOnlyModelViewSet):
+    """Status, progress and result of background jobs (enqueued with ?async=1)."""
+    serializer_class = TareaSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        user = self.request.user
+        queryset = Tarea.objects.all().order_by("-creado_en")
+        # Users only see their own jobs; Admin General sees every job
+        if not (user.role == 'admin' or user.is_superuser):
+            queryset = queryset.filter(creado_por=user)
+        return queryset
+
+    @action(detail=True, methods=['get'])
+    def descargar(self, request, pk=None):
+        from django.http import FileResponse
+        import os
+
+        tarea = self.get_object()
+        archivo = (tarea.resultado or {}).get('archivo') if tarea.estado == 'completada' else None
+        if not archivo or not os.path.exists(archivo):
+            return Response({"error": "La tarea no tiene un archivo disponible"}, status=404)
+        return FileResponse(open(archivo, 'rb'), as_attachment=True, filename=tarea.resultado.get('filename'))
+
 @api_view(['GET'])
 def health(request):
     return Response({"status": "ok", "service": "nuam-backend"})
@@ -477,11 +383,16 @@ def dashboard_stats(request):
             "detalles": log.descripcion or ""
         })
 
+    # 5. Cert70 totals of the year (?anio=, current year by default), from the running totals table
+    anio = request.query_params.get('anio', '')
+    cert70 = cert70_totals.resumen(int(anio) if anio.isdigit() else now.year)
+
     data = {
         "calificaciones_vigentes": calificaciones_vigentes,
         "empresas_activas": empresas_count,
         "auditorias_recientes": auditorias_recent_count,
-        "actividad_reciente": activity_data
+        "actividad_reciente": activity_data,
+        "cert70": cert70,
     }
     return Response(data)
 
@@ -513,6 +424,13 @@ class InformeGestionView(APIView):
             except:
                 return Response({"error": "Perfil corredor inválido"}, status=403)
 
+        if wants_async(request):
+            return accepted_response(jobs.enqueue("informe_gestion", {
+                "empresa_id": empresa.id,
+                "start_date": start_date,
+                "end_date": end_date,
+            }, request.user))
+
         pdf_buffer = ReportGenerator(empresa, start_date, end_date, request.user).generate()
         
         filename = f"Informe_Gestion_{empresa.rut}_{start_date}_{end_date}.pdf"
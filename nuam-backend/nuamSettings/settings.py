@@ -183,3 +183,71 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Email Configuration
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 FRONTEND_URL = os.getenv('FRONTEND_URL', 'https://nuam-dev.netlify.app')
+
+# Bulk Upload
+# Rows per set-based ingest chunk (one IN lookup + one bulk_create per model per chunk)
+BULK_UPLOAD_CHUNK_SIZE = int(os.getenv('BULK_UPLOAD_CHUNK_SIZE', '1000'))
+
+# Background Jobs (python manage.py procesar_tareas)
+TAREAS_POLL_INTERVAL = float(os.getenv('TAREAS_POLL_INTERVAL', '2'))
+TAREAS_MAX_INTENTOS = int(os.getenv('TAREAS_MAX_INTENTOS', '3'))
+# Seconds before the first retry, doubled on every further attempt
+TAREAS_RETRY_BACKOFF = int(os.getenv('TAREAS_RETRY_BACKOFF', '30'))
+# Jobs without a heartbeat for this long are considered orphaned and requeued
+TAREAS_HEARTBEAT_TIMEOUT = int(os.getenv('TAREAS_HEARTBEAT_TIMEOUT', '600'))
+
+# Resumable uploads (/api/cargas/)
+CARGA_FRAGMENTO_SIZE = int(os.getenv('CARGA_FRAGMENTO_SIZE', str(8 * 1024 * 1024)))
+CARGA_FRAGMENTO_MAX = int(os.getenv('CARGA_FRAGMENTO_MAX', str(64 * 1024 * 1024)))
+CARGA_MAX_TAMANO = int(os.getenv('CARGA_MAX_TAMANO', str(2 * 1024 ** 3)))
+# Uploads without activity for this long are deleted with their .part file (manage.py limpiar_cargas)
+CARGA_EXPIRA_HORAS = int(os.getenv('CARGA_EXPIRA_HORAS', '24'))
+
+# ?dry_run=1 import previews: max sample rows returned per entity and category
+IMPORT_PREVIEW_SAMPLE_SIZE = int(os.getenv('IMPORT_PREVIEW_SAMPLE_SIZE', '20'))
+
+# ZIP uploads: parser processes (0 = one per CPU) and max total uncompressed size
+ZIP_INGEST_WORKERS = int(os.getenv('ZIP_INGEST_WORKERS', '0'))
+ZIP_MAX_TAMANO = int(os.getenv('ZIP_MAX_TAMANO', str(2 * 1024 ** 3)))
+
+# PDF parsing: documents with at least PDF_PARSER_PARALLEL_MIN_PAGES pages are
+# split across PDF_PARSER_WORKERS processes (0 = one per CPU, 1 = always serial), also
+# inside the parser sandbox, where each one gets its own PDF_SANDBOX_MEMORY_MB cap
+PDF_PARSER_WORKERS = int(os.getenv('PDF_PARSER_WORKERS', '0'))
+PDF_PARSER_PARALLEL_MIN_PAGES = int(os.getenv('PDF_PARSER_PARALLEL_MIN_PAGES', '50'))
+
+# PDF parse cache (resultados_parseo table), keyed by file SHA-256 + parser version
+PARSE_CACHE_ENABLED = os.getenv('PARSE_CACHE_ENABLED', 'True') == 'True'
+PARSE_CACHE_MAX_BYTES = int(os.getenv('PARSE_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+# Hit/miss counters are written every PARSE_CACHE_FLUSH_EVERY lookups or PARSE_CACHE_FLUSH_SECONDS per process
+PARSE_CACHE_FLUSH_EVERY = int(os.getenv('PARSE_CACHE_FLUSH_EVERY', '50'))
+PARSE_CACHE_FLUSH_SECONDS = int(os.getenv('PARSE_CACHE_FLUSH_SECONDS', '30'))
+
+# PDF text engine: "pdfplumber" (layout analysis for every page) or "hybrid"
+# (pdfium text, pdfplumber tables only on pages that contain a RUT)
+PDF_TEXT_ENGINE = os.getenv('PDF_TEXT_ENGINE', 'pdfplumber')
+
+# Layout templates for known PDF formats (calificaciones/services/layouts/*.json);
+# extra template directories separated by os.pathsep
+PDF_LAYOUT_TEMPLATES = os.getenv('PDF_LAYOUT_TEMPLATES', 'True') == 'True'
+PDF_LAYOUT_DIRS = [d for d in os.getenv('PDF_LAYOUT_DIRS', '').split(os.pathsep) if d]
+
+# PDF parsing runs in a pool of sandboxed worker processes (services/parser_sandbox.py):
+# PDF_SANDBOX_WORKERS processes (0 = one per CPU), each killed after PDF_SANDBOX_TIMEOUT
+# seconds on one document and capped at PDF_SANDBOX_MEMORY_MB of address space
+# (0 = no limit); workers are replaced after PDF_SANDBOX_MAX_TASKS documents (0 = never)
+PDF_SANDBOX_ENABLED = os.getenv('PDF_SANDBOX_ENABLED', 'True') == 'True'
+PDF_SANDBOX_WORKERS = int(os.getenv('PDF_SANDBOX_WORKERS', '0'))
+PDF_SANDBOX_TIMEOUT = int(os.getenv('PDF_SANDBOX_TIMEOUT', '120'))
+PDF_SANDBOX_MEMORY_MB = int(os.getenv('PDF_SANDBOX_MEMORY_MB', '1024'))
+PDF_SANDBOX_MAX_TASKS = int(os.getenv('PDF_SANDBOX_MAX_TASKS', '200'))
+
+# Batch Cert70 rendering into one ZIP (services/cert70_render.py): render processes (0 = one per CPU)
+CERT70_RENDER_WORKERS = int(os.getenv('CERT70_RENDER_WORKERS', '0'))
+
+# Rendered Cert70 PDFs are cached by content under MEDIA_ROOT/certificados/cache
+# (services/cert70_pdf_cache.py); `manage.py limpiar_pdfs_cert70` drops orphaned files
+# older than CERT70_PDF_CACHE_MAX_AGE_DAYS and keeps the directory under CERT70_PDF_CACHE_MAX_BYTES
+CERT70_PDF_CACHE_ENABLED = os.getenv('CERT70_PDF_CACHE_ENABLED', 'True') == 'True'
+CERT70_PDF_CACHE_MAX_BYTES = int(os.getenv('CERT70_PDF_CACHE_MAX_BYTES', str(1024 ** 3)))
+CERT70_PDF_CACHE_MAX_AGE_DAYS = int(os.getenv('CERT70_PDF_CACHE_MAX_AGE_DAYS', '30'))
@@ -19,7 +19,7 @@ from django.urls import path
 from calificaciones.views import health, dashboard_stats
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from rest_framework.routers import DefaultRouter
-from calificaciones.views import CalificacionTributariaViewSet, EmpresaViewSet, PropietarioViewSet, AuditoriaViewSet, Certificado70ViewSet, AccionViewSet, CorredorViewSet
+from calificaciones.views import CalificacionTributariaViewSet, EmpresaViewSet, PropietarioViewSet, AuditoriaViewSet, Certificado70ViewSet, AccionViewSet, CorredorViewSet, TareaViewSet
 
 from core.user_views import UserViewSet, MeView
 
@@ -32,11 +32,13 @@ router.register("users", UserViewSet, basename="users")
 router.register("certificados70", Certificado70ViewSet, basename="certificados70")
 router.register("acciones", AccionViewSet, basename="acciones")
 router.register("corredores", CorredorViewSet, basename="corredores")
+router.register("tareas", TareaViewSet, basename="tareas")
 
 from django.urls import path, include
 
 from core.mfa_views import SetupMFAView, VerifyMFAView, LoginMFAView, LoginVerifyView
-from calificaciones.bulk_upload_views import BulkUploadView, PDFUploadView, BulkCreateView
+from calificaciones.bulk_upload_views import BulkUploadView, PDFUploadView, BulkCreateView, ZipUploadView, ParseCacheView
+from calificaciones.chunked_upload_views import CargaFragmentadaView, FragmentoView, FinalizarCargaView
 from calificaciones.views import InformeGestionView
 from core.register_view import RegisterView
 from core.password_reset_views import RequestPasswordResetView, ResetPasswordConfirmView
@@ -67,7 +69,15 @@ urlpatterns = [
     # Bulk Upload
     path("api/calificaciones/upload/", BulkUploadView.as_view()),
     path("api/calificaciones/upload-pdf/", PDFUploadView.as_view()),
+    path("api/calificaciones/upload-zip/", ZipUploadView.as_view()),
     path("api/calificaciones/create-bulk/", BulkCreateView.as_view()),
+    path("api/calificaciones/parse-cache/", ParseCacheView.as_view()),
+
+    # Resumable (chunked) uploads
+    path("api/cargas/", CargaFragmentadaView.as_view()),
+    path("api/cargas/<uuid:pk>/", CargaFragmentadaView.as_view()),
+    path("api/cargas/<uuid:pk>/fragmentos/<int:numero>/", FragmentoView.as_view()),
+    path("api/cargas/<uuid:pk>/finalizar/", FinalizarCargaView.as_view()),
 
     path("api/", include(router.urls)),
 ]
@@ -27,7 +27,7 @@ def test_bulk_upload_success(auth_client):
         'rut_propietario': ['22222222-2'],
         'nombre_propietario': ['Propietario Bulk'],
         'fecha': ['2023-01-01'],
-        'tipo_calificacion': ['DJ1948'],
+        'tipo_calificacion': ['retiro'],
         'monto': [500000]
     }
     df = pd.DataFrame(data)
@@ -46,6 +46,13 @@ def test_bulk_upload_success(auth_client):
     assert response.data["created"] == 1
     assert CalificacionTributaria.objects.count() == 1
 
+    # One trail entry per row plus the upload summary pointing at the file
+    from calificaciones.models import Auditoria, ArchivoCargado
+    assert Auditoria.objects.filter(accion="crear", entidad="CalificacionTributaria").count() == 1
+    resumen = Auditoria.objects.get(accion="carga")
+    assert resumen.entidad_id == ArchivoCargado.objects.get().id
+    assert resumen.detalle["resultado"]["created"] == 1
+
 @pytest.mark.django_db
 def test_bulk_upload_missing_columns(auth_client):
     # Create Excel with missing columns
@@ -64,3 +71,296 @@ def test_bulk_upload_missing_columns(auth_client):
 
     assert response.status_code == status.HTTP_400_BAD_REQUEST
     assert "Missing columns" in response.data["error"]
+
+@pytest.mark.django_db
+def test_bulk_upload_dedupes_and_reports_row_errors(auth_client):
+    from calificaciones.models import Empresa, Propietario, Auditoria
+    existing = Empresa.objects.create(rut='11111111-1', razon_social='Empresa Existente')
+
+    data = {
+        'rut_empresa': ['11111111-1', '11111111-1', '33333333-3', '33333333-3'],
+        'razon_social': ['Empresa Bulk', 'Empresa Bulk', 'Otra Empresa', 'Otra Empresa'],
+        'rut_propietario': ['22222222-2', '22222222-2', '44444444-4', '44444444-4'],
+        'nombre_propietario': ['Prop A', 'Prop A', 'Prop B', 'Prop B'],
+        'fecha': ['2023-01-01', '2023-02-01', 'no es fecha', '2023-03-01'],
+        'tipo_calificacion': ['retiro', 'dividendo', 'retiro', 'remesa'],
+        'monto': [100, 200, 300, 400]
+    }
+    file_obj = io.BytesIO(pd.DataFrame(data).to_csv(index=False).encode())
+    file_obj.name = "test.csv"
+
+    response = auth_client.post(
+        "/api/calificaciones/upload/?chunk_size=2",
+        {"file": file_obj},
+        format="multipart"
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["created"] == 3
+    assert response.data["rows"] == 4
+    assert "rows_per_sec" in response.data
+    assert len(response.data["errors"]) == 1
+    assert response.data["errors"][0].startswith("Row 4:")
+
+    # Existing empresa reused, new one created once; one propietario per (empresa, rut)
+    assert Empresa.objects.count() == 2
+    assert CalificacionTributaria.objects.filter(empresa=existing).count() == 2
+    assert Propietario.objects.count() == 2
+    assert Auditoria.objects.filter(entidad="CalificacionTributaria", accion="crear").count() == 3
+
+def _csv(rows=1):
+    data = {
+        'rut_empresa': ['11111111-1'] * rows,
+        'razon_social': ['Empresa Hash'] * rows,
+        'rut_propietario': ['22222222-2'] * rows,
+        'nombre_propietario': ['Prop Hash'] * rows,
+        'fecha': ['2023-01-01'] * rows,
+        'tipo_calificacion': ['retiro'] * rows,
+        'monto': [1000] * rows
+    }
+    file_obj = io.BytesIO(pd.DataFrame(data).to_csv(index=False).encode())
+    file_obj.name = "hash.csv"
+    return file_obj
+
+@pytest.mark.django_db
+def test_bulk_upload_same_file_is_idempotent(auth_client):
+    from calificaciones.models import ArchivoCargado
+    first = auth_client.post("/api/calificaciones/upload/", {"file": _csv(2)}, format="multipart")
+    assert first.data["created"] == 2
+
+    second = auth_client.post("/api/calificaciones/upload/", {"file": _csv(2)}, format="multipart")
+    assert second.status_code == status.HTTP_200_OK
+    assert second.data["duplicado"] is True
+    assert second.data["created"] == 2
+    assert CalificacionTributaria.objects.count() == 2
+    assert ArchivoCargado.objects.count() == 1
+    assert CalificacionTributaria.objects.filter(archivo_origen_id=second.data["archivo_id"]).count() == 2
+
+    # ?force=1 ingests again
+    forced = auth_client.post("/api/calificaciones/upload/?force=1", {"file": _csv(2)}, format="multipart")
+    assert "duplicado" not in forced.data
+    assert CalificacionTributaria.objects.count() == 4
+
+@pytest.mark.django_db
+def test_pdf_upload_same_file_skips_parse(auth_client, settings, tmp_path):
+    from unittest.mock import patch
+    from calificaciones.models import ArchivoCargado
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.PDF_SANDBOX_ENABLED = False  # parse_data is patched in this process
+    parsed = {"rut_empresa": "11111111-1", "rut_propietario": None, "fecha": "01/01/2023", "calificaciones": []}
+
+    def pdf():
+        file_obj = io.BytesIO(b"%PDF-1.4 same bytes")
+        file_obj.name = "dj.pdf"
+        return file_obj
+
+    with patch("calificaciones.services.pdf_parser.PDFParser.parse_data", return_value=parsed) as parse:
+        first = auth_client.post("/api/calificaciones/upload-pdf/", {"file": pdf()}, format="multipart")
+        second = auth_client.post("/api/calificaciones/upload-pdf/", {"file": pdf()}, format="multipart")
+
+    assert first.status_code == second.status_code == status.HTTP_200_OK
+    assert parse.call_count == 1
+    assert second.data["duplicado"] is True
+    assert second.data["rut_empresa"] == "11111111-1"
+    assert ArchivoCargado.objects.count() == 1
+
+@pytest.mark.django_db
+def test_pdf_upload_stream(auth_client, settings, tmp_path):
+    import json
+    from calificaciones.models import ArchivoCargado
+    from calificaciones.tests.test_pdf_parser import build_dj1948_pdf
+    settings.MEDIA_ROOT = str(tmp_path)
+    path = build_dj1948_pdf(str(tmp_path / "dj.pdf"), pages=3)
+
+    def stream():
+        with open(path, "rb") as f:
+            response = auth_client.post("/api/calificaciones/upload-pdf/?stream=1", {"file": f}, format="multipart")
+        assert response["Content-Type"] == "application/x-ndjson"
+        return [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+
+    records = stream()
+    assert records[0] == {"record": "header", "rut_empresa": "76.543.210-3", "rut_propietario": None, "fecha": "31/12/2023"}
+    rows = records[1:-1]
+    assert [r["record"] for r in rows] == ["calificacion"] * 6
+    assert rows[1]["fecha"] == "31/12/2023"  # no date of its own: document date
+    assert records[-1]["record"] == "trailer"
+    assert records[-1]["total"] == 6
+    archivo = ArchivoCargado.objects.get(id=records[-1]["archivo_id"])
+    assert len(archivo.metadata["calificaciones"]) == 6
+
+    # Same bytes again: the stored result is replayed
+    again = stream()
+    assert again[-1]["duplicado"] is True
+    assert [r for r in again if r["record"] == "calificacion"] == rows
+    assert ArchivoCargado.objects.count() == 1
+
+@pytest.mark.django_db
+def test_bulk_create_upserts_in_batches(auth_client):
+    from calificaciones.models import Auditoria, Propietario
+    payload = {
+        "rut_empresa": "76543210-3",
+        "razon_social": "Empresa DJ",
+        "calificaciones": [
+            {"rut_propietario": "11111111-1", "nombre_propietario": "Ana", "fecha": "31/12/2023", "tipo": "retiro", "monto": 1000},
+            {"rut_propietario": "22222222-2", "fecha": "2023-06-30", "tipo": "dividendo", "monto": "2500"},
+            {"rut_propietario": "11111111-1", "fecha": "01/03/2023", "tipo": "remesa", "monto": 300, "imputacion": "RAI"},
+            {"fecha": "01/03/2023", "tipo": "retiro", "monto": 1},
+        ]
+    }
+
+    response = auth_client.post("/api/calificaciones/create-bulk/", {"data": payload}, format="json")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["created"] == 3
+    assert response.data["updated"] == 0
+    assert len(response.data["errors"]) == 1
+    assert Propietario.objects.count() == 2
+    assert CalificacionTributaria.objects.get(tipo="retiro").fecha.isoformat() == "2023-12-31"
+    assert Auditoria.objects.filter(accion="crear").count() == 3
+
+    # Confirming the same preview again updates instead of duplicating
+    payload["calificaciones"][0]["imputacion"] = "REX"
+    response = auth_client.post("/api/calificaciones/create-bulk/", {"data": payload}, format="json")
+    assert response.data["created"] == 0
+    assert response.data["updated"] == 3
+    assert CalificacionTributaria.objects.count() == 3
+    assert CalificacionTributaria.objects.get(tipo="retiro").imputacion == "REX"
+    modificada = Auditoria.objects.filter(accion="modificar").order_by('id').first()
+    assert modificada.detalle["antes"]["imputacion"] == "SIN CLASIFICAR"
+
+@pytest.mark.django_db
+def test_bulk_upload_dry_run_writes_nothing(auth_client):
+    from calificaciones.models import Empresa, Propietario, Auditoria
+    empresa = Empresa.objects.create(rut="11111111-1", razon_social="Existente")
+    propietario = Propietario.objects.create(empresa=empresa, rut="22222222-2", nombre="Ana")
+    CalificacionTributaria.objects.create(
+        empresa=empresa, propietario=propietario, fecha="2023-01-01", tipo="retiro", monto_original=100
+    )
+    Auditoria.objects.all().delete()
+
+    df = pd.DataFrame({
+        'rut_empresa': ['11111111-1', '11111111-1', '76543210-3', '11111111-1'],
+        'razon_social': ['Existente', 'Existente', 'Nueva', 'Existente'],
+        'rut_propietario': ['22222222-2', '12345678-5', '22222222-2', '22222222-2'],
+        'nombre_propietario': ['Ana', 'Beto', 'Ana', 'Ana'],
+        'fecha': ['2023-01-01', '2023-02-01', '2023-03-01', 'no es fecha'],
+        'tipo_calificacion': ['retiro', 'dividendo', 'remesa', 'retiro'],
+        'monto': [100, 200, 300, 400],
+    })
+    file_obj = io.BytesIO(df.to_csv(index=False).encode())
+    file_obj.name = "preview.csv"
+
+    response = auth_client.post("/api/calificaciones/upload/?dry_run=1", {"file": file_obj}, format="multipart")
+    assert response.status_code == status.HTTP_200_OK
+    data = response.data
+    assert data["dry_run"] is True
+    assert data["rejected"] == 1
+    assert (data["empresas"]["created"], data["empresas"]["unchanged"]) == (1, 1)
+    assert (data["propietarios"]["created"], data["propietarios"]["unchanged"]) == (2, 1)
+    assert data["calificaciones"]["created"] == 3
+    assert data["calificaciones"]["duplicates"] == 1
+    assert data["empresas"]["samples"]["created"][0]["rut"] == "76543210-3"
+    assert CalificacionTributaria.objects.count() == 1
+    assert Empresa.objects.count() == 1
+    assert not Auditoria.objects.exists()
+
+@pytest.mark.django_db
+def test_bulk_create_dry_run_diff(auth_client):
+    payload = {
+        "rut_empresa": "76543210-3",
+        "rut_propietario": "11111111-1",
+        "calificaciones": [
+            {"fecha": "31/12/2023", "tipo": "retiro", "monto": 1000},
+            {"fecha": "30/06/2023", "tipo": "dividendo", "monto": 2500},
+        ]
+    }
+    auth_client.post("/api/calificaciones/create-bulk/", {"data": payload}, format="json")
+
+    payload["calificaciones"][0]["imputacion"] = "RAI"
+    payload["calificaciones"].append({"fecha": "01/01/2024", "tipo": "remesa", "monto": 7})
+    response = auth_client.post("/api/calificaciones/create-bulk/?dry_run=1", {"data": payload}, format="json")
+    data = response.data
+    assert data["dry_run"] is True
+    assert data["empresas"]["unchanged"] == 1
+    assert data["propietarios"]["unchanged"] == 1
+    assert (data["calificaciones"]["created"], data["calificaciones"]["updated"], data["calificaciones"]["unchanged"]) == (1, 1, 1)
+    assert data["calificaciones"]["samples"]["updated"][0]["despues"]["imputacion"] == "RAI"
+    assert CalificacionTributaria.objects.count() == 2
+
+@pytest.mark.django_db
+def test_bulk_upload_audits_pks_without_returning(auth_client, monkeypatch):
+    # MySQL: bulk_create leaves pks unset, the created rows are read back
+    from django.db import connection
+    from calificaciones.models import Auditoria, TotalCert70
+    monkeypatch.setattr(type(connection.features), "can_return_rows_from_bulk_insert", False)
+    file_obj = _csv(2)
+    data = pd.read_csv(file_obj).assign(estado="vigente", monto=[1000, 2000])
+    file_obj = io.BytesIO(data.to_csv(index=False).encode())
+    file_obj.name = "mysql.csv"
+
+    response = auth_client.post("/api/calificaciones/upload/", {"file": file_obj}, format="multipart")
+    assert response.data["created"] == 2
+    entradas = Auditoria.objects.filter(entidad="CalificacionTributaria", accion="crear")
+    assert sorted(entradas.values_list("entidad_id", flat=True)) == sorted(CalificacionTributaria.objects.values_list("id", flat=True))
+    assert TotalCert70.objects.get().monto_historico == 3000
+
+@pytest.mark.django_db
+def test_bulk_upload_pks_ignore_concurrent_identical_rows(auth_client, monkeypatch):
+    # Another upload inserts the same row between the id snapshot and our insert
+    from django.db import connection
+    from calificaciones.models import ArchivoCargado, Auditoria, Propietario
+    monkeypatch.setattr(type(connection.features), "can_return_rows_from_bulk_insert", False)
+    bulk_create = CalificacionTributaria.objects.bulk_create
+
+    def concurrent_bulk_create(objs, **kwargs):
+        otro = ArchivoCargado.objects.create(nombre_archivo="otro.csv")
+        CalificacionTributaria.objects.create(**{
+            f: getattr(objs[0], f) for f in ("empresa_id", "propietario_id", "fecha", "tipo", "monto_original", "creado_por_id")
+        }, archivo_origen=otro)
+        return bulk_create(objs, **kwargs)
+
+    monkeypatch.setattr(CalificacionTributaria.objects, "bulk_create", concurrent_bulk_create)
+    response = auth_client.post("/api/calificaciones/upload/", {"file": _csv(1)}, format="multipart")
+
+    assert response.data["created"] == 1
+    mine = CalificacionTributaria.objects.get(archivo_origen__nombre_archivo="hash.csv")
+    assert Auditoria.objects.filter(entidad="CalificacionTributaria", accion="crear", entidad_id=mine.pk).count() == 1
+
+@pytest.mark.django_db
+def test_bulk_create_audits_pks_without_returning(auth_client, monkeypatch):
+    from django.db import connection
+    from calificaciones.models import Auditoria
+    monkeypatch.setattr(type(connection.features), "can_return_rows_from_bulk_insert", False)
+    payload = {
+        "rut_empresa": "76543210-3",
+        "calificaciones": [
+            {"rut_propietario": "11111111-1", "fecha": "31/12/2023", "tipo": "retiro", "monto": 1000},
+            {"rut_propietario": "22222222-2", "fecha": "30/06/2023", "tipo": "dividendo", "monto": 2500},
+        ]
+    }
+    response = auth_client.post("/api/calificaciones/create-bulk/", {"data": payload}, format="json")
+    assert response.data["created"] == 2
+    entradas = Auditoria.objects.filter(entidad="CalificacionTributaria", accion="crear")
+    assert sorted(entradas.values_list("entidad_id", flat=True)) == sorted(CalificacionTributaria.objects.values_list("id", flat=True))
+
+@pytest.mark.django_db
+def test_bulk_upload_rejects_values_over_max_length(auth_client):
+    df = pd.DataFrame({
+        'rut_empresa': ['11111111-1', '000011111111-1', '11111111-1'],
+        'razon_social': ['Empresa Bulk', 'Empresa Bulk', 'x' * 300],
+        'rut_propietario': ['22222222-2'] * 3,
+        'nombre_propietario': ['Propietario Bulk'] * 3,
+        'fecha': ['2023-01-01'] * 3,
+        'tipo_calificacion': ['retiro'] * 3,
+        'monto': [1, 2, 3],
+    })
+    file_obj = io.BytesIO(df.to_csv(index=False).encode())
+    file_obj.name = "largos.csv"
+
+    response = auth_client.post("/api/calificaciones/upload/", {"file": file_obj}, format="multipart")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["created"] == 1
+    assert {(e["fila"], e["columna"]) for e in response.data["validation_errors"]} == {
+        (3, "rut_empresa"), (4, "razon_social")
+    }
+    assert CalificacionTributaria.objects.count() == 1
@@ -43,11 +43,15 @@ def test_generate_certificado_70(auth_client):
     
     assert response.status_code == status.HTTP_200_OK
     assert response.data["anio_comercial"] == 2023
-    assert response.data["archivo_pdf"] is not None
+    # Rendered on the first download, not by generar
+    assert response.data["archivo_pdf"] is None
     
     # Verify Model Created
     cert = Certificado70.objects.get(empresa=empresa, propietario=propietario, anio_comercial=2023)
     assert cert.totales["monto_historico"] == 1000000
+    download = auth_client.get(f"/api/certificados70/{cert.id}/descargar/")
+    assert download.status_code == status.HTTP_200_OK
+    cert.refresh_from_db()
     assert os.path.exists(cert.archivo_pdf)
 
     # Cleanup PDF
@@ -0,0 +1,118 @@
+from datetime import date
+import pytest
+from calificaciones.models import CalificacionTributaria, Certificado70, CreditoIDPC, Empresa, Propietario
+from calificaciones.services.cert70_batch import generate_certificates
+from calificaciones.services.cert70_calculator import Cert70Calculator
+
+pytestmark = pytest.mark.django_db
+
+
+def _socios(empresa, n):
+    return [Propietario.objects.create(empresa=empresa, rut=f"{10000000 + i}-{i % 10}", nombre=f"Socio {i}") for i in range(n)]
+
+
+def _cal(empresa, socio, fecha, monto, imputacion="RAI", reajustado=None, estado="vigente"):
+    return CalificacionTributaria.objects.create(
+        empresa=empresa, propietario=socio, fecha=fecha, tipo="retiro",
+        monto_original=monto, monto_reajustado=reajustado, imputacion=imputacion, estado=estado,
+    )
+
+
+def test_generates_one_certificate_per_partner_with_movements():
+    empresa = Empresa.objects.create(rut="70707070-7", razon_social="Empresa Cert70")
+    a, b, sin_movimientos = _socios(empresa, 3)
+    rai = _cal(empresa, a, date(2023, 5, 1), 1000, "RAI", reajustado=1100)
+    _cal(empresa, a, date(2023, 2, 1), 500, "DDAN")
+    CreditoIDPC.objects.create(calificacion=rai, tipo="Con devolución", monto=270)
+    CreditoIDPC.objects.create(calificacion=rai, tipo="ISFUT", monto=30)
+    _cal(empresa, a, date(2022, 5, 1), 999)  # other year
+    _cal(empresa, a, date(2023, 6, 1), 999, estado="pendiente")
+    _cal(empresa, b, date(2023, 7, 1), 300, "REX")
+    _cal(empresa, sin_movimientos, date(2022, 1, 1), 10)
+
+    count, last = generate_certificates(empresa, 2023, None)
+
+    assert count == 2
+    assert last.propietario == b and last.pk is not None
+    cert_a = Certificado70.objects.get(propietario=a, anio_comercial=2023)
+    assert cert_a.folio == 101
+    assert cert_a.totales["monto_historico"] == 1500
+    assert cert_a.totales["monto_actualizado"] == 1600
+    assert (cert_a.totales["rai"], cert_a.totales["ddan"], cert_a.totales["rex"]) == (1100, 500, 0)
+    assert (cert_a.totales["credito_con_dev"], cert_a.totales["isfut"], cert_a.totales["otros_creditos"]) == (270, 30, 0)
+    assert [d["fecha"] for d in cert_a.detalles] == ["2023-05-01", "2023-02-01"]
+    assert cert_a.detalles[0]["rai"] == 1100 and cert_a.detalles[0]["credito_con_dev"] == 270
+    assert cert_a.detalles[1]["credito_con_dev"] == 0
+    assert Certificado70.objects.get(propietario=b).totales["rex"] == 300
+    assert not Certificado70.objects.filter(propietario=sin_movimientos).exists()
+
+    # Single partner: only that certificate, same (empresa, propietario, año) row updated in place
+    _cal(empresa, b, date(2023, 8, 1), 200, "REX")
+    count, last = generate_certificates(empresa, 2023, None, propietario_id=b.id)
+    assert count == 1
+    assert last.pk == Certificado70.objects.get(propietario=b).pk
+    assert last.totales["rex"] == 500
+    assert Certificado70.objects.count() == 2
+
+
+def test_folios_are_assigned_once():
+    empresa = Empresa.objects.create(rut="70707070-7", razon_social="Empresa Cert70")
+    a, b = _socios(empresa, 2)
+    cal_a = _cal(empresa, a, date(2023, 3, 1), 100)
+    _cal(empresa, b, date(2023, 3, 1), 100)
+    generate_certificates(empresa, 2023, None)
+    folios = dict(Certificado70.objects.values_list('propietario_id', 'folio'))
+    assert sorted(folios.values()) == [101, 102]
+
+    # Between runs a partner is added and a's only movement stops counting
+    cal_a.estado = "pendiente"
+    cal_a.save()
+    nuevo = Propietario.objects.create(empresa=empresa, rut="30000000-3", nombre="Nuevo")
+    _cal(empresa, nuevo, date(2023, 4, 1), 50)
+    _cal(empresa, b, date(2023, 4, 1), 50)  # b's certificate is regenerated too
+    generate_certificates(empresa, 2023, None)
+    assert Certificado70.objects.get(propietario=nuevo).folio == 103
+    assert Certificado70.objects.get(propietario=b).folio == folios[b.id]
+
+    # Single-partner runs keep the sequence as well
+    otro = Propietario.objects.create(empresa=empresa, rut="40000000-4", nombre="Otro")
+    _cal(empresa, otro, date(2023, 5, 1), 10)
+    generate_certificates(empresa, 2023, None, propietario_id=otro.id)
+    assert Certificado70.objects.get(propietario=otro).folio == 104
+    assert Certificado70.objects.filter(folio=101).count() == 1
+
+
+def test_query_count_does_not_grow_with_partners(django_assert_max_num_queries):
+    empresa = Empresa.objects.create(rut="70707070-7", razon_social="Empresa Cert70")
+    for socio in _socios(empresa, 40):
+        _cal(empresa, socio, date(2023, 3, 1), 100)
+
+    # Running totals, certificate revisions, movements + credits, (savepoint) folio lock +
+    # last folio, upsert, last certificate: whatever the number of partners
+    with django_assert_max_num_queries(10):
+        count, _ = generate_certificates(empresa, 2023, None)
+    assert count == 40
+    assert Certificado70.objects.count() == 40
+
+
+def test_calculator_matches_company_year_engine():
+    empresa = Empresa.objects.create(rut="70707070-7", razon_social="Empresa Cert70")
+    socio, otro = _socios(empresa, 2)
+    for n, imputacion in enumerate(["RAI", "DDAN", "REX", "INR", "SAC", None]):
+        cal = _cal(empresa, socio, date(2023, n + 1, 1), 100 * (n + 1), imputacion, reajustado=0 if n else 150)
+        for tipo in ["sin devolucion", "Restitución", None]:
+            CreditoIDPC.objects.create(calificacion=cal, tipo=tipo, monto=n + 1)
+    _cal(empresa, otro, date(2023, 1, 1), 999, "SAC")
+
+    totales, detalles = Cert70Calculator(empresa, socio, 2023).calculate()
+    assert (totales["rai"], totales["ddan"], totales["rex"], totales["inr"], totales["sac"]) == (150, 200, 300, 400, 500)
+    assert totales["monto_actualizado"] == 150 + 200 + 300 + 400 + 500 + 600
+    assert (totales["credito_sin_dev"], totales["credito_restitucion"], totales["otros_creditos"]) == (21, 21, 21)
+    assert detalles[-1]["imputacion"] == ""
+
+    generate_certificates(empresa, 2023, None)
+    cert = Certificado70.objects.get(propietario=socio)
+    assert (cert.totales, cert.detalles) == (totales, detalles)
+
+    # No movements: zero totals
+    assert Cert70Calculator(empresa, socio, 2020).calculate() == ({k: 0 for k in totales}, [])
@@ -0,0 +1,96 @@
+import os
+import time
+from datetime import date
+from io import StringIO
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from rest_framework.test import APIClient
+from calificaciones.models import CalificacionTributaria, Certificado70, Empresa, Propietario
+from calificaciones.services import cert70_pdf, cert70_pdf_cache
+from calificaciones.services.cert70_batch import generate_certificates
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def renders(settings, tmp_path, monkeypatch):
+    settings.MEDIA_ROOT = str(tmp_path)
+    calls = []
+
+    def counting(certificado):
+        calls.append(certificado.id)
+        return cert70_pdf.render_pdf(certificado)
+
+    monkeypatch.setattr(cert70_pdf_cache, "render_pdf", counting)
+    return calls
+
+
+def _certificados(n=2):
+    empresa = Empresa.objects.create(rut="70707070-7", razon_social="Empresa Cert70")
+    for i in range(n):
+        socio = Propietario.objects.create(empresa=empresa, rut=f"{10000000 + i}-{i}", nombre=f"Socio {i}")
+        CalificacionTributaria.objects.create(
+            empresa=empresa, propietario=socio, fecha=date(2023, 3, 1), tipo="retiro",
+            monto_original=1000, imputacion="RAI", estado="vigente",
+        )
+    generate_certificates(empresa, 2023, None)
+    return list(Certificado70.objects.order_by('id'))
+
+
+def test_render_skipped_until_inputs_change(renders, monkeypatch):
+    cert, otro = _certificados()
+    path = cert70_pdf_cache.get_or_render(cert)
+    assert os.path.exists(path) and renders == [cert.id]
+    assert Certificado70.objects.get(pk=cert.pk).archivo_pdf == path
+
+    # Same inputs: no render, same file
+    assert cert70_pdf_cache.get_or_render(Certificado70.objects.get(pk=cert.pk)) == path
+    assert renders == [cert.id]
+
+    # Inputs changed (new movement): another key, rendered again; the old file is now orphaned
+    CalificacionTributaria.objects.create(
+        empresa=cert.empresa, propietario=cert.propietario, fecha=date(2023, 4, 1), tipo="retiro",
+        monto_original=5, estado="vigente",
+    )
+    generate_certificates(cert.empresa, 2023, None)
+    nuevo = cert70_pdf_cache.get_or_render(Certificado70.objects.get(pk=cert.pk))
+    assert nuevo != path and renders == [cert.id, cert.id]
+
+    # Download endpoint: served from the cache
+    client = APIClient()
+    client.force_authenticate(get_user_model().objects.create_user(username="admin70", password="x", role="admin"))
+    response = client.get(f"/api/certificados70/{otro.pk}/descargar/")
+    assert response.status_code == 200 and b"".join(response.streaming_content).startswith(b"%PDF")
+    client.get(f"/api/certificados70/{otro.pk}/descargar/")
+    assert renders.count(otro.id) == 1
+
+    # A new template version invalidates every key
+    key = cert70_pdf_cache.render_key(otro)
+    monkeypatch.setattr(cert70_pdf_cache, "TEMPLATE_VERSION", "2")
+    assert cert70_pdf_cache.render_key(otro) != key
+
+
+def test_evict_orphans_by_age_then_by_size(renders):
+    cert, otro = _certificados()
+    usado = cert70_pdf_cache.get_or_render(cert)
+    huerfano = cert70_pdf_cache.store("ab" * 32, b"%PDF viejo")
+    reciente = cert70_pdf_cache.store("cd" * 32, b"%PDF nuevo")
+    viejo = time.time() - 40 * 86400
+    os.utime(huerfano, (viejo, viejo))
+    os.utime(usado, (viejo, viejo))  # old but referenced: kept by the age bound
+
+    out = StringIO()
+    call_command("limpiar_pdfs_cert70", "--simular", stdout=out)
+    assert "1 se eliminarían" in out.getvalue() and os.path.exists(huerfano)
+
+    result = cert70_pdf_cache.evict(max_age_days=30)
+    assert (result["eliminados"], result["huerfanos_eliminados"]) == (1, 1)
+    assert not os.path.exists(huerfano) and os.path.exists(reciente) and os.path.exists(usado)
+
+    # Size bound: orphans go first, then referenced files (their archivo_pdf is cleared)
+    result = cert70_pdf_cache.evict(max_bytes=os.path.getsize(usado))
+    assert result["eliminados"] == 1 and not os.path.exists(reciente) and os.path.exists(usado)
+    cert70_pdf_cache.evict(max_bytes=0)
+    assert not os.path.exists(usado)
+    assert Certificado70.objects.get(pk=cert.pk).archivo_pdf is None
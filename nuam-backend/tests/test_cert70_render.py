@@ -0,0 +1,66 @@
+import io
+import json
+import zipfile
+from datetime import date
+from io import StringIO
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from rest_framework.test import APIClient
+from calificaciones.models import CalificacionTributaria, Certificado70, Empresa, Propietario
+from calificaciones.services.cert70_batch import generate_certificates
+from calificaciones.services.cert70_render import render_zip
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def certificados(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path / "media")
+    empresa = Empresa.objects.create(rut="70707070-7", razon_social="Empresa Cert70")
+    for i in range(5):
+        socio = Propietario.objects.create(empresa=empresa, rut=f"{10000000 + i}-{i}", nombre=f"Socio {i}")
+        CalificacionTributaria.objects.create(
+            empresa=empresa, propietario=socio, fecha=date(2023, 3, i + 1), tipo="retiro",
+            monto_original=1000 * (i + 1), imputacion="RAI", estado="vigente",
+        )
+    generate_certificates(empresa, 2023, None)
+    return list(Certificado70.objects.order_by('id').values_list('id', flat=True))
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_renders_every_certificate_into_one_zip(certificados, workers):
+    out = io.BytesIO()
+    progreso = []
+    report = render_zip(certificados + [999999], out, workers=workers, progress=lambda n, total: progreso.append((n, total)))
+
+    assert (report["certificados"], report["faltantes"], report["errores"]) == (5, 1, [])
+    assert report["workers"] == workers
+    assert sorted(t["id"] for t in report["tiempos"]) == certificados
+    assert progreso[-1] == (5, 6)
+    with zipfile.ZipFile(out) as archive:
+        assert sorted(archive.namelist()) == sorted(f"Cert70_{pk}.pdf" for pk in certificados)
+        pdf = archive.read(f"Cert70_{certificados[0]}.pdf")
+    assert pdf.startswith(b"%PDF")
+    assert len(pdf) == next(t["bytes"] for t in report["tiempos"] if t["id"] == certificados[0])
+
+    # Second run: every PDF comes from the render cache, archivo_pdf points at it
+    again = render_zip(certificados, io.BytesIO(), workers=workers)
+    assert again["cache"] == {"aciertos": 5, "renderizados": 0}
+    assert all(Certificado70.objects.filter(archivo_pdf__isnull=False).values_list('archivo_pdf', flat=True))
+
+
+def test_command_and_endpoint(certificados, tmp_path):
+    salida = str(tmp_path / "certs.zip")
+    out = StringIO()
+    call_command("exportar_cert70_zip", salida, "--empresa", str(Empresa.objects.get().id), "--workers", "2", "--json", stdout=out)
+    assert json.loads(out.getvalue())["certificados"] == 5
+    assert len(zipfile.ZipFile(salida).namelist()) == 5
+
+    client = APIClient()
+    client.force_authenticate(get_user_model().objects.create_user(username="admin70", password="x", role="admin"))
+    response = client.get("/api/certificados70/descargar_zip/", {"anio": 2023})
+    assert response.status_code == 200
+    assert response["Content-Type"] == "application/zip"
+    assert len(zipfile.ZipFile(io.BytesIO(response.content)).namelist()) == 5
+    assert client.get("/api/certificados70/descargar_zip/", {"anio": 1999}).status_code == 404
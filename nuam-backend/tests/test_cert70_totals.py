@@ -0,0 +1,175 @@
+import io
+import json
+from datetime import date
+from io import StringIO
+import pandas as pd
+import pytest
+from django.core.management import call_command
+from calificaciones.models import CalificacionTributaria, Certificado70, CreditoIDPC, Empresa, Propietario, TotalCert70
+from calificaciones.services import cert70_totals
+from calificaciones.services.bulk_ingest import ingest_file
+from calificaciones.services.bulk_upsert import upsert_calificaciones
+from calificaciones.services.cert70_batch import generate_certificates
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def empresa():
+    return Empresa.objects.create(rut="70707070-7", razon_social="Empresa Cert70")
+
+
+def _socio(empresa, rut="11111111-1"):
+    return Propietario.objects.create(empresa=empresa, rut=rut, nombre=f"Socio {rut}")
+
+
+def _cal(empresa, socio, fecha=date(2023, 5, 1), monto=1000, imputacion="RAI", estado="vigente"):
+    return CalificacionTributaria.objects.create(
+        empresa=empresa, propietario=socio, fecha=fecha, tipo="retiro",
+        monto_original=monto, imputacion=imputacion, estado=estado,
+    )
+
+
+def _total(socio, anio=2023):
+    return TotalCert70.objects.filter(propietario=socio, anio=anio).first()
+
+
+def _consistent():
+    return cert70_totals.reconcile()["diferencias"] == []
+
+
+def test_signals_keep_totals_in_sync(empresa):
+    socio = _socio(empresa)
+    cal = _cal(empresa, socio)
+    credito = CreditoIDPC.objects.create(calificacion=cal, tipo="Con devolución", monto=270)
+    _cal(empresa, socio, monto=50, estado="pendiente")
+    total = _total(socio)
+    assert (total.movimientos, total.monto_historico, total.rai, total.credito_con_dev) == (1, 1000, 1000, 270)
+    assert _consistent()
+
+    cal.monto_reajustado = 1100
+    cal.imputacion = "DDAN"
+    cal.save()
+    credito.tipo = "ISFUT"
+    credito.save()
+    total = _total(socio)
+    assert (total.monto_actualizado, total.rai, total.ddan, total.credito_con_dev, total.isfut) == (1100, 0, 1100, 0, 270)
+
+    # estado and year changes move the movement and its credits off / onto a row
+    cal.estado = "pendiente"
+    cal.save()
+    assert (_total(socio).movimientos, _total(socio).isfut) == (0, 0)
+    cal.estado = "vigente"
+    cal.fecha = date(2022, 5, 1)
+    cal.save()
+    assert (_total(socio, 2022).movimientos, _total(socio, 2022).isfut) == (1, 270)
+    assert _consistent()
+
+    revision = _total(socio, 2022).revision
+    cal.delete()  # cascades to the credit
+    assert (_total(socio, 2022).movimientos, _total(socio, 2022).isfut) == (0, 0)
+    assert _total(socio, 2022).revision > revision
+    assert _consistent()
+
+
+def test_parent_cascade_deletes(empresa):
+    a, b = _socio(empresa), _socio(empresa, "22222222-2")
+    CreditoIDPC.objects.create(calificacion=_cal(empresa, a), tipo="ISFUT", monto=10)
+    _cal(empresa, b)
+
+    # The totals row goes with its propietario before the calificaciones do
+    b_id = b.id
+    b.delete()
+    assert not TotalCert70.objects.filter(propietario_id=b_id).exists() and _total(a).movimientos == 1
+    empresa.delete()
+    assert not TotalCert70.objects.exists()
+    assert not CalificacionTributaria.objects.exists()
+
+def test_bulk_paths_apply_deltas():
+    df = pd.DataFrame({
+        'rut_empresa': ['76543210-3'] * 2, 'razon_social': ['Empresa Cert70'] * 2,
+        'rut_propietario': ['11111111-1', '22222222-2'], 'nombre_propietario': ['Ana', 'Beto'],
+        'fecha': ['2023-01-01', '2023-02-01'], 'tipo_calificacion': ['retiro', 'dividendo'], 'monto': [500, 700],
+        'estado': ['vigente', 'vigente'],
+    })
+    file_obj = io.BytesIO()
+    df.to_excel(file_obj, index=False)
+    file_obj.seek(0)
+    file_obj.name = "carga.xlsx"
+    ingest_file(file_obj)
+    assert TotalCert70.objects.filter(anio=2023, movimientos=1).count() == 2
+    assert _consistent()
+
+    # The upsert puts existing calificaciones back to 'pendiente': they stop counting
+    CreditoIDPC.objects.create(calificacion=CalificacionTributaria.objects.get(monto_original=500), tipo="ISFUT", monto=9)
+    upsert_calificaciones({
+        "rut_empresa": '76543210-3',
+        "calificaciones": [{"rut_propietario": "11111111-1", "fecha": "2023-01-01", "tipo": "retiro", "monto": 500}],
+    })
+    ana = Propietario.objects.get(rut="11111111-1")
+    assert (_total(ana).movimientos, _total(ana).isfut) == (0, 0)
+    assert _consistent()
+
+
+def test_reconcile_reports_and_fixes_drift(empresa):
+    socio = _socio(empresa)
+    cal = _cal(empresa, socio)
+    CalificacionTributaria.objects.filter(pk=cal.pk).update(monto_original=4000)  # no signals
+    _cal(empresa, _socio(empresa, "22222222-2"))
+    TotalCert70.objects.filter(propietario__rut="22222222-2").delete()
+
+    out = StringIO()
+    call_command("reconciliar_totales_cert70", "--json", stdout=out)
+    result = json.loads(out.getvalue())
+    assert result["corregidos"] == 0
+    assert [(d["faltante"], d["columnas"].get("rai")) for d in result["diferencias"]] == [(False, [1000, 4000]), (True, [0, 1000])]
+
+    call_command("reconciliar_totales_cert70", "--corregir", "--empresa", str(empresa.id), "--anio", "2023", stdout=StringIO())
+    assert _total(socio).rai == 4000
+    assert _consistent()
+
+
+def test_generation_reads_totals_and_skips_current_certificates(empresa, django_assert_max_num_queries):
+    a, b = _socio(empresa), _socio(empresa, "22222222-2")
+    _cal(empresa, a)
+    cal_b = _cal(empresa, b, imputacion="REX")
+    generate_certificates(empresa, 2023, None)
+    first = {c.propietario_id: c.revision_totales for c in Certificado70.objects.all()}
+
+    # Nothing changed: totals, certificate revisions and the last certificate, no writes
+    with django_assert_max_num_queries(3):
+        count, last = generate_certificates(empresa, 2023, None)
+    assert count == 2 and last.propietario == b
+
+    cal_b.monto_original = 300
+    cal_b.save()
+    generate_certificates(empresa, 2023, None)
+    cert_b = Certificado70.objects.get(propietario=b)
+    assert cert_b.totales["rex"] == 300 and cert_b.detalles[0]["monto_historico"] == 300
+    assert cert_b.revision_totales == _total(b).revision != first[b.id]
+    assert Certificado70.objects.get(propietario=a).revision_totales == first[a.id]
+
+
+def test_dashboard_summary_reads_totals(empresa):
+    _cal(empresa, _socio(empresa), monto=100)
+    _cal(empresa, _socio(empresa, "22222222-2"), monto=200, imputacion="SAC")
+    resumen = cert70_totals.resumen(2023)
+    assert (resumen["socios"], resumen["monto_historico"], resumen["sac"]) == (2, 300, 200)
+    assert cert70_totals.resumen(1999)["socios"] == 0
+
+
+def test_migration_fill_matches_reconciliation(empresa):
+    import importlib
+    from django.apps import apps
+    fill_totales = importlib.import_module("calificaciones.migrations.0010_totalcert70").fill_totales
+    a, b = _socio(empresa), _socio(empresa, "22222222-2")
+    cal = _cal(empresa, a, imputacion="DDAN")
+    CreditoIDPC.objects.create(calificacion=cal, tipo="Sin devolución", monto=90)
+    CreditoIDPC.objects.create(calificacion=_cal(empresa, b, fecha=date(2024, 1, 2)), tipo="Otro", monto=10)
+    _cal(empresa, b, estado="pendiente")
+    TotalCert70.objects.all().delete()
+
+    fill_totales(apps, None)
+
+    assert TotalCert70.objects.count() == 2
+    assert _consistent()
@@ -0,0 +1,114 @@
+import hashlib
+import io
+import os
+import pytest
+import pandas as pd
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from calificaciones.models import CalificacionTributaria, CargaFragmentada
+
+User = get_user_model()
+
+
+@pytest.fixture
+def auth_client(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    client = APIClient()
+    user = User.objects.create_user(username="uploader", password="password", role="editor")
+    client.force_authenticate(user=user)
+    return client
+
+
+def _xlsx_bytes(rows=50):
+    df = pd.DataFrame({
+        'rut_empresa': ['76543210-3'] * rows,
+        'razon_social': ['Empresa Grande'] * rows,
+        'rut_propietario': ['11111111-1'] * rows,
+        'nombre_propietario': ['Ana'] * rows,
+        'fecha': ['2023-01-01'] * rows,
+        'tipo_calificacion': ['retiro'] * rows,
+        'monto': list(range(1, rows + 1)),
+    })
+    buffer = io.BytesIO()
+    df.to_excel(buffer, index=False)
+    return buffer.getvalue()
+
+
+def _put(client, carga_id, numero, chunk, checksum=None):
+    return client.generic(
+        "PUT", f"/api/cargas/{carga_id}/fragmentos/{numero}/", chunk,
+        content_type="application/octet-stream",
+        HTTP_X_CHUNK_SHA256=checksum or hashlib.sha256(chunk).hexdigest(),
+    )
+
+
+@pytest.mark.django_db
+def test_chunked_upload_resume_and_finalize(auth_client):
+    content = _xlsx_bytes()
+    size = 1024
+    response = auth_client.post("/api/cargas/", {
+        "nombre_archivo": "grande.xlsx",
+        "tamano": len(content),
+        "tamano_fragmento": size,
+        "sha256": hashlib.sha256(content).hexdigest(),
+    }, format="json")
+    assert response.status_code == 201
+    carga_id = response.data["id"]
+    chunks = [content[i:i + size] for i in range(0, len(content), size)]
+    assert response.data["total_fragmentos"] == len(chunks)
+
+    # Out of order, with one corrupted fragment that must be resent
+    for numero in reversed(range(1, len(chunks))):
+        assert _put(auth_client, carga_id, numero, chunks[numero]).status_code == 200
+    assert _put(auth_client, carga_id, 0, chunks[0], checksum="0" * 64).status_code == 400
+
+    status = auth_client.get(f"/api/cargas/{carga_id}/")
+    assert status.data["fragmentos_faltantes"] == [0]
+    response = auth_client.post(f"/api/cargas/{carga_id}/finalizar/")
+    assert response.status_code == 400
+
+    assert _put(auth_client, carga_id, 0, chunks[0]).status_code == 200
+    response = auth_client.post(f"/api/cargas/{carga_id}/finalizar/")
+    assert response.status_code == 200
+    assert response.data["created"] == 50
+    assert CalificacionTributaria.objects.count() == 50
+
+    carga = CargaFragmentada.objects.get(pk=carga_id)
+    assert carga.estado == "finalizada"
+    assert not os.path.exists(carga.ruta)
+
+
+@pytest.mark.django_db
+def test_chunked_upload_rejects_wrong_size_and_other_users(auth_client):
+    response = auth_client.post("/api/cargas/", {"nombre_archivo": "a.csv", "tamano": 10}, format="json")
+    carga_id = response.data["id"]
+    assert _put(auth_client, carga_id, 0, b"12345").status_code == 400
+
+    other = APIClient()
+    other.force_authenticate(user=User.objects.create_user(username="otro", password="password"))
+    assert other.get(f"/api/cargas/{carga_id}/").status_code == 404
+
+    bad = auth_client.post("/api/cargas/", {"nombre_archivo": "a.exe", "tamano": 10}, format="json")
+    assert bad.status_code == 400
+
+
+@pytest.mark.django_db
+def test_stale_uploads_are_swept(settings, tmp_path):
+    from datetime import timedelta
+    from django.core.management import call_command
+    from django.utils import timezone
+    from calificaciones.services import chunked_upload
+    settings.MEDIA_ROOT = str(tmp_path)
+    vieja = chunked_upload.iniciar("vieja.xlsx", 100, None)
+    activa = chunked_upload.iniciar("activa.xlsx", 100, None)
+    CargaFragmentada.objects.filter(pk=vieja.pk).update(actualizado_en=timezone.now() - timedelta(hours=25))
+    huerfano = os.path.join(chunked_upload.cargas_dir(), "huerfano.part")
+    open(huerfano, 'wb').close()
+    os.utime(huerfano, (0, 0))
+
+    call_command("limpiar_cargas")
+
+    assert list(CargaFragmentada.objects.values_list("pk", flat=True)) == [activa.pk]
+    assert os.path.exists(activa.ruta)
+    assert not os.path.exists(vieja.ruta)
+    assert not os.path.exists(huerfano)
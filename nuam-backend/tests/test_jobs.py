@@ -0,0 +1,118 @@
+import io
+import os
+import pytest
+import pandas as pd
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from rest_framework.test import APIClient
+from rest_framework import status
+from calificaciones.models import CalificacionTributaria, Tarea
+from calificaciones.services import jobs
+
+User = get_user_model()
+
+@pytest.fixture
+def auth_client(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    client = APIClient()
+    user = User.objects.create_user(username="jobs_user", password="password", role="admin")
+    client.force_authenticate(user=user)
+    return client
+
+def _csv_upload():
+    data = {
+        'rut_empresa': ['11111111-1', '11111111-1'],
+        'razon_social': ['Empresa Async', 'Empresa Async'],
+        'rut_propietario': ['22222222-2', '33333333-3'],
+        'nombre_propietario': ['Socio A', 'Socio B'],
+        'fecha': ['2023-01-01', '2023-02-01'],
+        'tipo_calificacion': ['retiro', 'dividendo'],
+        'monto': [100, 200]
+    }
+    file_obj = io.BytesIO(pd.DataFrame(data).to_csv(index=False).encode())
+    file_obj.name = "async.csv"
+    return file_obj
+
+@pytest.mark.django_db
+def test_async_bulk_upload_runs_in_worker(auth_client):
+    response = auth_client.post(
+        "/api/calificaciones/upload/?async=1",
+        {"file": _csv_upload()},
+        format="multipart"
+    )
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    tarea_id = response.data["tarea_id"]
+    assert CalificacionTributaria.objects.count() == 0
+
+    call_command("procesar_tareas", once=True, stdout=io.StringIO())
+
+    response = auth_client.get(f"/api/tareas/{tarea_id}/")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["estado"] == "completada"
+    assert response.data["resultado"]["created"] == 2
+    assert CalificacionTributaria.objects.count() == 2
+
+@pytest.mark.django_db
+def test_failed_job_is_retried_then_marked_failed(settings):
+    settings.TAREAS_RETRY_BACKOFF = 0
+    calls = []
+
+    @jobs.register("test_flaky", max_intentos=2)
+    def flaky(parametros, job):
+        calls.append(job.tarea.intentos)
+        raise RuntimeError("boom")
+
+    try:
+        tarea = jobs.enqueue("test_flaky")
+        call_command("procesar_tareas", once=True, stdout=io.StringIO())
+    finally:
+        jobs.HANDLERS.pop("test_flaky")
+
+    tarea.refresh_from_db()
+    assert calls == [1, 2]
+    assert tarea.estado == "fallida"
+    assert "boom" in tarea.error
+
+@pytest.mark.django_db
+def test_tareas_are_private_to_their_owner(auth_client):
+    other = User.objects.create_user(username="other_jobs", password="password", role="tributario")
+    tarea = Tarea.objects.create(tipo="cert70", creado_por=other)
+
+    client = APIClient()
+    client.force_authenticate(user=User.objects.create_user(username="third", password="password", role="tributario"))
+    assert client.get(f"/api/tareas/{tarea.id}/").status_code == status.HTTP_404_NOT_FOUND
+    # Admin General sees every job
+    assert auth_client.get(f"/api/tareas/{tarea.id}/").status_code == status.HTTP_200_OK
+
+@pytest.mark.django_db
+def test_carga_pdf_retries_infrastructure_errors_only(settings, tmp_path, monkeypatch):
+    from calificaciones import bulk_upload_views
+    from calificaciones.services.parser_sandbox import ParseTimeout
+    settings.TAREAS_RETRY_BACKOFF = 0
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.PDF_SANDBOX_ENABLED = False
+    ruta = tmp_path / "dj.pdf"
+    ruta.write_bytes(b"%PDF-1.4 not really")
+    attempts = []
+
+    def process_pdf(path, user, sha256=None):
+        attempts.append(os.path.exists(path))
+        if len(attempts) == 1:
+            raise ParseTimeout("Tiempo máximo de análisis excedido")
+        return {"calificaciones": []}
+
+    monkeypatch.setattr(bulk_upload_views, "process_pdf", process_pdf)
+    tarea = jobs.enqueue("carga_pdf", {"ruta": str(ruta), "nombre": "dj.pdf"})
+    call_command("procesar_tareas", once=True, stdout=io.StringIO())
+    tarea.refresh_from_db()
+    assert (tarea.estado, tarea.intentos, attempts) == ("completada", 2, [True, True])
+
+    # A document the parser rejects fails at once, with its error report
+    monkeypatch.undo()
+    ruta.write_bytes(b"not a pdf")
+    tarea = jobs.enqueue("carga_pdf", {"ruta": str(ruta), "nombre": "dj.pdf"})
+    call_command("procesar_tareas", once=True, stdout=io.StringIO())
+    tarea.refresh_from_db()
+    assert (tarea.estado, tarea.intentos) == ("fallida", 1)
+    assert tarea.resultado["error_report_generated"] is True
+    assert not ruta.exists()
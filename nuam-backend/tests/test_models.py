@@ -52,3 +52,26 @@ def test_calificacion_creation():
     )
     assert calificacion.monto_original == 100000
     assert calificacion.estado == "vigente" # Fixed expectation
+
+@pytest.mark.django_db
+def test_bulk_audit_buffers_signal_entries():
+    from calificaciones import audit
+    from calificaciones.models import Auditoria
+    empresa = Empresa.objects.create(rut="33333333-3", razon_social="Empresa 2")
+    propietario = Propietario.objects.create(empresa=empresa, rut="44444444-4", nombre="Maria")
+
+    with audit.bulk_audit(batch_size=10):
+        for monto in range(1, 4):
+            CalificacionTributaria.objects.create(
+                empresa=empresa, propietario=propietario, fecha=date(2023, 1, 1),
+                tipo="retiro", monto_original=monto
+            )
+        assert Auditoria.objects.count() == 0
+    assert Auditoria.objects.filter(accion="crear").count() == 3
+
+    # Outside the block the trail is written on every save, as before
+    cal = CalificacionTributaria.objects.first()
+    cal.monto_original = 99
+    cal.save()
+    modificada = Auditoria.objects.get(accion="modificar")
+    assert modificada.detalle["antes"]["monto_original"] == 1
@@ -0,0 +1,117 @@
+import pytest
+from django.core.cache import cache
+from calificaciones.models import ContadorParseo, ResultadoParseo
+from calificaciones.services import parse_cache
+from calificaciones.services.pdf_parser import PDFParser
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def parses(monkeypatch, tmp_path, settings):
+    """Counts real parses; each file parses to its own content."""
+    # In-process, so the patched parse_data is the one that runs
+    settings.PDF_SANDBOX_ENABLED = False
+    parse_cache.clear()
+    calls = []
+
+    def fake_parse(self):
+        calls.append(self.file_path)
+        with open(self.file_path) as f:
+            return {"rut_empresa": f.read(), "calificaciones": []}
+
+    monkeypatch.setattr(PDFParser, "parse_data", fake_parse)
+    return calls
+
+
+def _file(tmp_path, name, content):
+    path = tmp_path / name
+    path.write_text(content)
+    return str(path)
+
+
+def test_same_bytes_are_parsed_once(parses, tmp_path):
+    a = _file(tmp_path, "a.pdf", "76543210-3")
+    copy = _file(tmp_path, "copia.pdf", "76543210-3")
+
+    assert parse_cache.parse_pdf(a)["rut_empresa"] == "76543210-3"
+    assert parse_cache.parse_pdf(copy)["rut_empresa"] == "76543210-3"
+
+    assert parses == [a]
+    stats = parse_cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entradas"]) == (1, 1, 1)
+    assert ResultadoParseo.objects.get().aciertos == 1
+    # Counters are rows, not entries of the (per-process) cache backend
+    cache.clear()
+    counters = dict(ContadorParseo.objects.values_list("nombre", "valor"))
+    assert (counters["hits"], counters["misses"]) == (1, 1)
+    assert counters["bytes"] == ResultadoParseo.objects.get().tamano
+    assert parse_cache.stats()["hits"] == 1
+
+
+def test_version_bump_invalidates_and_evicts_old_entries(parses, tmp_path, monkeypatch, settings):
+    path = _file(tmp_path, "a.pdf", "76543210-3")
+    parse_cache.parse_pdf(path)
+
+    monkeypatch.setattr(parse_cache, "PARSER_VERSION", "nueva")
+    parse_cache.parse_pdf(path)
+    assert len(parses) == 2
+    assert parse_cache.stats()["entradas_obsoletas"] == 1
+
+    assert parse_cache.evict(max_bytes=ResultadoParseo.objects.get(version=parse_cache.version()).tamano) == 1
+    assert list(ResultadoParseo.objects.values_list("version", flat=True)) == [parse_cache.version()]
+
+
+def test_lru_eviction(parses, tmp_path, settings):
+    paths = [_file(tmp_path, f"{n}.pdf", f"1111111{n}-1") for n in range(3)]
+    for path in paths:
+        parse_cache.parse_pdf(path)
+    parse_cache.parse_pdf(paths[0])  # most recently used now
+
+    settings.PARSE_CACHE_MAX_BYTES = 2 * ResultadoParseo.objects.first().tamano
+    parse_cache.evict()
+
+    kept = set(ResultadoParseo.objects.values_list("datos__rut_empresa", flat=True))
+    assert kept == {"11111110-1", "11111112-1"}
+
+
+def test_layout_templates_are_part_of_the_version(parses, tmp_path, settings):
+    path = _file(tmp_path, "a.pdf", "76543210-3")
+    parse_cache.parse_pdf(path)
+    base = parse_cache.version()
+
+    template_dir = tmp_path / "plantillas"
+    template_dir.mkdir()
+    settings.PDF_LAYOUT_DIRS = [str(template_dir)]
+    assert parse_cache.version() != base
+    settings.PDF_LAYOUT_DIRS = []
+    settings.PDF_LAYOUT_TEMPLATES = False
+    assert parse_cache.version() != base
+
+    parse_cache.parse_pdf(path)
+    assert len(parses) == 2
+    settings.PDF_LAYOUT_TEMPLATES = True
+    parse_cache.parse_pdf(path)
+    assert len(parses) == 2  # back to the first version: cached
+
+
+def test_lookups_and_puts_skip_the_shared_rows(parses, tmp_path, settings, django_assert_num_queries):
+    settings.PARSE_CACHE_FLUSH_EVERY = 10
+    path = _file(tmp_path, "a.pdf", "76543210-3")
+    parse_cache.parse_pdf(path)
+    parse_cache.parse_pdf(path)
+    parse_cache.flush()
+
+    # A hit is one SELECT until the buffer fills; then one UPDATE for the counter and one for the entry
+    for _ in range(9):
+        with django_assert_num_queries(1):
+            parse_cache.get(parse_cache.hash_path(path))
+    with django_assert_num_queries(3):
+        parse_cache.get(parse_cache.hash_path(path))
+    assert ResultadoParseo.objects.get().aciertos == 11
+
+    # A put below the limit reads the running size, never sums the table
+    with django_assert_num_queries(8) as queries:
+        parse_cache.put("b" * 64, {"rut_empresa": "x"})
+    assert not any("SUM(" in q["sql"] for q in queries.captured_queries)
+    assert ContadorParseo.objects.get(nombre="bytes").valor == sum(ResultadoParseo.objects.values_list("tamano", flat=True))
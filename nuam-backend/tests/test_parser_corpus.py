@@ -0,0 +1,88 @@
+import json
+import pytest
+from benchmarks import corpus
+from calificaciones.services import layout_templates
+from calificaciones.services.pdf_parser import PDFParser
+
+
+def _rows(data, truth):
+    fields = truth["calificaciones"][0].keys()
+    return [
+        {f: row[f] or data["rut_propietario"] if f == "rut_propietario" else row[f] for f in fields}
+        for row in data["calificaciones"]
+    ]
+
+
+# Tables sized to their content: columns sit elsewhere on every page and seed
+@pytest.mark.parametrize("seed, paginas_texto", [(1948, 1), (7, 0), (2024, 0)])
+def test_synthetic_dj1948_is_extracted_exactly(tmp_path, settings, seed, paginas_texto):
+    settings.PDF_LAYOUT_DIRS = [corpus.LAYOUTS_DIR]
+    path = str(tmp_path / "dj1948.pdf")
+    truth = corpus.dj1948(path, pages=2, rows=8, seed=seed, paginas_texto=paginas_texto, codes=corpus.DJ1948_SII_CODES)
+
+    parser = PDFParser(path, workers=1)
+    data = parser.parse_data()
+
+    assert parser.layout().nombre == "dj1948_sintetico"
+    assert (data["rut_empresa"], data["fecha"]) == (truth["rut_empresa"], truth["fecha"])
+    assert _rows(data, truth) == truth["calificaciones"]
+
+    parts = list(PDFParser(path).iter_parse())
+    assert [row for rows in parts[1:] for row in rows] == data["calificaciones"]
+
+
+def test_synthetic_cert70_is_extracted_exactly(tmp_path, settings):
+    settings.MEDIA_ROOT = str(tmp_path)
+    path = str(tmp_path / "cert70.pdf")
+    truth = corpus.cert70(path, movimientos=12)
+
+    data = PDFParser(path, workers=1).parse_data()
+
+    assert (data["rut_empresa"], data["rut_propietario"], data["fecha"]) == \
+        (truth["rut_empresa"], truth["rut_propietario"], truth["fecha"])
+    assert _rows(data, truth) == truth["calificaciones"]
+
+
+def test_unknown_layout_falls_back_to_generic_parsing(tmp_path):
+    from calificaciones.tests.test_pdf_parser import build_dj1948_pdf
+    parser = PDFParser(build_dj1948_pdf(str(tmp_path / "otro.pdf"), pages=2), workers=1)
+
+    data = parser.parse_data()
+
+    assert parser.layout() is None
+    assert len(data["calificaciones"]) == 4
+
+
+def test_template_without_rows_falls_back_to_generic_parsing(tmp_path, settings):
+    from calificaciones.tests.test_pdf_parser import build_dj1948_pdf
+    template_dir = tmp_path / "plantillas"
+    template_dir.mkdir()
+    # Same fingerprint, but its RUT column is not where this version prints it
+    (template_dir / "dj1948_corrida.json").write_text(json.dumps({
+        "nombre": "dj1948_corrida",
+        "huella": {"textos": ["DJ 1948", "Codigo"]},
+        "columnas": [{"campo": "rut_propietario", "x0": 500, "x1": 590, "patron": "rut"}],
+    }), encoding="utf-8")
+    settings.PDF_LAYOUT_DIRS = [str(template_dir)]
+    path = build_dj1948_pdf(str(tmp_path / "otro.pdf"), pages=2)
+
+    parser = PDFParser(path, workers=1)
+    data = parser.parse_data()
+
+    assert parser.layout().nombre == "dj1948_corrida"
+    assert len(data["calificaciones"]) == 4
+    parts = list(PDFParser(path).iter_parse())
+    assert [row for rows in parts[1:] for row in rows] == data["calificaciones"]
+
+
+def test_templates_are_loaded_from_extra_dirs(tmp_path, settings):
+    template_dir = tmp_path / "plantillas"
+    template_dir.mkdir()
+    with open(corpus.LAYOUTS_DIR + "/dj1948_sintetico.json", encoding="utf-8") as f:
+        spec = json.load(f)
+    spec.update(nombre="dj1948_otra_version", huella={"textos": ["1948", "Formulario v2"]})
+    (template_dir / "dj1948_v2.json").write_text(json.dumps(spec), encoding="utf-8")
+    (template_dir / "rota.json").write_text("{", encoding="utf-8")  # invalid: skipped
+    settings.PDF_LAYOUT_DIRS = [corpus.LAYOUTS_DIR, str(template_dir)]
+
+    assert [t.nombre for t in layout_templates.registry()] == ["cert70_nuam", "dj1948_sintetico", "dj1948_otra_version"]
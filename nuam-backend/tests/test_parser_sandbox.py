@@ -0,0 +1,119 @@
+import os
+import signal
+import time
+import pytest
+from calificaciones.bulk_upload_views import pdf_error_context
+from calificaciones.services import parser_sandbox
+from calificaciones.services.parser_sandbox import ParseMemoryError, ParserCrashed, ParseTimeout, SandboxPool
+from calificaciones.services.pdf_parser import PDFParser
+
+
+@pytest.fixture
+def behaviour(monkeypatch):
+    """parse_data acts on the file's content; fork workers inherit the patch."""
+    def fake_parse(self):
+        with open(self.file_path) as f:
+            action = f.read()
+        if action == "lento":
+            time.sleep(30)
+        elif action == "memoria":
+            bytearray(2 * 1024 ** 3)
+        elif action == "crash":
+            os.kill(os.getpid(), signal.SIGKILL)
+        return {"rut_empresa": action, "calificaciones": []}
+
+    monkeypatch.setattr(PDFParser, "parse_data", fake_parse)
+
+
+@pytest.fixture
+def pdf(tmp_path):
+    def write(content):
+        path = tmp_path / f"{content}.pdf"
+        path.write_text(content)
+        return str(path)
+    return write
+
+
+def test_worker_is_reused(behaviour, pdf):
+    pool = SandboxPool(1, start_method="fork")
+    try:
+        assert pool.parse(pdf("a"))["rut_empresa"] == "a"
+        worker = pool._idle[0]
+        assert pool.parse(pdf("b"))["rut_empresa"] == "b"
+        assert pool._idle == [worker]
+    finally:
+        pool.shutdown()
+
+
+def test_timeout_kills_and_replaces_worker(behaviour, pdf):
+    pool = SandboxPool(1, start_method="fork")
+    try:
+        start = time.monotonic()
+        with pytest.raises(ParseTimeout) as error:
+            pool.parse(pdf("lento"), timeout=1)
+        assert time.monotonic() - start < 10
+        assert error.value.criterio == "Tiempo máximo de análisis excedido"
+        assert pool._count == 0
+
+        # The next document gets a fresh worker
+        assert pool.parse(pdf("ok"), timeout=5)["rut_empresa"] == "ok"
+    finally:
+        pool.shutdown()
+
+
+def test_crash_is_reported_and_recycled(behaviour, pdf):
+    pool = SandboxPool(1, start_method="fork")
+    try:
+        with pytest.raises(ParserCrashed, match="SIGKILL") as error:
+            pool.parse(pdf("crash"))
+        assert pool.parse(pdf("ok"))["rut_empresa"] == "ok"
+
+        context = pdf_error_context(error.value, None, "roto.pdf")
+        assert context["criterio"] == "Falla del proceso de análisis"
+        assert "SIGKILL" in context["reason"]
+    finally:
+        pool.shutdown()
+
+
+@pytest.mark.skipif(parser_sandbox.resource is None or not os.path.exists("/proc/self/status"),
+                    reason="RLIMIT_AS no disponible")
+def test_memory_cap(behaviour, pdf):
+    # Forked workers start with this process's address space: cap it at ~256 MB more
+    with open("/proc/self/status") as f:
+        size_kb = next(int(line.split()[1]) for line in f if line.startswith("VmSize:"))
+    pool = SandboxPool(1, memory_mb=size_kb // 1024 + 256, start_method="fork")
+    try:
+        with pytest.raises(ParseMemoryError):
+            pool.parse(pdf("memoria"), timeout=30)
+        assert pool.parse(pdf("ok"), timeout=30)["rut_empresa"] == "ok"
+    finally:
+        pool.shutdown()
+
+
+def _slow_page_range(file_path, start, stop, engine):
+    """Stands in for pdf_parser._parse_page_range (module level: the pool pickles it)."""
+    with open(os.path.join(os.path.dirname(file_path), "pids"), "a") as f:
+        f.write(f"{os.getpid()}\n")
+    time.sleep(30)
+
+
+def test_large_documents_are_parsed_in_parallel_and_killed_together(monkeypatch, settings, tmp_path):
+    from calificaciones.services import pdf_parser
+    from calificaciones.tests.test_pdf_parser import build_dj1948_pdf
+    settings.PDF_PARSER_WORKERS = 2
+    settings.PDF_PARSER_PARALLEL_MIN_PAGES = 2
+    monkeypatch.setattr(pdf_parser, "_parse_page_range", _slow_page_range)
+    monkeypatch.setattr(pdf_parser.layout_templates, "match", lambda parser: None)
+    pool = SandboxPool(1, start_method="fork")
+    try:
+        with pytest.raises(ParseTimeout):
+            pool.parse(build_dj1948_pdf(str(tmp_path / "grande.pdf"), pages=4), timeout=3)
+    finally:
+        pool.shutdown()
+
+    started = [int(pid) for pid in (tmp_path / "pids").read_text().split()]
+    assert len(started) == 2
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline and any(os.path.exists(f"/proc/{pid}") for pid in started):
+        time.sleep(0.1)
+    assert not any(os.path.exists(f"/proc/{pid}") for pid in started)
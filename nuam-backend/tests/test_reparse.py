@@ -0,0 +1,55 @@
+import json
+from io import StringIO
+import pytest
+from django.core.management import call_command
+from calificaciones.models import ArchivoCargado
+from calificaciones.services.pdf_parser import PDFParser
+from calificaciones.services.reparse import diff
+from calificaciones.tests.test_pdf_parser import build_dj1948_pdf
+
+pytestmark = pytest.mark.django_db
+
+
+def _reparse(*args, **options):
+    out = StringIO()
+    call_command("reparse_archivos", *args, "--json", "--workers", "2", stdout=out, stderr=StringIO(), **options)
+    return json.loads(out.getvalue())
+
+
+def test_diff_ignores_how_rows_were_read():
+    row = {"rut_propietario": "12345678-9", "monto": 100, "original_line": "a"}
+    assert diff({"fecha": "01/01/2023", "calificaciones": [row]},
+                {"fecha": "01/01/2023", "calificaciones": [{**row, "original_line": "b"}]}) is None
+    assert diff({"fecha": None, "calificaciones": [row, row]}, {"fecha": "01/01/2023", "calificaciones": [row]}) == {
+        "cabecera": {"fecha": [None, "01/01/2023"]}, "agregadas": 0, "eliminadas": 1,
+    }
+
+
+def test_reparse_diffs_writes_and_resumes(tmp_path):
+    current = build_dj1948_pdf(str(tmp_path / "actual.pdf"), pages=2)
+    stale = build_dj1948_pdf(str(tmp_path / "antiguo.pdf"), pages=2)
+    parsed = PDFParser(current).parse_data()
+    ok = ArchivoCargado.objects.create(nombre_archivo="actual.pdf", ruta=current, metadata=parsed)
+    old = ArchivoCargado.objects.create(
+        nombre_archivo="antiguo.pdf", ruta=stale, metadata={**parsed, "calificaciones": parsed["calificaciones"][:1]})
+    ArchivoCargado.objects.create(nombre_archivo="borrado.pdf", ruta=str(tmp_path / "borrado.pdf"), metadata={})
+    ArchivoCargado.objects.create(nombre_archivo="carga.csv", metadata={"rows": 3})  # not a stored PDF
+
+    result = _reparse()
+    assert (result["procesados"], result["cambiados"], result["sin_cambios"], result["faltantes"]) == (3, 1, 1, 1)
+    assert result["escritos"] == 0
+    old.refresh_from_db()
+    assert len(old.metadata["calificaciones"]) == 1
+
+    checkpoint = str(tmp_path / "avance.json")
+    result = _reparse("--write", "--chunk-size", "2", checkpoint=checkpoint)
+    assert result["escritos"] == 1
+    old.refresh_from_db()
+    assert old.metadata["calificaciones"] == parsed["calificaciones"]
+    ok.refresh_from_db()
+    assert ok.metadata == parsed
+
+    # Resumed from the checkpoint: nothing left to do, counters carried over
+    again = _reparse("--write", checkpoint=checkpoint)
+    assert again["ultimo_id"] == result["ultimo_id"]
+    assert again["procesados"] == 3
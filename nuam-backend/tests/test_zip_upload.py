@@ -0,0 +1,165 @@
+import io
+import zipfile
+import pytest
+import pandas as pd
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from rest_framework.test import APIClient
+from calificaciones.models import ArchivoCargado, CalificacionTributaria
+
+User = get_user_model()
+
+
+@pytest.fixture
+def auth_client(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.ZIP_INGEST_WORKERS = 2
+    client = APIClient()
+    client.force_authenticate(user=User.objects.create_user(username="uploader", password="password", role="editor"))
+    return client
+
+
+def _csv(rut_propietario, montos):
+    return pd.DataFrame({
+        'rut_empresa': ['76543210-3'] * len(montos),
+        'razon_social': ['Empresa Zip'] * len(montos),
+        'rut_propietario': [rut_propietario] * len(montos),
+        'nombre_propietario': ['Socio'] * len(montos),
+        'fecha': ['2023-01-01'] * len(montos),
+        'tipo_calificacion': ['retiro'] * len(montos),
+        'monto': montos,
+    }).to_csv(index=False).encode()
+
+
+def _zip(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zf:
+        for name, content in members.items():
+            zf.writestr(name, content)
+    buffer.seek(0)
+    buffer.name = "lote.zip"
+    return buffer
+
+
+@pytest.mark.django_db
+def test_zip_upload_reports_every_member(auth_client):
+    archive = _zip({
+        "broker/a.csv": _csv('11111111-1', [1, 2, 3]),
+        "broker/b.csv": _csv('22222222-2', [4, 5]),
+        "broker/copia_a.csv": _csv('11111111-1', [1, 2, 3]),
+        "broker/roto.pdf": b"not a pdf",
+        "broker/notas.txt": b"hola",
+        "../../fuera.csv": _csv('12345678-5', [6]),
+    })
+    response = auth_client.post("/api/calificaciones/upload-zip/", {"file": archive}, format="multipart")
+    assert response.status_code == 200
+    detalle = {e["archivo"]: e for e in response.data["archivos_detalle"]}
+
+    assert detalle["broker/a.csv"]["estado"] == "ok"
+    assert detalle["broker/a.csv"]["created"] == 3
+    assert detalle["broker/copia_a.csv"]["estado"] == "duplicado"
+    assert detalle["broker/roto.pdf"]["estado"] == "error"
+    assert detalle["broker/notas.txt"]["estado"] == "omitido"
+    assert detalle["../../fuera.csv"]["created"] == 1
+    assert response.data["created"] == 6
+    assert CalificacionTributaria.objects.count() == 6
+    assert ArchivoCargado.objects.count() == 3
+    assert set(CalificacionTributaria.objects.values_list('archivo_origen__nombre_archivo', flat=True)) == {
+        "a.csv", "b.csv", "fuera.csv"
+    }
+
+
+@pytest.mark.django_db
+def test_cargar_zip_command(tmp_path, settings):
+    settings.MEDIA_ROOT = str(tmp_path)
+    path = tmp_path / "lote.zip"
+    path.write_bytes(_zip({"a.csv": _csv('11111111-1', [1, 2])}).getvalue())
+    out = io.StringIO()
+    call_command("cargar_zip", str(path), "--workers", "1", stdout=out)
+    assert "1 archivos, 2 creadas" in out.getvalue()
+    assert CalificacionTributaria.objects.count() == 2
+
+
+def test_spreadsheet_members_are_spilled_not_returned(tmp_path):
+    from calificaciones.services.zip_ingest import parse_member, validated_batches
+    path = tmp_path / "a.csv"
+    path.write_bytes(_csv('11111111-1', [1, 2, 3]))
+
+    result = parse_member(str(path), "a.csv", "tabular")
+
+    # Only a path crosses the process boundary; the batches are read back one at a time
+    assert set(result) == {"validado", "rows"} and result["rows"] == 3
+    batches = list(validated_batches(result["validado"]))
+    assert sum(len(clean) for clean, _, _ in batches) == 3
+
+
+def test_extraction_counts_inflated_bytes(tmp_path):
+    import hashlib
+    from calificaciones.services.zip_ingest import copy_limited
+    # A member inflating past what its header declares stops at the cap
+    assert copy_limited(io.BytesIO(b"x" * 3000), io.BytesIO(), hashlib.sha256(), 2048) is None
+    dest = io.BytesIO()
+    assert copy_limited(io.BytesIO(b"x" * 3000), dest, hashlib.sha256(), 3000) == 3000
+    assert dest.getvalue() == b"x" * 3000
+
+
+@pytest.mark.django_db
+def test_zip_over_the_size_limit_is_rejected(auth_client, settings):
+    settings.ZIP_MAX_TAMANO = 100
+    archive = _zip({"a.csv": _csv('11111111-1', [1, 2, 3])})
+    response = auth_client.post("/api/calificaciones/upload-zip/", {"file": archive}, format="multipart")
+    assert response.status_code == 400
+    assert "supera el máximo" in response.data["error"]
+    assert not CalificacionTributaria.objects.exists()
+
+
+@pytest.mark.django_db
+def test_previewed_pdf_is_ingested_from_zip(auth_client, settings):
+    from unittest.mock import patch
+    settings.PDF_SANDBOX_ENABLED = False  # parse_data is patched in this process
+    parsed = {
+        "rut_empresa": "76543210-3", "rut_propietario": None, "fecha": "01/01/2023",
+        "calificaciones": [{"rut_propietario": "11111111-1", "fecha": "2023-01-01", "tipo": "retiro", "monto": 10}],
+    }
+    pdf = io.BytesIO(b"%PDF-1.4 previewed only")
+    pdf.name = "dj.pdf"
+
+    with patch("calificaciones.services.pdf_parser.PDFParser.parse_data", return_value=parsed):
+        preview = auth_client.post("/api/calificaciones/upload-pdf/", {"file": pdf}, format="multipart")
+        response = auth_client.post(
+            "/api/calificaciones/upload-zip/", {"file": _zip({"dj.pdf": b"%PDF-1.4 previewed only"})}, format="multipart"
+        )
+
+    assert preview.status_code == 200
+    assert ArchivoCargado.objects.get(pk=preview.data["archivo_id"]).ingerido_en is None
+    entry = response.data["archivos_detalle"][0]
+    assert entry["estado"] == "ok"
+    assert CalificacionTributaria.objects.count() == 1
+    assert ArchivoCargado.objects.get(pk=entry["archivo_id"]).ingerido_en is not None
+
+
+@pytest.mark.django_db
+def test_failed_member_rolls_back_alone_and_reupload_resumes(auth_client):
+    from unittest.mock import patch
+    from calificaciones.services.bulk_ingest import BulkIngestor
+    ingest_validated = BulkIngestor.ingest_validated
+
+    def fail_on_b(self, clean, errors, rows):
+        ingest_validated(self, clean, errors, rows)
+        if self.archivo.nombre_archivo == "b.csv":
+            raise RuntimeError("se cortó la conexión")
+
+    members = {"a.csv": _csv('11111111-1', [1, 2]), "b.csv": _csv('22222222-2', [3, 4, 5])}
+    with patch.object(BulkIngestor, "ingest_validated", fail_on_b):
+        first = auth_client.post("/api/calificaciones/upload-zip/", {"file": _zip(members)}, format="multipart")
+    detalle = {e["archivo"]: e for e in first.data["archivos_detalle"]}
+    assert detalle["a.csv"]["estado"] == "ok"
+    assert detalle["b.csv"]["estado"] == "error"
+    assert CalificacionTributaria.objects.count() == 2
+    assert not ArchivoCargado.objects.filter(nombre_archivo="b.csv").exists()
+
+    second = auth_client.post("/api/calificaciones/upload-zip/", {"file": _zip(members)}, format="multipart")
+    detalle = {e["archivo"]: e for e in second.data["archivos_detalle"]}
+    assert detalle["a.csv"]["estado"] == "duplicado"
+    assert detalle["b.csv"]["created"] == 3
+    assert CalificacionTributaria.objects.count() == 5